@@ -1,10 +1,19 @@
 import hashlib
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import bindparam, delete, func, insert, literal, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
 
-from backend.models import Document, Card, Progress
+from backend.models import Document, Card, CardLshBucket, CardSignature, Explanation, GenerationJob, Progress
+from backend.services.deck_cache import deck_cache
+from backend.services.metrics import stage, timed
+from backend.services.scheduler import SM2_INITIAL_EASE, review
+from backend.services.near_dupes import NearDuplicateFilter, find_duplicates, index_cards, minhash_signatures
+
+
+# Cards per INSERT statement; bounds memory and statement size on large imports
+CARD_INSERT_BATCH = 1000
 
 
 def _fingerprint_question(question: str) -> str:
@@ -30,55 +39,417 @@ def get_document(db: Session, document_id: int) -> Document | None:
 
 
 # ---- Cards ----
-def add_cards_to_document(db: Session, document_id: int, cards: list[dict]) -> list[Card]:
-    created: list[Card] = []
+def add_cards_to_document(
+    db: Session,
+    document_id: int,
+    cards: list[dict],
+    *,
+    skip_near_duplicates: bool = True,
+    commit: bool = True,
+) -> list[dict]:
+    """
+    Saves valid cards to the document and returns them as CardOut-shaped dicts. With
+    commit=False the caller commits (and bumps the deck cache).
 
+    Rows go in with one multi-row INSERT ... RETURNING id per CARD_INSERT_BATCH cards, and
+    the response is built from the input rather than re-read from the database. Unless
+    skip_near_duplicates is False, cards whose question nearly duplicates one already in
+    the deck (or earlier in this batch) are dropped.
+    """
+    valid: list[dict] = []
     for c in cards:
         q_type = (c.get("type") or "").strip().lower()
         question = (c.get("question") or "").strip()
 
-        if not question or q_type not in ("mcq", "saq"):
-            continue
-
-        options = c.get("options")
-        options_json = json.dumps(options) if isinstance(options, list) else None
-
-        card = Card(
-            document_id=document_id,
-            type=q_type,
-            question=question,
-            options_json=options_json,
-            correct_answer=(c.get("correct_answer") or None),
-            answer=(c.get("answer") or None),
-            explanation=(c.get("explanation") or None),
-            fingerprint=_fingerprint_question(question),
+        if question and q_type in ("mcq", "saq"):
+            valid.append(c)
+
+    with stage("near_dupes"):
+        signatures = minhash_signatures([c["question"].strip() for c in valid])
+
+        if skip_near_duplicates and valid:
+            existing = find_duplicates(db, document_id, [], signatures=signatures)
+            batch = NearDuplicateFilter()
+            keep = [
+                i for i, (c, dup) in enumerate(zip(valid, existing))
+                if dup is None and batch.add_if_new(c["question"], signature=signatures[i])
+            ]
+            valid = [valid[i] for i in keep]
+            signatures = [signatures[i] for i in keep]
+
+    created: list[dict] = []
+    now = datetime.utcnow()
+
+    for start in range(0, len(valid), CARD_INSERT_BATCH):
+        rows: list[dict] = []
+        out: list[dict] = []
+        batch_signatures = signatures[start:start + CARD_INSERT_BATCH]
+        for c in valid[start:start + CARD_INSERT_BATCH]:
+            q_type = c["type"].strip().lower()
+            question = c["question"].strip()
+
+            options = c.get("options")
+            if not isinstance(options, list):
+                options = None
+
+            rows.append(
+                {
+                    "document_id": document_id,
+                    "type": q_type,
+                    "question": question,
+                    "options_json": json.dumps(options) if options is not None else None,
+                    "correct_answer": (c.get("correct_answer") or None),
+                    "answer": (c.get("answer") or None),
+                    "explanation": (c.get("explanation") or None),
+                    "fingerprint": _fingerprint_question(question),
+                    "created_at": now,
+                }
+            )
+            out.append(
+                {
+                    "document_id": document_id,
+                    "type": q_type,
+                    "question": question,
+                    "options": options,
+                    "correct_answer": rows[-1]["correct_answer"],
+                    "answer": rows[-1]["answer"],
+                    "explanation": rows[-1]["explanation"],
+                }
+            )
+
+        # RETURNING rows aren't guaranteed to come back (or ids to be assigned) in VALUES order
+        # on every database, so they're matched to the input by question, unique in a batch
+        # unless near-duplicate checks are off; then SQLAlchemy orders them (more slowly)
+        if len({r["question"] for r in rows}) == len(rows):
+            by_question = {q: i for i, q in db.execute(insert(Card).returning(Card.id, Card.question), rows)}
+            ids = [by_question[r["question"]] for r in rows]
+        else:
+            ids = db.scalars(insert(Card).returning(Card.id, sort_by_parameter_order=True), rows).all()
+        for card, card_id in zip(out, ids):
+            card["id"] = card_id
+
+        index_cards(db, document_id, [(card["id"], sig) for card, sig in zip(out, batch_signatures)])
+        # New cards join the due queue straight away
+        db.execute(
+            insert(Progress.__table__),
+            [{"card_id": card["id"], "document_id": document_id, "times_seen": 0, "times_correct": 0, "next_due_at": now} for card in out],
         )
-        db.add(card)
-        created.append(card)
+        created.extend(out)
 
-    db.commit()
-    for card in created:
-        db.refresh(card)
+    if commit:
+        db.commit()
+        deck_cache.bump(document_id)
     return created
 
 
+def create_decks(db: Session, decks: list[tuple[str, list[dict]]], *, commit: bool = True) -> list[tuple[int, int]]:
+    """
+    Creates a document with its cards for each (title, cards) pair in one transaction.
+    Returns (document_id, cards saved) per deck, in order. With commit=False the caller
+    commits (and bumps the deck cache), e.g. to record something else in the same transaction.
+    """
+    saved = []
+    for title, cards in decks:
+        doc = Document(title=title.strip())
+        db.add(doc)
+        db.flush()
+        created = add_cards_to_document(db, doc.id, cards, commit=False)
+        saved.append((doc.id, len(created)))
+    if commit:
+        db.commit()
+        for document_id, _ in saved:
+            deck_cache.bump(document_id)
+    return saved
+
+
+def delete_document(db: Session, document_id: int) -> bool:
+    """
+    Deletes a document with its cards and their progress and near-duplicate index rows.
+    Returns False if there was no such document.
+    """
+    card_ids = select(Card.id).where(Card.document_id == document_id)
+    db.execute(delete(Progress).where(Progress.card_id.in_(card_ids)))
+    db.execute(delete(CardSignature).where(CardSignature.document_id == document_id))
+    db.execute(delete(CardLshBucket).where(CardLshBucket.document_id == document_id))
+    db.execute(delete(Card).where(Card.document_id == document_id))
+    db.execute(update(GenerationJob).where(GenerationJob.document_id == document_id).values(document_id=None))
+    deleted = db.execute(delete(Document).where(Document.id == document_id)).rowcount
+    db.commit()
+    deck_cache.bump(document_id)
+    return deleted > 0
+
+
 def get_cards_for_document(db: Session, document_id: int) -> list[Card]:
     stmt = select(Card).where(Card.document_id == document_id).order_by(Card.created_at.asc())
     return list(db.scalars(stmt))
 
 
+# Columns a card listing needs; options_json is passed through undecoded
+CARD_LIST_COLUMNS = (
+    Card.id,
+    Card.document_id,
+    Card.type,
+    Card.question,
+    Card.options_json,
+    Card.correct_answer,
+    Card.answer,
+    Card.explanation,
+    Card.created_at,
+)
+
+
+def get_card_rows(db: Session, document_id: int) -> list:
+    """
+    The whole deck as plain rows (no ORM objects), in (created_at, id) order.
+    """
+    stmt = select(*CARD_LIST_COLUMNS).where(Card.document_id == document_id).order_by(Card.created_at, Card.id)
+    return db.execute(stmt).all()
+
+
+def get_cards_page(db: Session, document_id: int, *, limit: int, after: tuple[datetime, int] | None = None) -> list:
+    """
+    Up to `limit` rows after the (created_at, id) cursor. An index range scan on
+    ix_cards_document_created_id, so the cost doesn't grow with how deep the page is.
+    """
+    stmt = select(*CARD_LIST_COLUMNS).where(Card.document_id == document_id)
+    if after is not None:
+        stmt = stmt.where(tuple_(Card.created_at, Card.id) > tuple_(*after))
+    stmt = stmt.order_by(Card.created_at, Card.id).limit(limit)
+    return db.execute(stmt).all()
+
+
 # ---- Progress ----
-def record_progress(db: Session, card_id: int, correct: bool) -> Progress:
-    prog = db.scalar(select(Progress).where(Progress.card_id == card_id))
-    if prog is None:
-        prog = Progress(card_id=card_id, times_seen=0, times_correct=0)
-        db.add(prog)
+# Attempts before giving up when concurrent writers keep changing the same rows
+PROGRESS_WRITE_ATTEMPTS = 5
+
 
-    prog.times_seen += 1
-    if correct:
-        prog.times_correct += 1
-    prog.last_seen_at = datetime.utcnow()
+class ProgressConflictError(RuntimeError):
+    pass
 
+
+@timed("progress_write")
+def _apply_progress(db: Session, answers: dict[int, list[tuple[datetime, bool]]]) -> int:
+    """
+    Applies answers ({card_id: [(answered_at, correct), ...]}) to the counters and SM-2
+    schedule, in one transaction: one SELECT of the current rows, then one UPDATE per row
+    (sent as a single executemany) and one multi-row INSERT. Cards that don't exist are
+    skipped. Returns the number of answers applied.
+
+    The rows are locked before they're read (BEGIN IMMEDIATE on SQLite, FOR UPDATE
+    elsewhere), and updates are also conditional on times_seen being unchanged since the
+    read; if another writer got there first anyway, everything is recomputed from fresh rows.
+    """
+    schedule_cols = (Progress.ease, Progress.interval_days, Progress.repetitions)
+    stmt = (
+        update(Progress.__table__)
+        .where(Progress.id == bindparam("b_id"), Progress.times_seen == bindparam("b_seen"))
+        .values(
+            document_id=bindparam("document_id"),
+            times_seen=bindparam("times_seen"),
+            times_correct=bindparam("times_correct"),
+            last_seen_at=bindparam("last_seen_at"),
+            ease=bindparam("ease"),
+            interval_days=bindparam("interval_days"),
+            repetitions=bindparam("repetitions"),
+            next_due_at=bindparam("next_due_at"),
+        )
+    )
+
+    for _ in range(PROGRESS_WRITE_ATTEMPTS):
+        if db.get_bind().dialect.name == "sqlite":
+            # One writer at a time anyway; taking the lock up front means the rows can't change
+            # between the read and the write (and avoids a failed lock upgrade under WAL)
+            db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        documents = dict(db.execute(select(Card.id, Card.document_id).where(Card.id.in_(answers))).all())
+        existing = {
+            row.card_id: row
+            for row in db.execute(
+                select(Progress.id, Progress.card_id, Progress.times_seen, Progress.times_correct, Progress.last_seen_at, *schedule_cols)
+                .where(Progress.card_id.in_(documents))
+                .with_for_update()
+            )
+        }
+
+        updates = []
+        inserts = []
+        for card_id, document_id in documents.items():
+            row = existing.get(card_id)
+            seen, correct, last = (row.times_seen, row.times_correct, row.last_seen_at) if row else (0, 0, None)
+            state = (row.ease, row.interval_days, row.repetitions) if row else (SM2_INITIAL_EASE, 0.0, 0)
+            next_due_at = None
+            for answered_at, ok in sorted(answers[card_id]):
+                *state, next_due_at = review(*state, ok, answered_at)
+                seen += 1
+                correct += 1 if ok else 0
+                last = max(last, answered_at) if last else answered_at
+
+            values = {
+                "document_id": document_id,
+                "times_seen": seen,
+                "times_correct": correct,
+                "last_seen_at": last,
+                "ease": state[0],
+                "interval_days": state[1],
+                "repetitions": state[2],
+                "next_due_at": next_due_at,
+            }
+            if row is None:
+                inserts.append({"card_id": card_id, **values})
+            else:
+                updates.append({"b_id": row.id, "b_seen": row.times_seen, **values})
+
+        try:
+            if updates and db.get_bind().dialect.supports_sane_multi_rowcount:
+                conflict = db.execute(stmt, updates).rowcount != len(updates)
+            else:
+                conflict = any(db.execute(stmt, u).rowcount != 1 for u in updates)
+            if not conflict:
+                if inserts:
+                    db.execute(insert(Progress), inserts)
+                db.commit()
+                return sum(len(answers[card_id]) for card_id in documents)
+        except IntegrityError:
+            # Another writer created one of these rows first
+            pass
+        db.rollback()
+
+    raise ProgressConflictError("progress rows kept changing under concurrent writes")
+
+
+def record_progress(db: Session, card_id: int, correct: bool) -> Progress | None:
+    """
+    Records one answer and reschedules the card. None if the card doesn't exist.
+    """
+    _apply_progress(db, {card_id: [(datetime.utcnow(), correct)]})
+    return db.scalar(select(Progress).where(Progress.card_id == card_id))
+
+
+def record_progress_batch(db: Session, events: list[dict]) -> int:
+    """
+    Applies many {card_id, correct, answered_at} events in one transaction, in answered_at
+    order per card. answered_at comes from the client, so a time in the future is taken as
+    now. Events for unknown cards are skipped. Returns the number applied.
+    """
+    now = datetime.utcnow()
+    answers: dict[int, list[tuple[datetime, bool]]] = {}
+    for e in events:
+        answered_at = e.get("answered_at") or now
+        if answered_at.tzinfo is not None:
+            answered_at = answered_at.astimezone(timezone.utc).replace(tzinfo=None)
+        # A fast clock would push next_due_at out (and near datetime.max, overflow it)
+        answered_at = min(answered_at, now)
+        answers.setdefault(e["card_id"], []).append((answered_at, bool(e["correct"])))
+
+    if not answers:
+        return 0
+    return _apply_progress(db, answers)
+
+
+def get_due_cards(db: Session, *, limit: int, document_id: int | None = None, now: datetime | None = None) -> list:
+    """
+    Up to `limit` cards whose next_due_at has passed, most overdue first, from one document
+    or all of them. New cards are due from when they were saved. A range scan on
+    ix_progress_document_due (or ix_progress_due) plus a primary-key lookup per card.
+    """
+    stmt = (
+        select(*CARD_LIST_COLUMNS, Progress.next_due_at, Progress.times_seen)
+        .join(Progress, Progress.card_id == Card.id)
+        .where(Progress.next_due_at <= (now or datetime.utcnow()))
+    )
+    if document_id is not None:
+        stmt = stmt.where(Progress.document_id == document_id)
+    stmt = stmt.order_by(Progress.next_due_at).limit(limit)
+    return db.execute(stmt).all()
+
+
+def backfill_progress_schedule(db: Session) -> int:
+    """
+    Brings progress up to date after the schedule columns were added: every card gets a
+    row (due now if it was never answered, else from its last answer). Returns rows added.
+    """
+    progress = Progress.__table__
+    db.execute(
+        update(progress)
+        .where(progress.c.document_id.is_(None))
+        .values(document_id=select(Card.document_id).where(Card.id == progress.c.card_id).scalar_subquery())
+    )
+    db.execute(
+        update(progress)
+        .where(progress.c.next_due_at.is_(None))
+        .values(next_due_at=func.coalesce(progress.c.last_seen_at, datetime.utcnow()))
+    )
+    missing = (
+        select(Card.id, Card.document_id, literal(0), literal(0), Card.created_at)
+        .outerjoin(Progress, Progress.card_id == Card.id)
+        .where(Progress.id.is_(None))
+    )
+    added = db.execute(
+        insert(progress).from_select(["card_id", "document_id", "times_seen", "times_correct", "next_due_at"], missing)
+    ).rowcount
     db.commit()
-    db.refresh(prog)
-    return prog
+    return added
+
+
+# ---- Explanations ----
+def explanation_key(question: str, correct_answer: str) -> str:
+    """
+    Cache key for an explanation: the question's fingerprint plus the normalised answer, so
+    the same card saved in several decks (or re-generated) shares one explanation.
+    """
+    answer = " ".join((correct_answer or "").strip().lower().split())
+    return hashlib.sha256(f"{_fingerprint_question(question)}:{answer}".encode("utf-8")).hexdigest()
+
+
+def get_card_row(db: Session, card_id: int):
+    return db.execute(select(*CARD_LIST_COLUMNS).where(Card.id == card_id)).first()
+
+
+def get_explanations(db: Session, keys: list[str]) -> dict[str, str]:
+    if not keys:
+        return {}
+    return dict(db.execute(select(Explanation.key, Explanation.explanation).where(Explanation.key.in_(keys))).all())
+
+
+def get_unexplained_cards(db: Session, document_id: int, *, limit: int, after_id: int = 0) -> list:
+    """
+    Up to `limit` cards of the document without an explanation, in id order after `after_id`.
+    """
+    stmt = (
+        select(*CARD_LIST_COLUMNS)
+        .where(Card.document_id == document_id, Card.explanation.is_(None), Card.id > after_id)
+        .order_by(Card.id)
+        .limit(limit)
+    )
+    return db.execute(stmt).all()
+
+
+@timed("explanation_write")
+def save_explanations(db: Session, items: list[dict]) -> None:
+    """
+    Stores {key, explanation, card_id?, document_id?} items: each explanation goes into the
+    shared table if its key is new, and onto its card if the card has none yet. One
+    transaction for the whole batch.
+    """
+    for _ in range(2):
+        known = set(get_explanations(db, [i["key"] for i in items]))
+        new = {i["key"]: i["explanation"] for i in items if i["key"] not in known}
+        cards = [{"b_id": i["card_id"], "explanation": i["explanation"]} for i in items if i.get("card_id")]
+        try:
+            if new:
+                now = datetime.utcnow()
+                db.execute(insert(Explanation), [{"key": k, "explanation": e, "created_at": now} for k, e in new.items()])
+            if cards:
+                db.execute(
+                    update(Card.__table__)
+                    .where(Card.id == bindparam("b_id"), Card.explanation.is_(None))
+                    .values(explanation=bindparam("explanation")),
+                    cards,
+                )
+            db.commit()
+            break
+        except IntegrityError:
+            # A concurrent request stored one of the keys first; the retry skips it
+            db.rollback()
+
+    for document_id in {i["document_id"] for i in items if i.get("document_id")}:
+        deck_cache.bump(document_id)
@@ -1,12 +1,71 @@
-from sqlalchemy import create_engine
+import os
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
-DATABASE_URL = "sqlite:///./app.db"
+from backend.services.metrics import instrument_engine
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+
+# Serve the documents/progress/jobs routes from an AsyncSession instead of a threadpool Session.
+# Worth it on a server database; on SQLite aiosqlite is threads underneath and writers hold
+# the lock across event-loop hops, so the threadpool is usually faster (benchmarks/db_load.py).
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Drivers used when DATABASE_URL doesn't name one
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _async_url(url: str) -> str:
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if "+" not in u.drivername and backend in _ASYNC_DRIVERS:
+        u = u.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}")
+    return u.render_as_string(hide_password=False)
+
+
+def _engine_kwargs(url: str) -> dict:
+    if _is_sqlite(url):
+        memory = make_url(url).database in (None, "", ":memory:")
+        kwargs = {
+            # needed for SQLite + FastAPI; timeout is the busy wait in seconds
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        }
+        if not memory:
+            kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+        return kwargs
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_pre_ping": True}
+
+
+def _tune_sqlite(engine) -> None:
+    """
+    WAL lets readers proceed during a write, and busy_timeout makes concurrent writers
+    wait for the lock instead of failing with "database is locked".
+    """
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.close()
+
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},  # needed for SQLite + FastAPI
-)
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL))
+if _is_sqlite(DATABASE_URL):
+    _tune_sqlite(engine)
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -21,3 +80,57 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ---- Async ----
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def get_async_engine():
+    # Created on first use so greenlet and the async driver are only required when DB_ASYNC is on
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        url = _async_url(DATABASE_URL)
+        _async_engine = create_async_engine(url, **_engine_kwargs(url))
+        if _is_sqlite(url):
+            _tune_sqlite(_async_engine.sync_engine)
+        instrument_engine(_async_engine.sync_engine)
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+async def get_async_db():
+    get_async_engine()
+    async with _AsyncSessionLocal() as db:
+        yield db
+
+
+# Dependency used by the documents/progress/jobs routes
+get_session = get_async_db if DB_ASYNC else get_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Runs a sync crud function (fn(db, ...)) against either session type without blocking
+    the event loop: via run_sync on an AsyncSession, or in the threadpool on a Session.
+
+    The session is closed afterwards so its connection goes back to the pool while the route
+    awaits something else; returned objects stay readable (their columns are loaded) but are
+    detached. fn must commit its own writes.
+    """
+    if hasattr(db, "run_sync"):  # AsyncSession
+        try:
+            return await db.run_sync(fn, *args, **kwargs)
+        finally:
+            await db.close()
+
+    def call():
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    return await run_in_threadpool(call)
@@ -1,14 +1,50 @@
+import asyncio
+import json
+import logging
+import os
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import inspect, text
 
 from backend.schemas import GenerateQuestionsResponse, ExplainRequest
-from backend.services.pdf import extract_pdf_text, chunk_text, pick_spread_chunks
-from backend.services.generation import generate_questions_from_chunks, explain_answer
-from backend.db import engine
-from backend.models import Base
+from backend.services.pdf import shutdown_pdf_pool, PdfTooLargeError, PdfExtractionTimeout
+from backend.services.pdf_cache import content_hash, get_or_extract, pdf_cache
+from backend.services.selection import max_chunks_for, select_chunks
+from backend.services.near_dupes import backfill as backfill_signatures, find_duplicates
+from backend.services.generation import (
+    generate_questions_from_chunks_async,
+    stream_questions_from_chunks,
+    dedupe_questions,
+    reshuffled_copies,
+    PROMPT_VERSION,
+)
+from backend.services.llm_cache import llm_cache
+from backend.services.llm_calls import LLMUnavailableError, llm_caller
+from backend.services.deck_cache import deck_cache
+from backend.services.explanations import explainer, EXPLAIN_PREFETCH
+from backend.services.metrics import METRICS_ENABLED, MetricsMiddleware, inc, render as render_metrics
+from backend.db import SessionLocal, engine
+from backend.models import Base, Card, Progress
+from backend.crud import backfill_progress_schedule
 from backend.routes.documents import router as documents_router
 from backend.routes.progress import router as progress_router
+from backend.routes.jobs import router as jobs_router
+from backend.routes.ingest import router as ingest_router
+from backend.routes.search import router as search_router
+from backend.services.jobs import job_runner
+from backend.services.progress_buffer import progress_buffer, PROGRESS_WRITE_BEHIND
+from backend.services.search import ensure_index as ensure_search_index
+from backend.services.single_flight import generate_flights
+
 
+# Re-generate once when deck-level dedupe leaves a request short
+GENERATION_TOP_UP = os.getenv("GENERATION_TOP_UP", "1") == "1"
+# Identical uploads (same PDF bytes, question_type and count) in flight at the same time
+# share one extraction and one set of LLM calls
+GENERATION_COALESCE = os.getenv("GENERATION_COALESCE", "1") == "1"
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
 
 app = FastAPI()
 
@@ -17,44 +53,176 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser dev tools show the per-request stage timings (METRICS_TIMING_HEADER)
+    expose_headers=["Server-Timing"],
 )
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+def _upgrade_schema() -> None:
+    """
+    create_all only creates missing tables; this adds columns and indexes introduced since
+    an existing table was created, backfills the progress schedule when it's new, and
+    indexes cards saved before near-duplicate signatures existed.
+    """
+    existing = {c["name"] for c in inspect(engine).get_columns(Progress.__tablename__)}
+    added = [c for c in Progress.__table__.columns if c.name not in existing]
+    with engine.begin() as conn:
+        for column in added:
+            ddl = f"ALTER TABLE {Progress.__tablename__} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg.text} NOT NULL"
+            conn.execute(text(ddl))
+    if added:
+        with SessionLocal() as db:
+            backfill_progress_schedule(db)
+
+    for table in (Card.__table__, Progress.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    # Without signatures, older cards are invisible to near-duplicate rejection
+    with SessionLocal() as db:
+        backfill_signatures(db)
+
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     Base.metadata.create_all(bind=engine)
+    _upgrade_schema()
+    # Builds the full-text index on first start with it (existing cards included)
+    ensure_search_index(engine)
+    # Responses generated from an older prompt template are never valid again
+    await asyncio.to_thread(llm_cache.invalidate, keep_prompt_version=PROMPT_VERSION)
+    await job_runner.start()
+    if PROGRESS_WRITE_BEHIND:
+        await progress_buffer.start()
+    if EXPLAIN_PREFETCH:
+        await explainer.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await job_runner.stop()
+    await progress_buffer.stop()
+    await explainer.stop()
+    shutdown_pdf_pool()
 
 
 app.include_router(documents_router)
 app.include_router(progress_router)
+app.include_router(jobs_router)
+app.include_router(ingest_router)
+app.include_router(search_router)
 
 
-@app.post("/generate-questions", response_model=GenerateQuestionsResponse)
-async def generate_questions(
-    file: UploadFile = File(...),
-    question_type: str = Form(...),
-    count: int = Form(5),
-):
+async def _select_chunks(data: bytes, question_type: str, count: int) -> tuple[list[str], list[str], dict | None]:
+    """
+    Validates the form fields and returns (all chunks, chunks to generate from), or an error payload.
+    """
     if question_type not in ["mcq", "saq"]:
-        return {"error": "question_type must be 'mcq' or 'saq'"}
+        return [], [], {"error": "question_type must be 'mcq' or 'saq'"}
 
     if count not in [5, 10, 15, 20]:
-        return {"error": "count must be one of: 5, 10, 15, 20"}
+        return [], [], {"error": "count must be one of: 5, 10, 15, 20"}
 
-    text = extract_pdf_text(file.file)
+    try:
+        text, chunks = await get_or_extract(data, max_chunks=max_chunks_for(count))
+    except (PdfTooLargeError, PdfExtractionTimeout) as e:
+        return [], [], {"error": str(e)}
     if not text.strip():
-        return {"error": "No extractable text found in the PDF"}
+        return [], [], {"error": "No extractable text found in the PDF"}
 
-    chunks = chunk_text(text, max_chars=1800)
-    selected_chunks = pick_spread_chunks(chunks, max_chunks=4)
+    selected_chunks = select_chunks(chunks, max_chunks=max_chunks_for(count))
 
     if not selected_chunks:
-        return {"error": "No extractable text found in the PDF"}
+        return [], [], {"error": "No extractable text found in the PDF"}
+
+    return chunks, selected_chunks, None
+
 
-    questions = generate_questions_from_chunks(
+async def _generate(data: bytes, question_type: str, count: int) -> tuple[list[str], list[str], list[dict], dict | None]:
+    chunks, selected_chunks, error = await _select_chunks(data, question_type, count)
+    if error:
+        return chunks, selected_chunks, [], error
+    questions = await generate_questions_from_chunks_async(
         question_type=question_type,
         count=count,
         chunks=selected_chunks,
     )
+    return chunks, selected_chunks, questions, None
+
+
+def _drop_saved_duplicates(document_id: int, questions: list[dict]) -> list[dict]:
+    with SessionLocal() as db:
+        dups = find_duplicates(db, document_id, [q.get("question") or "" for q in questions])
+    return [q for q, dup in zip(questions, dups) if dup is None]
+
+
+async def _top_up_against_deck(
+    document_id: int,
+    questions: list[dict],
+    *,
+    question_type: str,
+    count: int,
+    chunks: list[str],
+    selected_chunks: list[str],
+) -> list[dict]:
+    """
+    Drops questions that nearly duplicate cards already saved in the deck and, if that leaves
+    fewer than `count`, runs one extra generation round for the shortfall.
+    """
+    questions = await asyncio.to_thread(_drop_saved_duplicates, document_id, questions)
+    missing = count - len(questions)
+    if missing <= 0 or not GENERATION_TOP_UP:
+        return questions
+
+    inc("generation_top_ups_total")
+    unused = [c for c in chunks if c not in selected_chunks]
+    extra = await generate_questions_from_chunks_async(
+        question_type=question_type,
+        count=missing,
+        chunks=select_chunks(unused, max_chunks=len(selected_chunks)) or selected_chunks,
+    )
+    extra = await asyncio.to_thread(_drop_saved_duplicates, document_id, extra)
+    return dedupe_questions(questions + extra)[:count]
+
+
+@app.post("/generate-questions", response_model=GenerateQuestionsResponse)
+async def generate_questions(
+    file: UploadFile = File(...),
+    question_type: str = Form(...),
+    count: int = Form(5),
+    document_id: int | None = Form(None),
+):
+    """
+    With `document_id`, questions that nearly duplicate cards already in that deck are left
+    out (and topped up if GENERATION_TOP_UP is on).
+
+    Concurrent requests for the same PDF, question_type and count share one generation
+    (GENERATION_COALESCE); each gets its own copy with MCQ options shuffled separately.
+    """
+    data = await file.read()
+    if GENERATION_COALESCE:
+        key = (content_hash(data), question_type, count)
+        chunks, selected_chunks, questions, error = await generate_flights.do(
+            key, lambda: _generate(data, question_type, count)
+        )
+        questions = reshuffled_copies(questions, question_type)
+    else:
+        chunks, selected_chunks, questions, error = await _generate(data, question_type, count)
+    if error:
+        return error
+
+    if document_id is not None:
+        questions = await _top_up_against_deck(
+            document_id,
+            questions,
+            question_type=question_type,
+            count=count,
+            chunks=chunks,
+            selected_chunks=selected_chunks,
+        )
 
     if not questions:
         return {
@@ -69,10 +237,78 @@ async def generate_questions(
     }
 
 
+@app.post("/generate-questions/stream")
+async def generate_questions_stream(
+    file: UploadFile = File(...),
+    question_type: str = Form(...),
+    count: int = Form(5),
+):
+    """
+    NDJSON variant of /generate-questions: one {"question": {...}} line per question as
+    soon as it is ready, then a final {"done": true, "count": n} (or {"error": ...}) line.
+    """
+    _, selected_chunks, error = await _select_chunks(await file.read(), question_type, count)
+
+    async def lines():
+        if error:
+            yield json.dumps(error) + "\n"
+            return
+
+        sent = 0
+        async for question in stream_questions_from_chunks(
+            question_type=question_type,
+            count=count,
+            chunks=selected_chunks,
+        ):
+            sent += 1
+            yield json.dumps({"question": question}) + "\n"
+
+        if not sent:
+            yield json.dumps({"error": "No valid questions could be generated from the PDF text"}) + "\n"
+            return
+        yield json.dumps({"done": True, "question_type": question_type, "count": sent}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.post("/explain-question")
 async def explain_question(data: ExplainRequest):
-    explanation = explain_answer(
-        question=data.question,
-        correct_answer=data.correct_answer,
-    )
-    return {"explanation": explanation}
+    """
+    Pass `card_id` for a saved card: its explanation is generated once, stored on the card
+    and served from the database after that. A question/answer pair is cached the same way.
+    """
+    if data.card_id is None and not (data.question and data.correct_answer):
+        return {"error": "card_id, or question and correct_answer, is required"}
+
+    try:
+        result = await explainer.explain(
+            card_id=data.card_id,
+            question=data.question,
+            correct_answer=data.correct_answer,
+        )
+    except LLMUnavailableError:
+        return {"error": "The explanation service is unavailable right now; try again shortly"}
+    if result is None:
+        return {"error": "Card not found"}
+    explanation, cached = result
+    return {"explanation": explanation, "cached": cached}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus text format; empty when METRICS_ENABLED=0.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "pdf": pdf_cache.stats(),
+        "llm": llm_cache.stats(),
+        "deck": deck_cache.stats(),
+        "explanations": explainer.stats(),
+        "llm_calls": llm_caller.stats(),
+        "generate_flights": generate_flights.stats(),
+    }
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Float, Integer, String, Text, DateTime, ForeignKey, LargeBinary, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from backend.db import Base
@@ -17,6 +17,8 @@ class Document(Base):
 
 class Card(Base):
     __tablename__ = "cards"
+    # Keyset pagination order (see crud.get_cards_page)
+    __table_args__ = (Index("ix_cards_document_created_id", "document_id", "created_at", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.id"), index=True, nullable=False)
@@ -35,23 +37,95 @@ class Card(Base):
 
     explanation: Mapped[str | None] = mapped_column(Text, nullable=True)
 
-    # For future "no overlap" + dedupe
+    # Exact-duplicate key; near duplicates go through CardSignature / CardLshBucket
     fingerprint: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     document: Mapped["Document"] = relationship("Document", back_populates="cards")
     progress: Mapped["Progress | None"] = relationship("Progress", back_populates="card", uselist=False, cascade="all, delete-orphan")
+    signature: Mapped["CardSignature | None"] = relationship("CardSignature", uselist=False, cascade="all, delete-orphan")
 
 
 class Progress(Base):
     __tablename__ = "progress"
+    # Due queue for one document, and across all documents (see crud.get_due_cards)
+    __table_args__ = (
+        Index("ix_progress_document_due", "document_id", "next_due_at"),
+        Index("ix_progress_due", "next_due_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     card_id: Mapped[int] = mapped_column(Integer, ForeignKey("cards.id"), unique=True, index=True, nullable=False)
+    # Copied from the card so the due queue can be filtered by deck without a join
+    document_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("documents.id"), nullable=True)
 
     times_seen: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     times_correct: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     last_seen_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
+    # SM-2 schedule (see services/scheduler.py); server defaults let them be added to existing tables
+    ease: Mapped[float] = mapped_column(Float, default=2.5, server_default=text("2.5"), nullable=False)
+    interval_days: Mapped[float] = mapped_column(Float, default=0.0, server_default=text("0"), nullable=False)
+    repetitions: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"), nullable=False)
+    # New cards are due from when they were saved
+    next_due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
     card: Mapped["Card"] = relationship("Card", back_populates="progress")
+
+
+class CardSignature(Base):
+    """MinHash signature of a card's question (see services/near_dupes.py)."""
+    __tablename__ = "card_signatures"
+
+    card_id: Mapped[int] = mapped_column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), primary_key=True)
+    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.id"), index=True, nullable=False)
+    signature: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class CardLshBucket(Base):
+    """One row per (card, LSH band); near-duplicate candidates share a bucket within a document."""
+    __tablename__ = "card_lsh_buckets"
+    __table_args__ = (Index("ix_card_lsh_buckets_document_bucket", "document_id", "bucket"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.id"), nullable=False)
+    bucket: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    card_id: Mapped[int] = mapped_column(Integer, ForeignKey("cards.id", ondelete="CASCADE"), index=True, nullable=False)
+
+
+class Explanation(Base):
+    """
+    Explanation of a question's correct answer, shared by every card with the same question
+    fingerprint and answer (see services/explanations.py).
+    """
+    __tablename__ = "explanations"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    explanation: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+
+    # "queued" | "running" | "done" | "failed"
+    status: Mapped[str] = mapped_column(String(16), index=True, nullable=False, default="queued")
+
+    title: Mapped[str] = mapped_column(String(255), nullable=False)
+    question_type: Mapped[str] = mapped_column(String(10), nullable=False)
+    count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # Uploaded PDF, kept until the job finishes so queued jobs survive a restart
+    pdf_data: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+
+    # Set once the generated cards are saved
+    document_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("documents.id"), nullable=True)
+    card_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -1,17 +1,24 @@
+import base64
 import json
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import os
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 
-from backend.db import get_db
+from backend.db import get_session, run_db
 from backend import crud
-from backend.schemas import DocumentCreate, DocumentOut, CardsBulkIn, CardOut
+from backend.schemas import DocumentCreate, DocumentOut, CardsBulkIn, CardOut, CardPageOut
+from backend.services.deck_cache import deck_cache
+from backend.services.explanations import explainer
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
+CARDS_PAGE_DEFAULT = int(os.getenv("CARDS_PAGE_DEFAULT", "100"))
+CARDS_PAGE_MAX = int(os.getenv("CARDS_PAGE_MAX", "500"))
+
 
 @router.post("", response_model=DocumentOut)
-def create_document(payload: DocumentCreate, db: Session = Depends(get_db)):
-    doc = crud.create_document(db, payload.title)
+async def create_document(payload: DocumentCreate, db=Depends(get_session)):
+    doc = await run_db(db, crud.create_document, payload.title)
     return {
         "id": doc.id,
         "title": doc.title,
@@ -20,81 +27,137 @@ def create_document(payload: DocumentCreate, db: Session = Depends(get_db)):
 
 
 @router.get("", response_model=list[DocumentOut])
-def list_documents(db: Session = Depends(get_db)):
-    docs = crud.list_documents(db)
+async def list_documents(db=Depends(get_session)):
+    docs = await run_db(db, crud.list_documents)
     return [
         {"id": d.id, "title": d.title, "created_at": d.created_at.isoformat()}
         for d in docs
     ]
 
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _json_response(request: Request, etag: str, body: bytes) -> Response:
+    # no-cache: browsers may keep the body but must revalidate, which is a 304 while unchanged
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        deck_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/{document_id}", response_model=DocumentOut)
-def get_document(document_id: int, db: Session = Depends(get_db)):
-    doc = crud.get_document(db, document_id)
+async def get_document(document_id: int, request: Request, db=Depends(get_session)):
+    cached = deck_cache.get(document_id, "document")
+    if cached:
+        return _json_response(request, *cached)
+
+    version = deck_cache.version(document_id)
+    doc = await run_db(db, crud.get_document, document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    return {"id": doc.id, "title": doc.title, "created_at": doc.created_at.isoformat()}
+    body = json.dumps({"id": doc.id, "title": doc.title, "created_at": doc.created_at.isoformat()}).encode()
+    return _json_response(request, deck_cache.put(document_id, "document", version, body), body)
+
+
+@router.delete("/{document_id}", status_code=204)
+async def delete_document(document_id: int, db=Depends(get_session)):
+    if not await run_db(db, crud.delete_document, document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return Response(status_code=204)
 
 
 @router.post("/{document_id}/cards", response_model=list[CardOut])
-def add_cards(document_id: int, payload: CardsBulkIn, db: Session = Depends(get_db)):
-    doc = crud.get_document(db, document_id)
+async def add_cards(document_id: int, payload: CardsBulkIn, db=Depends(get_session)):
+    doc = await run_db(db, crud.get_document, document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    created = crud.add_cards_to_document(db, document_id, payload.cards)
-
-    out: list[dict] = []
-    for c in created:
-        options = None
-        if c.options_json:
-            try:
-                options = json.loads(c.options_json)
-            except Exception:
-                options = None
-
-        out.append(
-            {
-                "id": c.id,
-                "document_id": c.document_id,
-                "type": c.type,
-                "question": c.question,
-                "options": options,
-                "correct_answer": c.correct_answer,
-                "answer": c.answer,
-                "explanation": c.explanation,
-            }
-        )
-    return out
+    created = await run_db(db, crud.add_cards_to_document, document_id, payload.cards)
+    if created:
+        explainer.schedule(document_id)
+    return created
+
+
+def _card_json(row) -> str:
+    # options_json is spliced in as stored (we only ever write json.dumps(list)), so rows are
+    # neither decoded nor re-validated on the way out
+    head = json.dumps(
+        {
+            "id": row.id,
+            "document_id": row.document_id,
+            "type": row.type,
+            "question": row.question,
+            "correct_answer": row.correct_answer,
+            "answer": row.answer,
+            "explanation": row.explanation,
+        }
+    )
+    return f'{head[:-1]},"options":{row.options_json or "null"}}}'
+
+
+def _encode_cursor(created_at: datetime, card_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{card_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, card_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(card_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.get("/{document_id}/cards", response_model=list[CardOut])
-def get_cards(document_id: int, db: Session = Depends(get_db)):
-    doc = crud.get_document(db, document_id)
+async def get_cards(document_id: int, request: Request, db=Depends(get_session)):
+    """
+    The whole deck in one response; fine for small decks, use /cards/page for large ones.
+    Served from the deck cache, with an ETag for conditional requests.
+    """
+    cached = deck_cache.get(document_id, "cards")
+    if cached:
+        return _json_response(request, *cached)
+
+    version = deck_cache.version(document_id)
+    doc = await run_db(db, crud.get_document, document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    cards = crud.get_cards_for_document(db, document_id)
-
-    out: list[dict] = []
-    for c in cards:
-        options = None
-        if c.options_json:
-            try:
-                options = json.loads(c.options_json)
-            except Exception:
-                options = None
-
-        out.append(
-            {
-                "id": c.id,
-                "document_id": c.document_id,
-                "type": c.type,
-                "question": c.question,
-                "options": options,
-                "correct_answer": c.correct_answer,
-                "answer": c.answer,
-                "explanation": c.explanation,
-            }
-        )
-    return out
+    rows = await run_db(db, crud.get_card_rows, document_id)
+    body = ("[" + ",".join(_card_json(r) for r in rows) + "]").encode()
+    return _json_response(request, deck_cache.put(document_id, "cards", version, body), body)
+
+
+@router.get("/{document_id}/cards/page", response_model=CardPageOut)
+async def get_cards_page(
+    document_id: int,
+    limit: int = Query(CARDS_PAGE_DEFAULT, ge=1, le=CARDS_PAGE_MAX),
+    cursor: str | None = None,
+    db=Depends(get_session),
+):
+    """
+    One page of the deck in (created_at, id) order. Pass the returned next_cursor to get
+    the following page; it is null on the last one.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+
+    doc = await run_db(db, crud.get_document, document_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # One extra row tells us whether there is a next page without a COUNT
+    rows = await run_db(db, crud.get_cards_page, document_id, limit=limit + 1, after=after)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    body = '{"cards":[' + ",".join(_card_json(r) for r in rows) + '],"next_cursor":' + json.dumps(next_cursor) + "}"
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,50 @@
+import json
+
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+
+from backend.services.ingest import INGEST_MAX_BYTES, INGEST_MAX_FILES, BatchTooLargeError, expand_uploads, ingest
+
+router = APIRouter(prefix="/ingest", tags=["ingest"])
+
+
+@router.post("")
+async def ingest_pdfs(
+    files: list[UploadFile] = File(...),
+    question_type: str = Form(...),
+    count: int = Form(5),
+):
+    """
+    Builds one library deck per PDF; zips are unpacked. Streams NDJSON progress: a
+    {"status": "started"} line, "extracted" / "saved" / "failed" lines per file as they
+    happen, then {"done": true, "saved": n, "failed": m}. A failed file doesn't stop the batch.
+    """
+    if question_type not in ["mcq", "saq"]:
+        raise HTTPException(status_code=400, detail="question_type must be 'mcq' or 'saq'")
+
+    if count not in [5, 10, 15, 20]:
+        raise HTTPException(status_code=400, detail="count must be one of: 5, 10, 15, 20")
+
+    if len(files) > INGEST_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"More than {INGEST_MAX_FILES} PDFs in one batch")
+
+    # Read no more of the uploads than the batch may hold
+    uploads = []
+    budget = INGEST_MAX_BYTES
+    for f in files:
+        data = await f.read(budget + 1)
+        if len(data) > budget:
+            raise HTTPException(status_code=413, detail=f"More than {INGEST_MAX_BYTES // (1024 * 1024)} MB of PDFs in one batch")
+        budget -= len(data)
+        uploads.append((f.filename or "upload.pdf", data))
+
+    try:
+        pdfs, failures = expand_uploads(uploads)
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    async def lines():
+        async for event in ingest(pdfs, question_type=question_type, count=count, failures=failures):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
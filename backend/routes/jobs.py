@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+
+from backend.db import get_session, run_db
+from backend.schemas import JobOut
+from backend.services.jobs import QueueFullError, submit_job, get_job, job_runner
+from backend.services.pdf import PDF_MAX_BYTES
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _job_out(job) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "title": job.title,
+        "question_type": job.question_type,
+        "count": job.count,
+        "document_id": job.document_id,
+        "card_count": job.card_count,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@router.post("", response_model=JobOut, status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    question_type: str = Form(...),
+    count: int = Form(5),
+    title: str = Form(""),
+    db=Depends(get_session),
+):
+    if question_type not in ["mcq", "saq"]:
+        raise HTTPException(status_code=400, detail="question_type must be 'mcq' or 'saq'")
+
+    if count not in [5, 10, 15, 20]:
+        raise HTTPException(status_code=400, detail="count must be one of: 5, 10, 15, 20")
+
+    # Stored in the queue until a worker gets to it, so checked before it goes in
+    data = await file.read(PDF_MAX_BYTES + 1)
+    if len(data) > PDF_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"PDF is larger than {PDF_MAX_BYTES // (1024 * 1024)} MB")
+
+    try:
+        job = await run_db(
+            db,
+            submit_job,
+            data=data,
+            title=title.strip() or file.filename or "Untitled Deck",
+            question_type=question_type,
+            count=count,
+        )
+    except QueueFullError:
+        raise HTTPException(
+            status_code=429,
+            detail="Generation queue is full, try again shortly",
+            headers={"Retry-After": "30"},
+        )
+
+    job_runner.notify()
+    return _job_out(job)
+
+
+@router.get("/{job_id}", response_model=JobOut)
+async def get_job_status(job_id: int, db=Depends(get_session)):
+    job = await run_db(db, get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_out(job)
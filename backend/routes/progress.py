@@ -1,19 +1,69 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+import json
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
 
-from backend.db import get_db
+from backend.db import get_session, run_db
 from backend import crud
-from backend.schemas import ProgressIn, ProgressOut
+from backend.schemas import ProgressIn, ProgressOut, ProgressBatchIn, ProgressBatchOut, DueCardOut
+from backend.services.progress_buffer import progress_buffer
 
 router = APIRouter(prefix="/progress", tags=["progress"])
 
+DUE_CARDS_MAX = int(os.getenv("DUE_CARDS_MAX", "200"))
+
 
 @router.post("", response_model=ProgressOut)
-def post_progress(payload: ProgressIn, db: Session = Depends(get_db)):
-    prog = crud.record_progress(db, payload.card_id, payload.correct)
+async def post_progress(payload: ProgressIn, db=Depends(get_session)):
+    prog = await run_db(db, crud.record_progress, payload.card_id, payload.correct)
+    if not prog:
+        raise HTTPException(status_code=404, detail="Card not found")
     return {
         "card_id": prog.card_id,
         "times_seen": prog.times_seen,
         "times_correct": prog.times_correct,
         "last_seen_at": prog.last_seen_at.isoformat() if prog.last_seen_at else None,
     }
+
+
+@router.post("/batch", response_model=ProgressBatchOut)
+async def post_progress_batch(payload: ProgressBatchIn, db=Depends(get_session)):
+    """
+    Records many answers at once. With the write-behind buffer enabled the events are
+    queued and `applied` is null; otherwise, or when the buffer is full, they are written
+    before responding.
+    """
+    events = [e.model_dump() for e in payload.events]
+
+    if progress_buffer.running and progress_buffer.add(events):
+        return {"accepted": len(events), "applied": None}
+
+    applied = await run_db(db, crud.record_progress_batch, events)
+    return {"accepted": len(events), "applied": applied}
+
+
+@router.get("/due", response_model=list[DueCardOut])
+async def get_due_cards(
+    limit: int = Query(20, ge=1, le=DUE_CARDS_MAX),
+    document_id: int | None = None,
+    db=Depends(get_session),
+):
+    """
+    The next `limit` cards to study, most overdue first, from one document or all of them.
+    Cards never answered are due from when they were saved.
+    """
+    rows = await run_db(db, crud.get_due_cards, limit=limit, document_id=document_id)
+    return [
+        {
+            "id": r.id,
+            "document_id": r.document_id,
+            "type": r.type,
+            "question": r.question,
+            "options": json.loads(r.options_json) if r.options_json else None,
+            "correct_answer": r.correct_answer,
+            "answer": r.answer,
+            "explanation": r.explanation,
+            "next_due_at": r.next_due_at.isoformat(),
+            "times_seen": r.times_seen,
+        }
+        for r in rows
+    ]
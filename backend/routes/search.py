@@ -0,0 +1,42 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from backend.db import get_session, run_db
+from backend.schemas import SearchPageOut
+from backend.services.search import SearchUnavailableError, search_cards
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+SEARCH_PAGE_DEFAULT = int(os.getenv("SEARCH_PAGE_DEFAULT", "20"))
+SEARCH_PAGE_MAX = int(os.getenv("SEARCH_PAGE_MAX", "100"))
+# Deep pages cost as much as everything before them; nobody reads past this
+SEARCH_OFFSET_MAX = int(os.getenv("SEARCH_OFFSET_MAX", "1000"))
+
+
+@router.get("", response_model=SearchPageOut)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    document_id: int | None = None,
+    card_type: str | None = Query(None, alias="type", pattern="^(mcq|saq)$"),
+    limit: int = Query(SEARCH_PAGE_DEFAULT, ge=1, le=SEARCH_PAGE_MAX),
+    offset: int = Query(0, ge=0, le=SEARCH_OFFSET_MAX),
+    db=Depends(get_session),
+):
+    """
+    Cards across the library matching every word of `q` (the last one as a prefix), best
+    first. Filter with `document_id` and `type`; pass the returned next_offset as `offset`
+    for the following page, it is null on the last one.
+    """
+    try:
+        # One extra row tells us whether there is a next page without a COUNT
+        rows = await run_db(
+            db, search_cards, q, limit=limit + 1, offset=offset, document_id=document_id, card_type=card_type,
+        )
+    except SearchUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    next_offset = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_offset = offset + limit
+    return {"results": rows, "next_offset": next_offset}
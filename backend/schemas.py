@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, Field, field_validator
 from typing import Any
 
 
@@ -10,8 +11,10 @@ class GenerateQuestionsResponse(BaseModel):
 
 
 class ExplainRequest(BaseModel):
-    question: str
-    correct_answer: str
+    # Either a saved card, or the question and its correct answer as text
+    card_id: int | None = None
+    question: str | None = None
+    correct_answer: str | None = None
 
 
 # ---- New: Documents ----
@@ -47,6 +50,21 @@ class CardOut(BaseModel):
         from_attributes = True
 
 
+class CardPageOut(BaseModel):
+    cards: list[CardOut]
+    next_cursor: str | None = None
+
+
+# ---- Search ----
+class SearchHitOut(CardOut):
+    score: float
+
+
+class SearchPageOut(BaseModel):
+    results: list[SearchHitOut]
+    next_offset: int | None = None
+
+
 # ---- New: Progress ----
 class ProgressIn(BaseModel):
     card_id: int
@@ -61,3 +79,52 @@ class ProgressOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class DueCardOut(CardOut):
+    next_due_at: str
+    times_seen: int
+
+
+# Allowance for client clocks running fast; answers stamped further ahead are rejected
+ANSWERED_AT_MAX_SKEW = timedelta(days=1)
+
+
+class ProgressEventIn(BaseModel):
+    card_id: int
+    correct: bool
+    answered_at: datetime | None = None
+
+    @field_validator("answered_at")
+    @classmethod
+    def _not_in_future(cls, v: datetime | None) -> datetime | None:
+        if v is None:
+            return v
+        naive = v.astimezone(timezone.utc).replace(tzinfo=None) if v.tzinfo is not None else v
+        if naive > datetime.utcnow() + ANSWERED_AT_MAX_SKEW:
+            raise ValueError("answered_at is in the future")
+        return v
+
+
+class ProgressBatchIn(BaseModel):
+    events: list[ProgressEventIn] = Field(max_length=1000)
+
+
+class ProgressBatchOut(BaseModel):
+    accepted: int
+    # Number of events written; null when they were buffered for a later flush
+    applied: int | None = None
+
+
+# ---- Generation jobs ----
+class JobOut(BaseModel):
+    id: int
+    status: str
+    title: str
+    question_type: str
+    count: int
+    document_id: int | None = None
+    card_count: int = 0
+    error: str | None = None
+    created_at: str
+    finished_at: str | None = None
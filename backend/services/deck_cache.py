@@ -0,0 +1,98 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+DECK_CACHE_MEMORY_BYTES = int(os.getenv("DECK_CACHE_MEMORY_MB", "32")) * 1024 * 1024
+
+
+def make_etag(body: bytes) -> str:
+    # Strong validator: a hash of the exact bytes sent, so it stays correct across restarts
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class DeckCache:
+    """
+    In-process LRU of serialised deck responses, keyed by (document_id, kind). Each document
+    has a version counter; writers bump it after committing, which makes any cached payload
+    for that document stale. Bounded by total payload size in bytes.
+
+    Versions live in this process only, so with several workers a write made through one
+    worker doesn't invalidate the others' entries; run a single worker or
+    disable caching with DECK_CACHE_MEMORY_MB=0.
+    """
+
+    def __init__(self, memory_limit: int):
+        self.memory_limit = memory_limit
+
+        self._versions: dict[int, int] = {}
+        self._entries: OrderedDict[tuple[int, str], tuple[int, str, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def version(self, document_id: int) -> int:
+        with self._lock:
+            return self._versions.get(document_id, 0)
+
+    def bump(self, document_id: int) -> None:
+        with self._lock:
+            self._versions[document_id] = self._versions.get(document_id, 0) + 1
+            for key in [k for k in self._entries if k[0] == document_id]:
+                self._bytes -= len(self._entries.pop(key)[2])
+
+    def get(self, document_id: int, kind: str) -> tuple[str, bytes] | None:
+        """
+        (etag, body) if a payload for the document's current version is cached.
+        """
+        key = (document_id, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != self._versions.get(document_id, 0):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, document_id: int, kind: str, version: int, body: bytes) -> str:
+        """
+        Caches `body`, built from data read at `version`, and returns its ETag. A payload built
+        before a concurrent bump is not cached, since it may predate the write.
+        """
+        etag = make_etag(body)
+        key = (document_id, kind)
+        with self._lock:
+            if version != self._versions.get(document_id, 0) or len(body) > self.memory_limit:
+                return etag
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key)[2])
+            self._entries[key] = (version, etag, body)
+            self._bytes += len(body)
+            while self._bytes > self.memory_limit:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return etag
+
+    def record_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "entries": len(self._entries),
+                "memory_bytes": self._bytes,
+            }
+
+
+deck_cache = DeckCache(DECK_CACHE_MEMORY_BYTES)
@@ -0,0 +1,208 @@
+"""
+Explanations of a card's correct answer, generated once and then served from the database.
+
+A lookup tries the card's own explanation, then the shared explanations table (keyed by
+question fingerprint + correct answer, see crud.explanation_key), and only then calls the
+LLM. New explanations are written to both, so a repeat request is a primary-key read.
+
+With EXPLAIN_PREFETCH on, every saved deck is queued for background generation in batches
+of EXPLAIN_PREFETCH_BATCH cards, at most EXPLAIN_PREFETCH_CONCURRENCY calls at a time so
+prefetching leaves LLM capacity for the explanations students actually click on.
+"""
+import asyncio
+import json
+import logging
+import os
+import string
+
+from backend import crud
+from backend.db import SessionLocal
+from backend.services.generation import explain_answer_async
+
+logger = logging.getLogger(__name__)
+
+
+EXPLAIN_PREFETCH = os.getenv("EXPLAIN_PREFETCH", "0") == "1"
+EXPLAIN_PREFETCH_BATCH = int(os.getenv("EXPLAIN_PREFETCH_BATCH", "10"))
+EXPLAIN_PREFETCH_CONCURRENCY = int(os.getenv("EXPLAIN_PREFETCH_CONCURRENCY", "2"))
+
+
+def answer_text(row) -> str:
+    """
+    The correct answer as text: the option an MCQ's letter points at (letters change when
+    options are shuffled, the text doesn't), or an SAQ's answer.
+    """
+    if row.type == "mcq" and row.correct_answer:
+        options = json.loads(row.options_json) if row.options_json else []
+        index = string.ascii_uppercase.find(row.correct_answer.strip().upper()[:1])
+        if 0 <= index < len(options):
+            return options[index]
+        return row.correct_answer
+    return row.answer or row.correct_answer or ""
+
+
+# ---- Database (run in worker threads) ----
+def _load_card(card_id: int):
+    with SessionLocal() as db:
+        return crud.get_card_row(db, card_id)
+
+
+def _lookup(keys: list[str]) -> dict[str, str]:
+    with SessionLocal() as db:
+        return crud.get_explanations(db, keys)
+
+
+def _unexplained(document_id: int, limit: int, after_id: int) -> list:
+    with SessionLocal() as db:
+        return crud.get_unexplained_cards(db, document_id, limit=limit, after_id=after_id)
+
+
+def _save(items: list[dict]) -> None:
+    with SessionLocal() as db:
+        crud.save_explanations(db, items)
+
+
+class Explainer:
+    def __init__(self, *, prefetch_batch: int, prefetch_concurrency: int):
+        self.prefetch_batch = prefetch_batch
+        self.prefetch_concurrency = prefetch_concurrency
+
+        # One LLM call per key at a time, shared by everyone waiting on it
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.prefetch_failed = 0
+
+    async def _generate(self, key: str, question: str, correct_answer: str) -> str:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(explain_answer_async(question=question, correct_answer=correct_answer))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so a client that disconnects doesn't cancel the call for the other waiters
+        return (await asyncio.shield(task)).strip()
+
+    async def explain(
+        self,
+        *,
+        card_id: int | None = None,
+        question: str | None = None,
+        correct_answer: str | None = None,
+    ) -> tuple[str, bool] | None:
+        """
+        (explanation, cached) for a saved card, or for a question/answer pair given as text.
+        None if card_id doesn't exist.
+        """
+        card = None
+        if card_id is not None:
+            card = await asyncio.to_thread(_load_card, card_id)
+            if card is None:
+                return None
+            if card.explanation:
+                self.hits += 1
+                return card.explanation, True
+            question, correct_answer = card.question, answer_text(card)
+
+        key = crud.explanation_key(question, correct_answer)
+        explanation = (await asyncio.to_thread(_lookup, [key])).get(key)
+        cached = explanation is not None
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+            explanation = await self._generate(key, question, correct_answer)
+            if not explanation:
+                return explanation, False
+
+        if card is not None or not cached:
+            item = {"key": key, "explanation": explanation}
+            if card is not None:
+                item.update(card_id=card.id, document_id=card.document_id)
+            await asyncio.to_thread(_save, [item])
+        return explanation, cached
+
+    # ---- Background prefetch ----
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._queue = None
+
+    def schedule(self, document_id: int) -> None:
+        """
+        Queues a deck for prefetching; a no-op unless the prefetcher is running.
+        """
+        if self._queue is not None:
+            self._queue.put_nowait(document_id)
+
+    async def _loop(self) -> None:
+        while True:
+            document_id = await self._queue.get()
+            try:
+                await self.prefetch(document_id)
+            except Exception:
+                logger.exception("explanation prefetch failed for document %s", document_id)
+
+    async def prefetch(self, document_id: int) -> int:
+        """
+        Explains every card of the document that has no explanation yet, one batch at a time
+        in study order, so the first cards are ready soonest. Returns the number stored.
+        """
+        semaphore = asyncio.Semaphore(self.prefetch_concurrency)
+        stored = 0
+        after_id = 0
+
+        async def one(row, key: str) -> str:
+            async with semaphore:
+                return await self._generate(key, row.question, answer_text(row))
+
+        while True:
+            rows = await asyncio.to_thread(_unexplained, document_id, self.prefetch_batch, after_id)
+            if not rows:
+                return stored
+            after_id = rows[-1].id
+
+            keys = [crud.explanation_key(r.question, answer_text(r)) for r in rows]
+            known = await asyncio.to_thread(_lookup, keys)
+            missing = [(r, k) for r, k in zip(rows, keys) if k not in known]
+            results = await asyncio.gather(*(one(r, k) for r, k in missing), return_exceptions=True)
+            for (_, key), result in zip(missing, results):
+                if isinstance(result, BaseException) or not result:
+                    # Left unexplained; a click on the card retries it
+                    self.prefetch_failed += 1
+                else:
+                    known[key] = result
+
+            items = [
+                {"key": k, "explanation": known[k], "card_id": r.id, "document_id": document_id}
+                for r, k in zip(rows, keys)
+                if k in known
+            ]
+            if items:
+                await asyncio.to_thread(_save, items)
+            stored += len(items)
+            self.prefetched += len(items)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "in_flight": len(self._inflight),
+            "prefetched": self.prefetched,
+            "prefetch_failed": self.prefetch_failed,
+        }
+
+
+explainer = Explainer(prefetch_batch=EXPLAIN_PREFETCH_BATCH, prefetch_concurrency=EXPLAIN_PREFETCH_CONCURRENCY)
@@ -0,0 +1,207 @@
+"""
+Local stand-in for the LLM, selected with LLM_PROVIDER=fake (see services/llm.py).
+
+It answers the app's own prompts with realistic output: question-generation requests get
+JSON questions built from sentences of each chunk (an array, or an object keyed by chunk
+number for multi-chunk requests), explanation requests get a short paragraph. Content
+depends only on the prompt, so the same request always yields the same questions.
+
+Latency is log-normal around FAKE_LLM_LATENCY_MS plus FAKE_LLM_MS_PER_QUESTION for each
+question written; FAKE_LLM_SPIKE_RATE of calls are FAKE_LLM_SPIKE_FACTOR times slower
+than that (the stragglers hedging is for). A fraction of calls fail (FAKE_LLM_ERROR_RATE),
+return truncated or prose-wrapped JSON (FAKE_LLM_MALFORMED_RATE), or wrap the JSON in a
+markdown fence (FAKE_LLM_FENCED_RATE). Faults and latencies come from a generator seeded with
+FAKE_LLM_SEED, the prompt and how many times that prompt has been sent, so a run is
+reproducible and a retried call can succeed where the first attempt failed.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import types
+
+
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.4"))
+FAKE_LLM_MS_PER_QUESTION = float(os.getenv("FAKE_LLM_MS_PER_QUESTION", "150"))
+FAKE_LLM_SPIKE_RATE = float(os.getenv("FAKE_LLM_SPIKE_RATE", "0.0"))
+FAKE_LLM_SPIKE_FACTOR = float(os.getenv("FAKE_LLM_SPIKE_FACTOR", "10"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0.0"))
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0.0"))
+FAKE_LLM_FENCED_RATE = float(os.getenv("FAKE_LLM_FENCED_RATE", "0.0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+_CHUNK = re.compile(r"CHUNK (\d+)/\d+:\n(.*?)(?=\n\nCHUNK \d+/\d+:\n|\Z)", re.S)
+_MULTI_QUOTA = re.compile(r"- chunk (\d+): exactly (\d+) (MCQ|SAQ)")
+_SINGLE_QUOTA = re.compile(r"Generate exactly (\d+) (MCQ|SAQ) questions")
+_WORD = re.compile(r"[A-Za-z][A-Za-z\-]{4,}")
+
+
+class FakeLLMError(ConnectionError):
+    """An injected provider failure (what a 5xx or dropped connection looks like to callers)."""
+
+
+def _sentences(text: str) -> list[str]:
+    parts = re.split(r"(?<=[.!?])\s+", " ".join(text.split()))
+    return [p for p in parts if len(_WORD.findall(p)) >= 3] or [" ".join(text.split())[:200] or "Empty chunk."]
+
+
+def _mcq(sentence: str, words: list[str], rnd: random.Random) -> dict:
+    candidates = _WORD.findall(sentence)
+    answer = max(candidates, key=len) if candidates else "answer"
+    distractors = [w for w in dict.fromkeys(words) if w.lower() != answer.lower()]
+    rnd.shuffle(distractors)
+    options = ([answer] + distractors[:3] + ["none", "all", "neither"])[:4]
+    rnd.shuffle(options)
+    letter = "ABCD"[options.index(answer)]
+    return {
+        "type": "mcq",
+        "question": f'Which term completes the statement: "{sentence.replace(answer, "____", 1)}"',
+        "options": [f"{l}. {o}" if rnd.random() < 0.2 else o for l, o in zip("ABCD", options)],
+        "correct_answer": letter,
+        "explanation": f'The text states: "{sentence}"',
+    }
+
+
+def _saq(sentence: str, rnd: random.Random) -> dict:
+    words = _WORD.findall(sentence)
+    topic = " ".join(words[:3]) if words else "this idea"
+    # Models don't always use the requested key; normalize_saq copes with the usual variants
+    key = rnd.choice(["answer", "answer", "answer", "model_answer"])
+    return {"type": "saq", "question": f"Explain what the text says about {topic}.", key: sentence}
+
+
+def _questions(chunk: str, n: int, question_type: str, rnd: random.Random) -> list[dict]:
+    sentences = _sentences(chunk)
+    words = _WORD.findall(chunk)
+    picked = rnd.sample(sentences, min(n, len(sentences)))
+    picked += [rnd.choice(sentences) for _ in range(n - len(picked))]
+    return [_mcq(s, words, rnd) if question_type == "MCQ" else _saq(s, rnd) for s in picked]
+
+
+def render(prompt: str, rnd: random.Random) -> tuple[str, int]:
+    """
+    A well-formed answer to one of the app's prompts, and the number of questions in it.
+    """
+    chunks = {int(i): body for i, body in _CHUNK.findall(prompt)}
+    multi = _MULTI_QUOTA.findall(prompt)
+    if multi:
+        out = {i: _questions(chunks.get(int(i), ""), int(n), qt, rnd) for i, n, qt in multi}
+        return json.dumps(out), sum(len(v) for v in out.values())
+
+    single = _SINGLE_QUOTA.search(prompt)
+    if single:
+        questions = _questions(next(iter(chunks.values()), ""), int(single.group(1)), single.group(2), rnd)
+        return json.dumps(questions), len(questions)
+
+    answer = prompt.rsplit("Correct Answer:", 1)[-1].strip() if "Correct Answer:" in prompt else "it"
+    return (
+        f"The correct answer is {answer}. It follows directly from the definition in the question: "
+        f"the other options describe related ideas but miss the key condition, while {answer} "
+        "satisfies it. A good way to remember this is to restate the question in your own words.",
+        0,
+    )
+
+
+def _corrupt(text: str, rnd: random.Random) -> str:
+    if rnd.random() < 0.5:
+        # Cut off mid-stream, as when the output hits a token limit
+        return text[: max(1, int(len(text) * rnd.uniform(0.3, 0.9)))]
+    return "Sure! Here are the questions you asked for:\n\n" + text + "\n\nLet me know if you need more."
+
+
+class FakeLLM:
+    def __init__(
+        self,
+        *,
+        latency_ms: float = FAKE_LLM_LATENCY_MS,
+        latency_sigma: float = FAKE_LLM_LATENCY_SIGMA,
+        ms_per_question: float = FAKE_LLM_MS_PER_QUESTION,
+        spike_rate: float = FAKE_LLM_SPIKE_RATE,
+        spike_factor: float = FAKE_LLM_SPIKE_FACTOR,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        malformed_rate: float = FAKE_LLM_MALFORMED_RATE,
+        fenced_rate: float = FAKE_LLM_FENCED_RATE,
+        seed: int = FAKE_LLM_SEED,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.ms_per_question = ms_per_question
+        self.spike_rate = spike_rate
+        self.spike_factor = spike_factor
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.fenced_rate = fenced_rate
+        self.seed = seed
+
+        self._sent: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.responses = types.SimpleNamespace(create=self.create)
+
+        self.calls = 0
+        self.spikes = 0
+        self.errors = 0
+        self.malformed = 0
+        self.fenced = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls()
+
+    def _plan(self, instructions: str | None, input: str) -> tuple[float, str | None]:
+        """
+        (seconds to wait, output text), or None for the text when the call should fail.
+        """
+        digest = hashlib.sha256(((instructions or "") + "\0" + input).encode("utf-8")).hexdigest()
+        with self._lock:
+            attempt = self._sent.get(digest, 0)
+            self._sent[digest] = attempt + 1
+            self.calls += 1
+
+        # Content depends on the prompt alone; faults and latency also on the attempt
+        text, questions = render(input, random.Random(f"{self.seed}:{digest}"))
+        rnd = random.Random(f"{self.seed}:{digest}:{attempt}")
+        delay = (self.latency_ms * rnd.lognormvariate(0, self.latency_sigma) + self.ms_per_question * questions) / 1000
+        spike = rnd.random() < self.spike_rate
+
+        roll = rnd.random()
+        with self._lock:
+            if spike:
+                self.spikes += 1
+                delay *= self.spike_factor
+            if roll < self.error_rate:
+                self.errors += 1
+                return delay, None
+            roll -= self.error_rate
+            if questions and roll < self.malformed_rate:
+                self.malformed += 1
+                return delay, _corrupt(text, rnd)
+            roll -= self.malformed_rate
+            if questions and roll < self.fenced_rate:
+                self.fenced += 1
+                return delay, f"```json\n{text}\n```"
+        return delay, text
+
+    def create(self, *, model: str, input: str, instructions: str | None = None, **kwargs):
+        delay, text = self._plan(instructions, input)
+        time.sleep(delay)
+        if text is None:
+            raise FakeLLMError("injected provider error")
+        return types.SimpleNamespace(output_text=text, model=model)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "spikes": self.spikes, "errors": self.errors, "malformed": self.malformed, "fenced": self.fenced}
+
+
+class AsyncFakeLLM(FakeLLM):
+    async def create(self, *, model: str, input: str, instructions: str | None = None, **kwargs):
+        delay, text = self._plan(instructions, input)
+        await asyncio.sleep(delay)
+        if text is None:
+            raise FakeLLMError("injected provider error")
+        return types.SimpleNamespace(output_text=text, model=model)
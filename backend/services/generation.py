@@ -1,13 +1,36 @@
-import json
+import asyncio
+import copy
+import hashlib
+import logging
 import os
 import random
 import re
 import string
-from openai import OpenAI
+from typing import AsyncIterator
 
+from backend.services.llm import LLM_MODEL, get_async_client
+from backend.services.llm_cache import llm_cache, response_key
+from backend.services.llm_calls import LLMUnavailableError, llm_caller
+from backend.services.llm_output import is_valid_question, parse_llm_json
+from backend.services.metrics import inc, stage
+from backend.services.near_dupes import NearDuplicateFilter
+from backend.services.selection import question_quotas
+from backend.services.tokens import count_tokens
 
-# ---- OpenAI client ----
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger(__name__)
+
+
+# ---- LLM client (provider and model are picked in services/llm.py) ----
+# Max chunk calls in flight per request, and per-attempt timeout in seconds (retries and
+# the overall deadline are set in services/llm_calls.py)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+
+# Prices for the per-request cost estimate, in USD per million tokens
+LLM_INPUT_USD_PER_MTOK = float(os.getenv("LLM_INPUT_USD_PER_MTOK", "0.25"))
+LLM_OUTPUT_USD_PER_MTOK = float(os.getenv("LLM_OUTPUT_USD_PER_MTOK", "2.0"))
+# Typical JSON size of one generated question, for the output side of the estimate
+OUTPUT_TOKENS_PER_QUESTION = {"mcq": 110, "saq": 70}
 
 
 # ---- Quality / cleanup helpers ----
@@ -31,13 +54,18 @@ def is_meta_question(q_text: str) -> bool:
     return any(p in t for p in bad_phrases)
 
 
+def _question_key(q: dict) -> str:
+    text = (q.get("question") or "").strip().lower()
+    return " ".join(text.split())
+
+
 def dedupe_questions(questions: list) -> list:
     seen = set()
+    near = NearDuplicateFilter()
     out = []
     for q in questions:
-        text = (q.get("question") or "").strip().lower()
-        key = " ".join(text.split())
-        if not key or key in seen:
+        key = _question_key(q)
+        if not key or key in seen or not near.add_if_new(key):
             continue
         seen.add(key)
         out.append(q)
@@ -84,35 +112,41 @@ def normalize_mcq(question: dict) -> dict:
         return question
 
     # Strip any "A. " prefixes the model may include inside options
-    options = [strip_option_label(opt) for opt in options if isinstance(opt, str)]
-    question["options"] = options
+    question["options"] = [strip_option_label(opt) for opt in options if isinstance(opt, str)]
+    return shuffle_options(question)
 
-    correct_letter = question.get("correct_answer")
-    if not isinstance(correct_letter, str) or len(correct_letter) != 1:
-        return question
-
-    correct_letter = correct_letter.upper()
 
-    try:
-        original_index = string.ascii_uppercase.index(correct_letter)
-    except ValueError:
+def shuffle_options(question: dict) -> dict:
+    """
+    Shuffles an MCQ's options in place and moves correct_answer with its option. Options
+    are taken as they are (normalize_mcq has already stripped their labels).
+    """
+    options = question.get("options")
+    correct_letter = question.get("correct_answer")
+    if not isinstance(options, list) or not isinstance(correct_letter, str) or len(correct_letter) != 1:
         return question
 
-    if original_index >= len(options):
+    original_index = string.ascii_uppercase.find(correct_letter.upper())
+    if not 0 <= original_index < len(options):
         return question
 
-    correct_text = options[original_index]
-
-    random.shuffle(options)
+    order = list(range(len(options)))
+    random.shuffle(order)
+    question["options"] = [options[i] for i in order]
+    question["correct_answer"] = string.ascii_uppercase[order.index(original_index)]
+    return question
 
-    try:
-        new_index = options.index(correct_text)
-    except ValueError:
-        return question
 
-    question["options"] = options
-    question["correct_answer"] = string.ascii_uppercase[new_index]
-    return question
+def reshuffled_copies(questions: list[dict], question_type: str) -> list[dict]:
+    """
+    Deep copies of normalized questions, with MCQ options shuffled afresh: one result
+    handed to several users still gives each their own option order.
+    """
+    copies = copy.deepcopy(questions)
+    if question_type == "mcq":
+        # Not normalize_mcq again: that would strip a second "label" off "B-cells"
+        copies = [shuffle_options(q) for q in copies]
+    return copies
 
 
 def normalize_saq(question: dict) -> dict:
@@ -142,12 +176,15 @@ def normalize_saq(question: dict) -> dict:
 
 
 # ---- Prompt + generation ----
-def build_chunk_prompt(*, question_type: str, per_chunk: int, chunk: str, chunk_index: int, chunk_total: int) -> str:
-    return f"""
+# Static instructions, sent as `instructions` ahead of every request; all request-specific
+# text goes in the input after them, so the prefix is byte-identical across calls and the
+# provider's prompt cache can serve it.
+PROMPT_PREFIX = """
 You are an educational question-writer.
 
 TASK
-Generate exactly {per_chunk} {question_type.upper()} questions based ONLY on the text chunk below.
+Generate questions based ONLY on the text chunk(s) in the input. The input says how many
+questions to write for each chunk and whether they are MCQ or SAQ.
 The questions must test understanding of the subject matter (not the document itself).
 
 VERY IMPORTANT (avoid low-value questions)
@@ -161,6 +198,7 @@ QUALITY REQUIREMENTS
 - Questions must be specific and content-based.
 - Do not repeat the same question in different wording.
 - Avoid near-duplicates.
+- Each question must be answerable from the chunk it is written for.
 
 MCQ RULES (if MCQ)
 - Provide exactly 4 options as a list of strings.
@@ -175,62 +213,394 @@ SAQ RULES (if SAQ)
 
 OUTPUT FORMAT (STRICT)
 - Return ONLY valid JSON.
-- Output must be a JSON array of objects.
 - No markdown, no commentary, no extra text.
-
-CHUNK {chunk_index}/{chunk_total}:
-{chunk}
+- One chunk: a JSON array of objects.
+- Several chunks: a JSON object whose keys are the chunk numbers (as strings) and whose
+  values are the JSON arrays of that chunk's questions, e.g. {"2": [...], "5": [...]}.
 """.strip()
 
+# Follow-up calls for a chunk that came back short (unparseable, cut off or with invalid
+# questions); each asks only for the questions still missing
+GENERATION_MISSING_RETRIES = int(os.getenv("GENERATION_MISSING_RETRIES", "1"))
 
-def generate_questions_from_chunks(*, question_type: str, count: int, chunks: list[str]) -> list[dict]:
-    if not chunks:
-        return []
+# Chunks packed into one request. Higher means fewer requests and less repeated prompt,
+# but each call writes more output and takes longer; 1 gives the lowest latency.
+CHUNKS_PER_REQUEST = max(1, int(os.getenv("CHUNKS_PER_REQUEST", "1")))
 
-    per_chunk = max(1, (count + len(chunks) - 1) // len(chunks))
-    all_questions: list[dict] = []
 
-    for i, chunk in enumerate(chunks, start=1):
-        prompt = build_chunk_prompt(
-            question_type=question_type,
-            per_chunk=per_chunk,
-            chunk=chunk,
-            chunk_index=i,
-            chunk_total=len(chunks),
-        )
+def build_request_input(*, question_type: str, items: list[tuple[int, int, str]], chunk_total: int) -> str:
+    """
+    The variable part of a request for `items`, given as (chunk_index, per_chunk, chunk).
+    """
+    qt = question_type.upper()
+    if len(items) == 1:
+        index, per_chunk, chunk = items[0]
+        return f"Generate exactly {per_chunk} {qt} questions.\n\nCHUNK {index}/{chunk_total}:\n{chunk}"
+
+    wanted = "\n".join(f"- chunk {index}: exactly {per_chunk} {qt} questions" for index, per_chunk, _ in items)
+    body = "\n\n".join(f"CHUNK {index}/{chunk_total}:\n{chunk}" for index, _, chunk in items)
+    return f"Generate, keyed by chunk number:\n{wanted}\n\n{body}"
+
+
+# Cached LLM responses are only reused under the same prompt version. Editing the
+# prefix or input templates changes the hash on its own; bump the revision for anything
+# else that changes what the model returns for the same prompt.
+PROMPT_TEMPLATE_REVISION = 2
+PROMPT_VERSION = f"{PROMPT_TEMPLATE_REVISION}-" + hashlib.sha256(
+    "\n".join(
+        [
+            PROMPT_PREFIX,
+            build_request_input(question_type="{question_type}", items=[(0, 0, "{chunk}")], chunk_total=0),
+            build_request_input(question_type="{question_type}", items=[(0, 0, "{chunk}")] * 2, chunk_total=0),
+        ]
+    ).encode("utf-8")
+).hexdigest()[:12]
+
+
+def _chunk_cache_key(*, chunk: str, question_type: str, per_chunk: int) -> str:
+    return response_key(
+        chunk=chunk,
+        question_type=question_type,
+        per_chunk=per_chunk,
+        model=LLM_MODEL,
+        prompt_version=PROMPT_VERSION,
+    )
 
-        response = client.responses.create(
-            model="gpt-5-mini",
-            input=prompt
-        )
 
-        output_text = response.output_text
+def _request_groups(items: list, chunks_per_request: int) -> list[list]:
+    return [items[i:i + chunks_per_request] for i in range(0, len(items), chunks_per_request)]
 
-        try:
-            part = json.loads(output_text)
-            if isinstance(part, list):
-                all_questions.extend(part)
-        except json.JSONDecodeError:
-            continue
 
-    # Filter + dedupe
-    all_questions = [q for q in all_questions if not is_meta_question(q.get("question", ""))]
-    all_questions = dedupe_questions(all_questions)
+def estimate_generation(
+    *, question_type: str, chunks: list[str], quotas: list[int], chunks_per_request: int | None = None
+) -> dict:
+    """
+    Token and cost estimate for one generation request, before any call is made. Counts every
+    chunk, cached or not; output excludes reasoning tokens, so real cost runs higher.
+    """
+    items = [(i, n, chunk) for i, (chunk, n) in enumerate(zip(chunks, quotas), start=1)]
+    groups = _request_groups(items, chunks_per_request or CHUNKS_PER_REQUEST)
+    prefix_tokens = count_tokens(PROMPT_PREFIX)
+    input_tokens = sum(
+        prefix_tokens + count_tokens(build_request_input(question_type=question_type, items=g, chunk_total=len(chunks)))
+        for g in groups
+    )
+    output_tokens = sum(quotas) * OUTPUT_TOKENS_PER_QUESTION.get(question_type, 100)
+    return {
+        "calls": len(groups),
+        "input_tokens": input_tokens,
+        "prefix_tokens": prefix_tokens * len(groups),
+        "output_tokens": output_tokens,
+        "cost_usd": (input_tokens * LLM_INPUT_USD_PER_MTOK + output_tokens * LLM_OUTPUT_USD_PER_MTOK) / 1e6,
+    }
+
+
+def _plan_quotas(*, question_type: str, count: int, chunks: list[str], quotas: list[int] | None) -> list[int]:
+    quotas = quotas or question_quotas(chunks, count)
+    est = estimate_generation(question_type=question_type, chunks=chunks, quotas=quotas)
+    logger.info(
+        "generating %d %s from %d chunks %s in %d calls: ~%d input + ~%d output tokens, ~$%.4f",
+        count, question_type, len(chunks), quotas, est["calls"], est["input_tokens"], est["output_tokens"], est["cost_usd"],
+    )
+    return quotas
 
-    # Trim
-    all_questions = all_questions[:count]
 
-    # Normalize
-    if question_type == "mcq":
-        all_questions = [normalize_mcq(q) for q in all_questions]
-    else:
-        all_questions = [normalize_saq(q) for q in all_questions]
+def _split_output(output_text: str, items: list[tuple[int, int, str]], question_type: str) -> dict[int, list]:
+    """
+    Valid questions per chunk index from one response, salvaged from fenced, wrapped or
+    truncated output where possible (see llm_output.py). A bare array in answer to a
+    multi-chunk request can't be attributed to a chunk, so it comes back under index 0
+    (never cached).
+    """
+    with stage("parse"):
+        parsed, status = parse_llm_json(output_text)
+
+        parts: dict[int, list] = {}
+        if isinstance(parsed, list):
+            parts = {items[0][0] if len(items) == 1 else 0: parsed}
+        elif isinstance(parsed, dict):
+            parts = {index: parsed[str(index)] for index, _, _ in items if isinstance(parsed.get(str(index)), list)}
+            if not parts and len(items) == 1:
+                # {"questions": [...]} or a lone question object instead of an array
+                if isinstance(parsed.get("questions"), list):
+                    parts = {items[0][0]: parsed["questions"]}
+                elif "question" in parsed:
+                    parts = {items[0][0]: [parsed]}
+
+        received = sum(len(p) for p in parts.values())
+        parts = {index: [q for q in p if is_valid_question(q, question_type)] for index, p in parts.items()}
+        parts = {index: p for index, p in parts.items() if p}
+
+    valid = sum(len(p) for p in parts.values())
+    inc("questions_dropped_total", received - valid, reason="invalid")
+    inc("llm_outputs_total", result="failed" if not valid and status != "clean" else status)
+    return parts
+
+
+def _shortfall(parts: dict[int, list], items: list[tuple[int, int, str]]) -> list[tuple[int, int, str]]:
+    """
+    (chunk_index, missing, chunk) for every chunk with fewer valid questions than asked for.
+    Untagged questions (index 0) count towards the chunks in order.
+    """
+    spare = len(parts.get(0, []))
+    short = []
+    for index, per_chunk, chunk in items:
+        missing = max(0, per_chunk - len(parts.get(index, [])))
+        used = min(spare, missing)
+        spare -= used
+        if missing - used > 0:
+            short.append((index, missing - used, chunk))
+    return short
+
+
+def _merge_parts(into: dict[int, list], parts: dict[int, list]) -> None:
+    for index, part in parts.items():
+        into.setdefault(index, []).extend(part)
+
+
+def _lookup_cached(*, question_type: str, chunks: list[str], quotas: list[int]) -> tuple[dict[int, list], list]:
+    """
+    Splits the chunks into cached results ({chunk_index: questions}) and (chunk_index,
+    per_chunk, chunk) items that still need a call.
+    """
+    cached: dict[int, list] = {}
+    pending = []
+    for i, (chunk, per_chunk) in enumerate(zip(chunks, quotas), start=1):
+        hit = llm_cache.get(_chunk_cache_key(chunk=chunk, question_type=question_type, per_chunk=per_chunk))
+        if hit is not None:
+            # Entries written before output validation existed may hold malformed questions
+            cached[i] = [q for q in hit if is_valid_question(q, question_type)]
+        else:
+            pending.append((i, per_chunk, chunk))
+    return cached, pending
+
+
+# Quotas tried, after the requested one, when falling back to cached output for a chunk
+_FALLBACK_QUOTAS = range(20, 0, -1)
+
+
+def _cached_fallback(*, question_type: str, items: list[tuple[int, int, str]]) -> dict[int, list]:
+    """
+    Whatever is cached for `items` under any quota, expired entries included, for when the
+    provider is unavailable. Chunks with nothing cached are left out.
+    """
+    parts: dict[int, list] = {}
+    for index, per_chunk, chunk in items:
+        for n in (per_chunk, *_FALLBACK_QUOTAS):
+            hit = llm_cache.get(_chunk_cache_key(chunk=chunk, question_type=question_type, per_chunk=n), stale_ok=True)
+            hit = [q for q in hit or [] if is_valid_question(q, question_type)]
+            if hit:
+                parts[index] = hit[:per_chunk]
+                break
+    inc("llm_fallbacks_total", result="hit" if parts else "miss")
+    return parts
+
+
+def _cache_parts(parts: dict[int, list], *, question_type: str, items: list[tuple[int, int, str]]) -> None:
+    """
+    Caches the chunks that got their full quota. A chunk still short after the retries is
+    left out, so the next request asks for it again rather than being served short forever.
+    """
+    for index, per_chunk, chunk in items:
+        if len(parts.get(index, [])) >= per_chunk:
+            key = _chunk_cache_key(chunk=chunk, question_type=question_type, per_chunk=per_chunk)
+            llm_cache.put(key, parts[index], prompt_version=PROMPT_VERSION)
+
+
+def _in_chunk_order(parts: dict[int, list]) -> list:
+    return [q for index in sorted(parts) for q in parts[index]]
+
+
+def _finalize_questions(all_questions: list, *, question_type: str, count: int) -> list[dict]:
+    with stage("postprocess"):
+        received = len(all_questions)
+
+        # Filter + dedupe
+        all_questions = [q for q in all_questions if not is_meta_question(q.get("question", ""))]
+        after_meta = len(all_questions)
+        all_questions = dedupe_questions(all_questions)
+        after_dedupe = len(all_questions)
 
+        # Trim
+        all_questions = all_questions[:count]
+
+        # Normalize
+        if question_type == "mcq":
+            all_questions = [normalize_mcq(q) for q in all_questions]
+        else:
+            all_questions = [normalize_saq(q) for q in all_questions]
+
+    inc("questions_dropped_total", received - after_meta, reason="meta")
+    inc("questions_dropped_total", after_meta - after_dedupe, reason="duplicate")
+    inc("questions_dropped_total", after_dedupe - len(all_questions), reason="over_count")
     return all_questions
 
 
-def explain_answer(*, question: str, correct_answer: str) -> str:
-    prompt = f"""
+async def _fetch_group(
+    *,
+    llm,
+    semaphore: asyncio.Semaphore,
+    timeout: float,
+    question_type: str,
+    items: list[tuple[int, int, str]],
+    chunk_total: int,
+) -> dict[int, list]:
+    parts: dict[int, list] = {}
+    # Cached output used because the provider is down; it may be expired or from another
+    # quota, so it is returned but never cached again under these chunks' keys
+    fallback: dict[int, list] = {}
+    wanted = items
+    for attempt in range(1 + GENERATION_MISSING_RETRIES):
+        if attempt:
+            inc("llm_retries_total", reason="missing")
+        prompt = build_request_input(question_type=question_type, items=wanted, chunk_total=chunk_total)
+        async with semaphore:
+            try:
+                response = await llm_caller.call(
+                    llm, kind="generate", timeout=timeout,
+                    model=LLM_MODEL, instructions=PROMPT_PREFIX, input=prompt,
+                )
+            except LLMUnavailableError:
+                # Down, or still failing at the deadline: the rest of the request goes on
+                # with what's cached for these chunks, if anything
+                logger.warning("LLM unavailable; using cached output for %d chunks", len(wanted))
+                fallback = await asyncio.to_thread(_cached_fallback, question_type=question_type, items=wanted)
+                break
+
+        _merge_parts(parts, _split_output(response.output_text, wanted, question_type))
+        wanted = _shortfall(parts, items)
+        if not wanted:
+            break
+
+    await asyncio.to_thread(_cache_parts, parts, question_type=question_type, items=items)
+    _merge_parts(parts, fallback)
+    return parts
+
+
+async def generate_questions_from_chunks_async(
+    *,
+    question_type: str,
+    count: int,
+    chunks: list[str],
+    quotas: list[int] | None = None,
+    chunks_per_request: int | None = None,
+    llm=None,
+    concurrency: int | None = None,
+    semaphore: asyncio.Semaphore | None = None,
+    timeout: float | None = None,
+) -> list[dict]:
+    """
+    `quotas` is how many questions to ask of each chunk; by default they're weighted by
+    the chunks' information content (see selection.question_quotas). Uncached chunks are
+    sent `chunks_per_request` (default CHUNKS_PER_REQUEST) to a call, every request at once
+    (at most `concurrency` in flight). Pass `semaphore` instead to share one cap between
+    several generations.
+
+    `llm` can be any object exposing an awaitable
+    `responses.create(model=..., instructions=..., input=...)`; it defaults to the
+    configured provider's client.
+    """
+    if not chunks:
+        return []
+
+    llm = llm or get_async_client()
+    timeout = LLM_TIMEOUT_S if timeout is None else timeout
+    semaphore = semaphore or asyncio.Semaphore(concurrency or LLM_CONCURRENCY)
+    quotas = _plan_quotas(question_type=question_type, count=count, chunks=chunks, quotas=quotas)
+    # The cache's SQLite tier blocks, so lookups run in a worker thread
+    parts, pending = await asyncio.to_thread(_lookup_cached, question_type=question_type, chunks=chunks, quotas=quotas)
+
+    fetched = await asyncio.gather(
+        *(
+            _fetch_group(
+                llm=llm,
+                semaphore=semaphore,
+                timeout=timeout,
+                question_type=question_type,
+                items=group,
+                chunk_total=len(chunks),
+            )
+            for group in _request_groups(pending, chunks_per_request or CHUNKS_PER_REQUEST)
+        )
+    )
+    for group_parts in fetched:
+        for index, part in group_parts.items():
+            parts.setdefault(index, []).extend(part)
+
+    return _finalize_questions(_in_chunk_order(parts), question_type=question_type, count=count)
+
+
+async def stream_questions_from_chunks(
+    *,
+    question_type: str,
+    count: int,
+    chunks: list[str],
+    quotas: list[int] | None = None,
+    chunks_per_request: int | None = None,
+    llm=None,
+    concurrency: int | None = None,
+    timeout: float | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Yields normalized questions as soon as their request returns (cached chunks first),
+    applying the same meta filter and running dedupe as _finalize_questions. Stops after
+    `count` questions and cancels whatever calls are still in flight.
+    """
+    if not chunks:
+        return
+
+    llm = llm or get_async_client()
+    timeout = LLM_TIMEOUT_S if timeout is None else timeout
+    semaphore = asyncio.Semaphore(concurrency or LLM_CONCURRENCY)
+    quotas = _plan_quotas(question_type=question_type, count=count, chunks=chunks, quotas=quotas)
+    normalize = normalize_mcq if question_type == "mcq" else normalize_saq
+    cached, pending = await asyncio.to_thread(_lookup_cached, question_type=question_type, chunks=chunks, quotas=quotas)
+
+    tasks = [
+        asyncio.create_task(
+            _fetch_group(
+                llm=llm,
+                semaphore=semaphore,
+                timeout=timeout,
+                question_type=question_type,
+                items=group,
+                chunk_total=len(chunks),
+            )
+        )
+        for group in _request_groups(pending, chunks_per_request or CHUNKS_PER_REQUEST)
+    ]
+
+    async def results():
+        yield _in_chunk_order(cached)
+        for next_done in asyncio.as_completed(tasks):
+            yield _in_chunk_order(await next_done)
+
+    seen: set[str] = set()
+    near = NearDuplicateFilter()
+    sent = 0
+    try:
+        async for batch in results():
+            for q in batch:
+                if not isinstance(q, dict) or is_meta_question(q.get("question", "")):
+                    inc("questions_dropped_total", reason="meta")
+                    continue
+                key = _question_key(q)
+                if not key or key in seen or not near.add_if_new(key):
+                    inc("questions_dropped_total", reason="duplicate")
+                    continue
+                seen.add(key)
+
+                yield normalize(q)
+                sent += 1
+                if sent >= count:
+                    return
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _explain_prompt(question: str, correct_answer: str) -> str:
+    return f"""
 You are an educational tutor.
 
 Explain why the following answer is correct.
@@ -243,8 +613,10 @@ Correct Answer:
 {correct_answer}
 """.strip()
 
-    response = client.responses.create(
-        model="gpt-5-mini",
-        input=prompt
+
+async def explain_answer_async(*, question: str, correct_answer: str, llm=None, timeout: float | None = None) -> str:
+    response = await llm_caller.call(
+        llm or get_async_client(), kind="explain", timeout=LLM_TIMEOUT_S if timeout is None else timeout,
+        model=LLM_MODEL, input=_explain_prompt(question, correct_answer),
     )
     return response.output_text
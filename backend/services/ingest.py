@@ -0,0 +1,325 @@
+"""
+Bulk ingestion: many PDFs (or zips of them) in, one saved deck per PDF out.
+
+    pdfs, failures = expand_uploads(files)
+    async for event in ingest(pdfs, question_type="mcq", count=10, failures=failures): ...
+
+    python -m backend.services.ingest lectures/*.pdf course.zip --type mcq --count 10
+
+Files are processed concurrently. Extraction runs on the PDF process pool, at most
+INGEST_EXTRACT_CONCURRENCY files at a time so queueing for a core doesn't count towards a
+file's extraction timeout. Generation shares INGEST_LLM_CONCURRENCY call slots across
+every batch in the process, so a large batch can't flood the provider. Finished decks
+are saved INGEST_SAVE_BATCH to a transaction. If a transaction fails, its decks are
+retried one by one.
+
+Progress is a stream of events, one per file per step ("extracted", "saved" or "failed"),
+ending with a summary. A failed file is reported and skipped; the rest of the batch goes on.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import zipfile
+from pathlib import PurePosixPath
+from typing import AsyncIterator
+
+from backend import crud
+from backend.db import SessionLocal
+from backend.services.explanations import explainer
+from backend.services.generation import generate_questions_from_chunks_async
+from backend.services.llm_calls import LLMUnavailableError
+from backend.services.metrics import inc
+from backend.services.pdf import PDF_MAX_BYTES, PDF_WORKERS, PdfExtractionTimeout, PdfTooLargeError
+from backend.services.pdf_cache import get_or_extract
+from backend.services.selection import max_chunks_for, select_chunks
+
+logger = logging.getLogger(__name__)
+
+
+INGEST_MAX_FILES = int(os.getenv("INGEST_MAX_FILES", "200"))
+# Uploads plus everything unpacked from zips, per batch
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_MB", "500")) * 1024 * 1024
+INGEST_EXTRACT_CONCURRENCY = int(os.getenv("INGEST_EXTRACT_CONCURRENCY", str(PDF_WORKERS)))
+INGEST_LLM_CONCURRENCY = int(os.getenv("INGEST_LLM_CONCURRENCY", "8"))
+INGEST_SAVE_BATCH = int(os.getenv("INGEST_SAVE_BATCH", "20"))
+
+# Shared by every batch in the process
+_llm_slots = asyncio.Semaphore(INGEST_LLM_CONCURRENCY)
+
+
+class IngestError(Exception):
+    """A file that can't become a deck; the message is reported for that file."""
+
+    def __init__(self, message: str, *, step: str = "generate"):
+        super().__init__(message)
+        self.step = step
+
+
+class BatchTooLargeError(Exception):
+    """The batch as a whole is over INGEST_MAX_FILES or INGEST_MAX_BYTES; nothing is ingested."""
+
+
+# ---- Inputs ----
+def _is_zip(name: str, data: bytes) -> bool:
+    return name.lower().endswith(".zip") or data[:4] == b"PK\x03\x04"
+
+
+def _is_pdf(data: bytes) -> bool:
+    # Readers accept junk before the header, so look in the first KB, not just at byte 0
+    return b"%PDF-" in data[:1024]
+
+
+def expand_uploads(
+    files: list[tuple[str, bytes]],
+    *,
+    max_files: int | None = None,
+    max_bytes: int | None = None,
+) -> tuple[list[tuple[str, bytes]], list[dict]]:
+    """
+    Unpacks zips into their PDFs. Returns ([(name, pdf bytes)], [failure events]). Zip entries
+    without a .pdf suffix are ignored; direct uploads without a %PDF header are recorded as
+    failed and skipped. Zip entries are counted and size-checked before they are
+    decompressed, and decompression stops at the entry's size limit. Raises
+    BatchTooLargeError as soon as the batch has more than `max_files` PDFs or `max_bytes`
+    in all (defaults INGEST_MAX_FILES, INGEST_MAX_BYTES).
+    """
+    max_files = max_files or INGEST_MAX_FILES
+    max_bytes = max_bytes or INGEST_MAX_BYTES
+    too_many = BatchTooLargeError(f"More than {max_files} PDFs in one batch")
+    too_big = BatchTooLargeError(f"More than {max_bytes // (1024 * 1024)} MB of PDFs in one batch")
+
+    pdfs: list[tuple[str, bytes]] = []
+    failures: list[dict] = []
+    total = 0
+    for name, data in files:
+        if not _is_zip(name, data):
+            if not _is_pdf(data):
+                failures.append(_failed(name, "read", "Not a PDF file"))
+                continue
+            total += len(data)
+            if len(pdfs) >= max_files:
+                raise too_many
+            if total > max_bytes:
+                raise too_big
+            pdfs.append((name, data))
+            continue
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                entries = [
+                    info
+                    for info in archive.infolist()
+                    if not info.is_dir()
+                    and PurePosixPath(info.filename).suffix.lower() == ".pdf"
+                    and PurePosixPath(info.filename).parts[0] != "__MACOSX"
+                ]
+                if len(pdfs) + len(entries) > max_files:
+                    raise too_many
+                for info in entries:
+                    entry = f"{name}/{info.filename}"
+                    if info.file_size > PDF_MAX_BYTES:
+                        failures.append(_failed(entry, "read", f"PDF is larger than {PDF_MAX_BYTES // (1024 * 1024)} MB"))
+                        continue
+                    if total + info.file_size > max_bytes:
+                        raise too_big
+                    # The header's size can lie; never decompress past the limit
+                    with archive.open(info) as f:
+                        pdf = f.read(min(PDF_MAX_BYTES, max_bytes - total) + 1)
+                    if len(pdf) > PDF_MAX_BYTES:
+                        failures.append(_failed(entry, "read", f"PDF is larger than {PDF_MAX_BYTES // (1024 * 1024)} MB"))
+                        continue
+                    total += len(pdf)
+                    if total > max_bytes:
+                        raise too_big
+                    pdfs.append((entry, pdf))
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError) as e:
+            failures.append(_failed(name, "read", f"Unreadable zip file: {e}"))
+    return pdfs, failures
+
+
+def _title(name: str) -> str:
+    return PurePosixPath(name).stem.replace("_", " ").strip() or "Untitled Deck"
+
+
+def _failed(name: str, step: str, error: str) -> dict:
+    inc("ingest_files_total", outcome="failed")
+    return {"file": name, "status": "failed", "step": step, "error": error}
+
+
+# ---- Pipeline ----
+async def _build(
+    name: str,
+    data: bytes,
+    *,
+    question_type: str,
+    count: int,
+    extract_slots: asyncio.Semaphore,
+    events: asyncio.Queue,
+) -> list[dict]:
+    async with extract_slots:
+        try:
+            text, chunks = await get_or_extract(data, max_chunks=max_chunks_for(count))
+        except (PdfTooLargeError, PdfExtractionTimeout) as e:
+            raise IngestError(str(e), step="extract")
+        except Exception as e:
+            raise IngestError(f"Could not read the PDF: {e}", step="extract")
+    selected_chunks = select_chunks(chunks, max_chunks=max_chunks_for(count))
+    if not text.strip() or not selected_chunks:
+        raise IngestError("No extractable text found in the PDF", step="extract")
+    events.put_nowait({"file": name, "status": "extracted", "chunks": len(chunks)})
+
+    try:
+        questions = await generate_questions_from_chunks_async(
+            question_type=question_type,
+            count=count,
+            chunks=selected_chunks,
+            semaphore=_llm_slots,
+        )
+    except LLMUnavailableError as e:
+        raise IngestError(str(e))
+    if not questions:
+        raise IngestError("No valid questions could be generated from the PDF text")
+    return questions
+
+
+def _save_decks(decks: list[tuple[str, list[dict]]]) -> list[tuple[int, int] | Exception]:
+    """
+    One transaction for the lot; if that fails, one per deck, so a bad deck only fails itself.
+    """
+    try:
+        with SessionLocal() as db:
+            return crud.create_decks(db, decks)
+    except Exception:
+        logger.exception("bulk save of %d decks failed, saving them one by one", len(decks))
+
+    results: list[tuple[int, int] | Exception] = []
+    for deck in decks:
+        try:
+            with SessionLocal() as db:
+                results.extend(crud.create_decks(db, [deck]))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+async def ingest(
+    pdfs: list[tuple[str, bytes]],
+    *,
+    question_type: str,
+    count: int,
+    failures: list[dict] | None = None,
+    save_batch: int | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Yields progress events for `pdfs` ([(file name, bytes)], see expand_uploads), then a
+    final {"done": true, ...} summary. `failures` are reported along the way.
+    """
+    save_batch = save_batch or INGEST_SAVE_BATCH
+    failures = failures or []
+
+    yield {"status": "started", "files": len(pdfs) + len(failures)}
+    for event in failures:
+        yield event
+
+    events: asyncio.Queue = asyncio.Queue()
+    built: asyncio.Queue = asyncio.Queue()
+    extract_slots = asyncio.Semaphore(INGEST_EXTRACT_CONCURRENCY)
+
+    async def build(name: str, data: bytes) -> None:
+        try:
+            questions = await _build(
+                name, data, question_type=question_type, count=count, extract_slots=extract_slots, events=events,
+            )
+        except IngestError as e:
+            events.put_nowait(_failed(name, e.step, str(e)))
+        except Exception as e:
+            logger.exception("ingesting %s failed", name)
+            events.put_nowait(_failed(name, "generate", str(e) or e.__class__.__name__))
+        else:
+            built.put_nowait((name, questions))
+        finally:
+            built.put_nowait(None)
+
+    async def save() -> None:
+        # Whatever has finished since the last save goes in the next transaction
+        remaining = len(pdfs)
+        while remaining:
+            batch = []
+            item = await built.get()
+            while True:
+                if item is None:
+                    remaining -= 1
+                else:
+                    batch.append(item)
+                if len(batch) >= save_batch or built.empty():
+                    break
+                item = built.get_nowait()
+            if not batch:
+                continue
+            results = await asyncio.to_thread(_save_decks, [(_title(name), questions) for name, questions in batch])
+            for (name, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    events.put_nowait(_failed(name, "save", str(result) or result.__class__.__name__))
+                    continue
+                document_id, card_count = result
+                inc("ingest_files_total", outcome="saved")
+                events.put_nowait({"file": name, "status": "saved", "document_id": document_id, "card_count": card_count})
+                explainer.schedule(document_id)
+        events.put_nowait(None)
+
+    tasks = [asyncio.create_task(build(name, data)) for name, data in pdfs]
+    saver = asyncio.create_task(save())
+    saved = 0
+    failed = len(failures)
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            saved += event["status"] == "saved"
+            failed += event["status"] == "failed"
+            yield event
+    finally:
+        # Stops the batch if the caller goes away; decks already saved stay saved
+        for task in (*tasks, saver):
+            task.cancel()
+
+    yield {"done": True, "saved": saved, "failed": failed}
+
+
+# ---- CLI ----
+async def _main(args) -> int:
+    from backend.db import engine
+    from backend.models import Base
+    from backend.services.pdf import shutdown_pdf_pool
+
+    Base.metadata.create_all(bind=engine)
+    files = []
+    for path in args.paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    try:
+        pdfs, failures = expand_uploads(files)
+    except BatchTooLargeError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    failed = 0
+    try:
+        async for event in ingest(pdfs, question_type=args.type, count=args.count, failures=failures):
+            print(json.dumps(event), flush=True)
+            failed = event.get("failed", failed)
+    finally:
+        shutdown_pdf_pool()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build one library deck per PDF; prints one JSON event per line.")
+    parser.add_argument("paths", nargs="+", help="PDF or zip files")
+    parser.add_argument("--type", default="mcq", choices=["mcq", "saq"])
+    parser.add_argument("--count", type=int, default=10, choices=[5, 10, 15, 20])
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import func, select, text, update
+
+from backend import crud
+from backend.db import SessionLocal
+from backend.models import GenerationJob
+from backend.services.deck_cache import deck_cache
+from backend.services.explanations import explainer
+from backend.services.generation import generate_questions_from_chunks_async
+from backend.services.pdf_cache import get_or_extract
+from backend.services.selection import max_chunks_for, select_chunks
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "50"))
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL_S", "2"))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+# ---- Queue (SQLite-backed) ----
+def submit_job(db, *, data: bytes, title: str, question_type: str, count: int) -> GenerationJob:
+    """
+    Persists a queued job. Raises QueueFullError once JOB_QUEUE_MAX jobs are waiting or running.
+    The count and the insert share one write transaction, so concurrent submits can't both
+    take the last place.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+    elif dialect == "postgresql":
+        # Readers go on; other submits wait for this one to commit
+        db.execute(text(f"LOCK TABLE {GenerationJob.__tablename__} IN EXCLUSIVE MODE"))
+    backlog = db.scalar(
+        select(func.count()).select_from(GenerationJob).where(GenerationJob.status.in_(("queued", "running")))
+    )
+    if backlog >= JOB_QUEUE_MAX:
+        db.rollback()
+        raise QueueFullError(f"{backlog} jobs already pending")
+
+    job = GenerationJob(
+        status="queued",
+        title=title.strip(),
+        question_type=question_type,
+        count=count,
+        pdf_data=data,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db, job_id: int) -> GenerationJob | None:
+    return db.get(GenerationJob, job_id)
+
+
+def _requeue_interrupted() -> int:
+    # Jobs left "running" by a previous process never finished
+    with SessionLocal() as db:
+        res = db.execute(
+            update(GenerationJob).where(GenerationJob.status == "running").values(status="queued", started_at=None)
+        )
+        db.commit()
+        return res.rowcount
+
+
+def _claim_next() -> tuple[int, bytes, str, int] | None:
+    with SessionLocal() as db:
+        while True:
+            job_id = db.scalar(
+                select(GenerationJob.id)
+                .where(GenerationJob.status == "queued")
+                .order_by(GenerationJob.id.asc())
+                .limit(1)
+            )
+            if job_id is None:
+                return None
+
+            # Conditional update so two workers can't claim the same row
+            res = db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.status == "queued")
+                .values(status="running", started_at=datetime.utcnow())
+            )
+            db.commit()
+            if res.rowcount == 1:
+                job = db.get(GenerationJob, job_id)
+                return job.id, job.pdf_data or b"", job.question_type, job.count
+
+
+def _finish(job_id: int, *, questions: list[dict] | None = None, error: str | None = None) -> int | None:
+    """
+    Marks the job done (saving its cards to a new document) or failed. Returns the document id.
+    The deck and the job's status go in one transaction, so a crash can't leave a saved deck
+    behind a job that _requeue_interrupted would run again.
+    """
+    with SessionLocal() as db:
+        job = db.get(GenerationJob, job_id)
+        if job is None:
+            return None
+
+        if error is None:
+            [(document_id, card_count)] = crud.create_decks(db, [(job.title, questions or [])], commit=False)
+            job.document_id = document_id
+            job.card_count = card_count
+            job.status = "done"
+        else:
+            job.error = error
+            job.status = "failed"
+
+        job.pdf_data = None
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        if job.document_id is not None:
+            deck_cache.bump(job.document_id)
+        return job.document_id
+
+
+# ---- Pipeline ----
+async def _run(job_id: int, data: bytes, question_type: str, count: int) -> None:
+    text, chunks = await get_or_extract(data, max_chunks=max_chunks_for(count))
+    selected_chunks = select_chunks(chunks, max_chunks=max_chunks_for(count))
+    if not text.strip() or not selected_chunks:
+        await asyncio.to_thread(_finish, job_id, error="No extractable text found in the PDF")
+        return
+
+    questions = await generate_questions_from_chunks_async(
+        question_type=question_type,
+        count=count,
+        chunks=selected_chunks,
+    )
+    if not questions:
+        await asyncio.to_thread(_finish, job_id, error="No valid questions could be generated from the PDF text")
+        return
+
+    document_id = await asyncio.to_thread(_finish, job_id, questions=questions)
+    if document_id is not None:
+        explainer.schedule(document_id)
+
+
+# ---- Worker pool ----
+class JobRunner:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+        self._stopping = False
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        await asyncio.to_thread(_requeue_interrupted)
+        for _ in range(self.workers):
+            self._spawn()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _spawn(self) -> None:
+        task = asyncio.create_task(self._worker())
+        task.add_done_callback(self._worker_done)
+        self._tasks.append(task)
+
+    def _worker_done(self, task: asyncio.Task) -> None:
+        # _worker only returns by being cancelled; anything else would shrink the pool for good
+        if self._stopping or task.cancelled():
+            return
+        logger.error("job worker died, starting a new one", exc_info=task.exception())
+        self._tasks.remove(task)
+        # After a pause, so a worker that dies straight away doesn't spin
+        asyncio.get_running_loop().call_later(JOB_POLL_INTERVAL_S, self._respawn)
+
+    def _respawn(self) -> None:
+        if not self._stopping:
+            self._spawn()
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                claimed = await asyncio.to_thread(_claim_next)
+            except Exception:
+                # Database locked or down: try again after the usual wait
+                logger.exception("claiming the next job failed")
+                claimed = None
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id = claimed[0]
+            try:
+                await _run(*claimed)
+            except asyncio.CancelledError:
+                # Shutdown mid-job: _requeue_interrupted picks it up on the next start
+                raise
+            except Exception as e:
+                logger.exception("job %d failed", job_id)
+                try:
+                    await asyncio.to_thread(_finish, job_id, error=str(e) or e.__class__.__name__)
+                except Exception:
+                    # Left "running": _requeue_interrupted runs it again on the next start
+                    logger.exception("recording the failure of job %d failed", job_id)
+
+
+job_runner = JobRunner(JOB_WORKERS)
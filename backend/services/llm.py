@@ -0,0 +1,53 @@
+"""
+LLM provider selection. Callers get clients from get_client() / get_async_client(), which
+return objects with the OpenAI Responses API shape: `responses.create(model=..., input=...,
+instructions=...)` returning something with `.output_text`.
+
+LLM_PROVIDER=openai (default) uses the OpenAI SDK. LLM_PROVIDER=fake uses the local,
+deterministic fake in services/fake_llm.py, for load tests and benchmarks without network
+access or spend. Clients are created on first use, not at import. Calls go through
+services/llm_calls.py for retries, hedging and the circuit breaker.
+"""
+import os
+
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-5-mini")
+
+_clients: dict[str, object] = {}
+
+
+def _create(kind: str):
+    if LLM_PROVIDER == "fake":
+        from backend.services.fake_llm import AsyncFakeLLM, FakeLLM
+
+        return AsyncFakeLLM.from_env() if kind == "async" else FakeLLM.from_env()
+    if LLM_PROVIDER == "openai":
+        from openai import AsyncOpenAI, OpenAI
+
+        cls = AsyncOpenAI if kind == "async" else OpenAI
+        # Retries are done by services/llm_calls.py, which also knows about the deadline
+        return cls(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    raise ValueError(f"unknown LLM_PROVIDER {LLM_PROVIDER!r} (expected 'openai' or 'fake')")
+
+
+def get_client():
+    if "sync" not in _clients:
+        _clients["sync"] = _create("sync")
+    return _clients["sync"]
+
+
+def get_async_client():
+    if "async" not in _clients:
+        _clients["async"] = _create("async")
+    return _clients["async"]
+
+
+def set_clients(*, sync=None, async_=None) -> None:
+    """
+    Replaces the process-wide clients, e.g. with a FakeLLM configured by a benchmark.
+    """
+    if sync is not None:
+        _clients["sync"] = sync
+    if async_ is not None:
+        _clients["async"] = async_
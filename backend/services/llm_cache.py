@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# Lives next to app.db (see backend/db.py)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.db")
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "2048"))
+
+
+def response_key(*, chunk: str, question_type: str, per_chunk: int, model: str, prompt_version: str) -> str:
+    raw = json.dumps([chunk, question_type, per_chunk, model, prompt_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Parsed per-chunk LLM output, stored as JSON in SQLite and fronted by a bounded LRU.
+
+    Values are handed out as fresh objects on every hit, so callers are free to
+    mutate them (normalize_mcq shuffles options in place).
+
+    Every call may touch SQLite, so coroutines go through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, *, ttl_s: float, memory_entries: int):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.memory_entries = memory_entries
+
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    prompt_version TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, payload: str, created_at: float) -> None:
+        self._memory[key] = (payload, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str, *, stale_ok: bool = False) -> list | None:
+        """
+        `stale_ok` returns an expired entry rather than dropping it, for when there is
+        nothing better (the provider is down).
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._db().execute(
+                    "SELECT payload, created_at FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._remember(key, *entry)
+            else:
+                self._memory.move_to_end(key)
+
+            if entry is not None and now - entry[1] > self.ttl_s and not stale_ok:
+                self._memory.pop(key, None)
+                self._db().execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._db().commit()
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return json.loads(entry[0])
+
+    def put(self, key: str, questions: list, *, prompt_version: str) -> None:
+        payload = json.dumps(questions)
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, payload, created_at)
+            self._db().execute(
+                "INSERT OR REPLACE INTO llm_responses (key, prompt_version, payload, created_at) VALUES (?, ?, ?, ?)",
+                (key, prompt_version, payload, created_at),
+            )
+            self._db().commit()
+
+    def invalidate(self, *, keep_prompt_version: str | None = None) -> int:
+        """
+        Drops every entry, or only those written under a different prompt version.
+        Returns the number of persisted rows removed.
+        """
+        with self._lock:
+            self._memory.clear()
+            if keep_prompt_version is None:
+                cur = self._db().execute("DELETE FROM llm_responses")
+            else:
+                cur = self._db().execute(
+                    "DELETE FROM llm_responses WHERE prompt_version != ?", (keep_prompt_version,)
+                )
+            self._db().commit()
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            rows = self._db().execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "stored_entries": rows,
+            }
+
+
+llm_cache = LLMResponseCache(
+    LLM_CACHE_PATH,
+    ttl_s=LLM_CACHE_TTL_S,
+    memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+)
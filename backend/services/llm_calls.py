@@ -0,0 +1,309 @@
+"""
+Guarded LLM calls: an overall deadline, jittered exponential backoff on transient errors,
+optional hedging and a circuit breaker. Every provider call in the app goes through here.
+
+    response = await llm_caller.call(llm, kind="generate", timeout=60, model=..., input=...)
+
+Each attempt gets the per-call timeout or whatever is left of LLM_DEADLINE_S, whichever
+is shorter. Transient failures (timeouts, dropped connections, 408/409/429/5xx) are retried
+up to LLM_RETRIES times after a random wait between 0 and LLM_RETRY_BASE_S * 2**attempt,
+capped at LLM_RETRY_MAX_S ("full jitter", so clients that failed together don't retry
+together). Anything else, e.g. a 400 or a bad key, is raised straight away.
+
+With LLM_HEDGE=1, a call still running at the LLM_HEDGE_QUANTILE latency of recent
+successful calls of its kind gets a second, identical request; whichever succeeds first
+is used and the other is cancelled. Hedging starts once LLM_HEDGE_MIN_SAMPLES calls have
+been timed.
+
+After LLM_BREAKER_FAILURES transient failures in a row the breaker opens: for the next
+LLM_BREAKER_RESET_S every call fails at once with CircuitOpenError. Then a single probe
+is let through, and its result closes the breaker or opens it again. Callers catch
+LLMUnavailableError (breaker open, or retries and deadline used up) and fall back to
+what they have cached.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from backend.services.metrics import METRICS_ENABLED, inc, stage
+from backend.services.tokens import count_tokens
+
+
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_RETRY_BASE_S = float(os.getenv("LLM_RETRY_BASE_S", "0.5"))
+LLM_RETRY_MAX_S = float(os.getenv("LLM_RETRY_MAX_S", "8"))
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "90"))
+
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Recent successful calls per kind that the hedge delay is taken from
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+
+
+class LLMUnavailableError(RuntimeError):
+    """The provider can't be reached right now: retries are used up or the breaker is open."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+def is_transient(e: BaseException) -> bool:
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # openai.APIStatusError and subclasses (RateLimitError, InternalServerError, ...)
+    status = getattr(e, "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409, 429) or status >= 500
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(e, openai.APIConnectionError)  # includes APITimeoutError
+
+
+def record_llm_call(kind: str, outcome: str, *, prompt: str = "", response=None) -> None:
+    if not METRICS_ENABLED:
+        return
+    inc("llm_calls_total", kind=kind, outcome=outcome)
+    if response is None:
+        return
+    # Provider-reported usage when there is one (it includes reasoning tokens), else estimated
+    usage = getattr(response, "usage", None)
+    if usage is not None and getattr(usage, "input_tokens", None) is not None:
+        input_tokens, output_tokens = usage.input_tokens, usage.output_tokens
+    else:
+        input_tokens, output_tokens = count_tokens(prompt), count_tokens(response.output_text)
+    inc("llm_tokens_total", input_tokens, kind=kind, direction="input")
+    inc("llm_tokens_total", output_tokens, kind=kind, direction="output")
+
+
+class LatencyTracker:
+    def __init__(self, *, window: int):
+        self.window = window
+        self._samples: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(kind, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, kind: str, q: float, *, min_samples: int) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples.get(kind, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class CircuitBreaker:
+    def __init__(self, *, failures: int, reset_s: float):
+        self.failures = failures
+        self.reset_s = reset_s
+
+        self._consecutive = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_s else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_s and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._probing or (self._opened_at is None and self._consecutive >= self.failures):
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                inc("llm_breaker_opens_total")
+            self._probing = False
+
+    def release(self) -> None:
+        """
+        The attempt ended without a verdict (cancelled); lets another probe through.
+        """
+        with self._lock:
+            self._probing = False
+
+
+class LLMCaller:
+    def __init__(
+        self,
+        *,
+        retries: int,
+        retry_base_s: float,
+        retry_max_s: float,
+        deadline_s: float,
+        hedge: bool,
+        hedge_quantile: float,
+        hedge_min_samples: int,
+        latency_window: int,
+        breaker_failures: int,
+        breaker_reset_s: float,
+    ):
+        self.retries = retries
+        self.retry_base_s = retry_base_s
+        self.retry_max_s = retry_max_s
+        self.deadline_s = deadline_s
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+
+        self.latency = LatencyTracker(window=latency_window)
+        self.breaker = CircuitBreaker(failures=breaker_failures, reset_s=breaker_reset_s)
+
+        self.attempts = 0
+        self.retried = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_max_s, self.retry_base_s * 2 ** attempt))
+
+    def _admit(self, kind: str) -> None:
+        if not self.breaker.allow():
+            record_llm_call(kind, "rejected")
+            raise CircuitOpenError("LLM provider circuit is open")
+        self.attempts += 1
+
+    def _settle(self, kind: str, started: float, request: dict, response=None, error: BaseException | None = None) -> None:
+        """
+        Books one finished attempt with the breaker, the latency window and the metrics.
+        """
+        if error is None:
+            self.breaker.record_success()
+            self.latency.add(kind, time.perf_counter() - started)
+            record_llm_call(kind, "ok", prompt=request.get("input", ""), response=response)
+        elif not isinstance(error, Exception):
+            self.breaker.release()
+        elif is_transient(error):
+            self.breaker.record_failure()
+            record_llm_call(kind, "timeout" if isinstance(error, (asyncio.TimeoutError, TimeoutError)) else "error")
+        else:
+            # The provider answered, just not with a result: no sign it's degraded
+            self.breaker.record_success()
+            record_llm_call(kind, "error")
+
+    # ---- Async ----
+    async def _one(self, llm, kind: str, timeout: float, request: dict):
+        started = time.perf_counter()
+        try:
+            with stage("llm_call"):
+                response = await asyncio.wait_for(llm.responses.create(**request), timeout=timeout)
+        except BaseException as e:
+            self._settle(kind, started, request, error=e)
+            raise
+        self._settle(kind, started, request, response=response)
+        return response
+
+    async def _hedged(self, llm, kind: str, timeout: float, request: dict):
+        delay = None
+        if self.hedge and self.breaker.state == "closed":
+            delay = self.latency.quantile(kind, self.hedge_quantile, min_samples=self.hedge_min_samples)
+        if delay is None or delay >= timeout:
+            return await self._one(llm, kind, timeout, request)
+
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        primary = asyncio.create_task(self._one(llm, kind, timeout, request))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.hedges += 1
+            inc("llm_hedges_total", kind=kind, outcome="sent")
+            self.attempts += 1
+            tasks.add(asyncio.create_task(self._one(llm, kind, end - loop.time(), request)))
+            error: BaseException = asyncio.TimeoutError()
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedges_won += 1
+                            inc("llm_hedges_total", kind=kind, outcome="won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, llm, *, kind: str, timeout: float | None = None, **request):
+        """
+        `request` is passed to llm.responses.create. Raises LLMUnavailableError when the
+        provider is down or slow past the deadline, and non-transient errors as they are.
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + self.deadline_s
+        for attempt in range(1 + self.retries):
+            self._admit(kind)
+            remaining = end - loop.time()
+            try:
+                return await self._hedged(llm, kind, min(timeout or remaining, remaining), request)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                wait = self._backoff(attempt)
+                if attempt == self.retries or loop.time() + wait >= end:
+                    raise LLMUnavailableError(f"LLM call failed after {attempt + 1} attempts: {e!r}") from e
+            self.retried += 1
+            inc("llm_retries_total", reason="transient")
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "retries": self.retried,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+            "rejected": self.breaker.rejected,
+        }
+
+
+llm_caller = LLMCaller(
+    retries=LLM_RETRIES,
+    retry_base_s=LLM_RETRY_BASE_S,
+    retry_max_s=LLM_RETRY_MAX_S,
+    deadline_s=LLM_DEADLINE_S,
+    hedge=LLM_HEDGE,
+    hedge_quantile=LLM_HEDGE_QUANTILE,
+    hedge_min_samples=LLM_HEDGE_MIN_SAMPLES,
+    latency_window=LLM_LATENCY_WINDOW,
+    breaker_failures=LLM_BREAKER_FAILURES,
+    breaker_reset_s=LLM_BREAKER_RESET_S,
+)
@@ -0,0 +1,135 @@
+"""
+Tolerant parsing of the JSON the model returns, so a paid call isn't thrown away over a
+markdown fence, a chatty preamble or a cut-off tail.
+
+JsonSalvager scans the text once, in pieces if it arrives in pieces, and keeps track of
+the last point at which an array element or object member was complete. If the text
+doesn't close properly, everything up to that point is kept and the open brackets are
+closed, so a truncated array still yields all of its complete objects.
+
+Objects then go through is_valid_question before normalize_mcq/normalize_saq, so a
+half-written question recovered from a truncated tail is dropped rather than saved.
+"""
+import json
+import string
+
+
+_CLOSERS = {"[": "]", "{": "}"}
+
+
+class JsonSalvager:
+    def __init__(self):
+        self._buf: list[str] = []
+        self._len = 0
+        self._started = False
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._broken = False
+        # End of the top-level value, once it has closed
+        self._end: int | None = None
+        # Last offset after which the text can be closed off, and the closers it needs
+        self._cut = 0
+        self._cut_closers = ""
+
+    def feed(self, piece: str) -> None:
+        if self._end is not None or self._broken:
+            return
+        if not self._started:
+            # Skips fences ("```json") and prose before the JSON proper
+            starts = [i for i in (piece.find("["), piece.find("{")) if i >= 0]
+            if not starts:
+                return
+            piece = piece[min(starts):]
+            self._started = True
+
+        offset = self._len
+        self._buf.append(piece)
+        self._len += len(piece)
+
+        for i, ch in enumerate(piece):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(ch)
+            elif ch in "]}":
+                if not self._stack or _CLOSERS[self._stack[-1]] != ch:
+                    self._broken = True
+                    return
+                self._stack.pop()
+                if not self._stack:
+                    self._end = offset + i + 1
+                    return
+                self._cut = offset + i + 1
+                self._cut_closers = "".join(_CLOSERS[c] for c in reversed(self._stack))
+
+    def result(self) -> tuple[object | None, bool]:
+        """
+        (value, complete): the parsed value, and whether it closed properly. For output that
+        was cut off the value holds what came before the cut; None if nothing was recoverable.
+        """
+        text = "".join(self._buf)
+        if self._end is not None:
+            try:
+                return json.loads(text[: self._end]), True
+            except json.JSONDecodeError:
+                pass
+        if self._cut:
+            try:
+                return json.loads(text[: self._cut] + self._cut_closers), False
+            except json.JSONDecodeError:
+                pass
+        return None, False
+
+
+def parse_llm_json(text: str) -> tuple[object | None, str]:
+    """
+    (value, status): "clean" when the text was valid JSON as it stood, "salvaged" when it
+    took unwrapping or closing off, "failed" when nothing could be recovered.
+    """
+    try:
+        return json.loads(text), "clean"
+    except (json.JSONDecodeError, TypeError):
+        pass
+    salvager = JsonSalvager()
+    salvager.feed(text or "")
+    value, _ = salvager.result()
+    return value, ("failed" if value is None else "salvaged")
+
+
+_SAQ_ANSWER_KEYS = ("answer", "model_answer", "correct_answer", "response", "solution")
+
+
+def is_valid_question(q, question_type: str) -> bool:
+    """
+    Whether `q` has the shape normalize_mcq / normalize_saq expect: a question, and either
+    2+ string options with a correct letter among them (MCQ) or a non-empty answer (SAQ).
+    The same key variants the normalizers accept are accepted here.
+    """
+    if not isinstance(q, dict):
+        return False
+    question = q.get("question")
+    if not isinstance(question, str) or not question.strip():
+        return False
+
+    if question_type == "mcq":
+        options = q.get("options") or q.get("choices") or q.get("answers")
+        if isinstance(options, dict):
+            options = [options[k] for k in sorted(options)]
+        if not isinstance(options, list) or len(options) < 2 or not all(isinstance(o, str) and o.strip() for o in options):
+            return False
+        letter = q.get("correct_answer")
+        if not isinstance(letter, str) or len(letter.strip()) != 1:
+            return False
+        index = string.ascii_uppercase.find(letter.strip().upper())
+        return 0 <= index < len(options)
+
+    answer = next((q[k] for k in _SAQ_ANSWER_KEYS if q.get(k)), None)
+    return answer is not None and bool(str(answer).strip())
@@ -0,0 +1,275 @@
+"""
+In-process metrics: counters and latency histograms, served in Prometheus text format on
+/metrics, plus optional per-request stage timings in a Server-Timing response header.
+
+    with stage("pdf_extract"): ...        # or @timed("chunk") on a function
+    inc("llm_calls_total", kind="generate", outcome="ok")
+
+With METRICS_ENABLED=0, stage() hands back a shared no-op context manager, @timed returns
+the function undecorated, inc()/observe() return straight away and neither the HTTP
+middleware nor the query counter is installed. METRICS_TIMING_HEADER=1 adds
+`Server-Timing` to every response: time per stage (summed over concurrent calls, so LLM
+time can exceed the wall clock) and the number of DB queries the request ran.
+
+Values are per process; with several workers, scrape each one.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "0") == "1"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+HELP = {
+    "http_requests_total": "HTTP requests by route, method and status",
+    "http_request_duration_seconds": "HTTP request latency by route",
+    "stage_duration_seconds": "Time spent in each pipeline stage",
+    "db_queries_total": "SQL statements executed",
+    "db_queries_per_request": "SQL statements executed per HTTP request, by route",
+    "llm_calls_total": "LLM call attempts by kind and outcome (rejected: circuit breaker open)",
+    "llm_tokens_total": "LLM tokens by kind and direction (provider usage, else the local estimate)",
+    "llm_outputs_total": "LLM generation outputs by parse result: clean, salvaged (fenced, wrapped or truncated) or failed",
+    "llm_retries_total": "Follow-up LLM calls, by reason (transient error, or questions missing)",
+    "llm_hedges_total": "Hedged LLM requests sent, and how many answered before the original",
+    "llm_breaker_opens_total": "Times the LLM circuit breaker opened",
+    "llm_fallbacks_total": "Generation requests served from cached output while the LLM was unavailable",
+    "questions_dropped_total": "Generated questions dropped, by reason",
+    "single_flight_requests_total": "Requests by whether they started a computation (leader) or joined one in flight (coalesced)",
+    "ingest_files_total": "Files in bulk ingestion batches, by outcome (saved or failed)",
+    "progress_events_dropped_total": "Buffered progress events dropped because they could not be applied",
+    "generation_top_ups_total": "Extra generation rounds after deck-level dedupe left a request short",
+}
+
+
+class _Registry:
+    def __init__(self):
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], list] = {}
+        self._buckets: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float, labels: tuple) -> None:
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: tuple, buckets: tuple) -> None:
+        key = (name, labels)
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                self._buckets.setdefault(name, buckets)
+                # [per-bucket counts (last is +Inf), sum, count]
+                h = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            h[0][bisect_left(self._buckets[name], value)] += 1
+            h[1] += value
+            h[2] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._histograms.items())
+
+        lines: list[str] = []
+        typed: set[str] = set()
+
+        def header(name: str, kind: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        for (name, labels), (counts, total, count) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            bounds = [f"{b:g}" for b in self._buckets[name]] + ["+Inf"]
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "".join(line + "\n" for line in lines)
+
+    def total(self, name: str, labels: tuple) -> float:
+        with self._lock:
+            return sum(
+                v for (n, series), v in self._counters.items() if n == name and set(labels) <= set(series)
+            )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+registry = _Registry()
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    if METRICS_ENABLED:
+        registry.inc(name, value, tuple(sorted(labels.items())))
+
+
+def observe(name: str, value: float, *, buckets: tuple = LATENCY_BUCKETS, **labels) -> None:
+    if METRICS_ENABLED:
+        registry.observe(name, value, tuple(sorted(labels.items())), buckets)
+
+
+def render() -> str:
+    return registry.render()
+
+
+def counter_total(name: str, **labels) -> float:
+    """
+    Sum of a counter over every series matching `labels`, e.g. for benchmark reports.
+    """
+    return registry.total(name, tuple(labels.items()))
+
+
+# ---- Per-request state ----
+class _RequestStats:
+    __slots__ = ("stages", "queries")
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.queries = 0
+
+
+# Set by the HTTP middleware; copied into threads by asyncio.to_thread / run_in_threadpool,
+# so work done on a request's behalf in a worker thread still counts towards it
+_current: contextvars.ContextVar[_RequestStats | None] = contextvars.ContextVar("request_stats", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        registry.observe("stage_duration_seconds", elapsed, (("stage", self.name),), LATENCY_BUCKETS)
+        stats = _current.get()
+        if stats is not None:
+            stats.stages[self.name] = stats.stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+_NOOP = nullcontext()
+
+
+def stage(name: str):
+    return _Stage(name) if METRICS_ENABLED else _NOOP
+
+
+def timed(name: str):
+    """
+    Decorator form of stage() for plain and async functions.
+    """
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with _Stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ---- Integrations ----
+def _count_query(*_args) -> None:
+    registry.inc("db_queries_total", 1, ())
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+
+
+def instrument_engine(engine) -> None:
+    """
+    Counts every statement run on `engine` (a sync Engine; pass async_engine.sync_engine).
+    """
+    if METRICS_ENABLED:
+        from sqlalchemy import event
+
+        event.listen(engine, "before_cursor_execute", _count_query)
+
+
+def _server_timing(stats: _RequestStats, total: float) -> str:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stats.stages.items()]
+    parts.append(f'db;desc="{stats.queries} queries"')
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (BaseHTTPMiddleware costs a task and a memory stream per request).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if METRICS_TIMING_HEADER:
+                    header = _server_timing(stats, time.perf_counter() - start).encode("latin-1")
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            # The route template, not the raw path, so ids don't blow up the label set
+            route = getattr(scope.get("route"), "path", "unmatched")
+            observe("http_request_duration_seconds", elapsed, route=route, method=scope["method"])
+            observe("db_queries_per_request", stats.queries, buckets=COUNT_BUCKETS, route=route)
+            inc("http_requests_total", route=route, method=scope["method"], status=status)
@@ -0,0 +1,255 @@
+"""
+Near-duplicate detection for questions: MinHash signatures + LSH banding.
+
+Each question becomes a set of word unigrams and bigrams; NUM_PERM min-hashes estimate the
+Jaccard similarity of two such sets, and BANDS x ROWS banding turns the signature into
+bucket keys so candidates are found by index lookup rather than by scanning a deck.
+"""
+import argparse
+import os
+import re
+import zlib
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.models import Card, CardLshBucket, CardSignature
+
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Estimated Jaccard similarity at or above which two questions count as duplicates
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.6"))
+
+# Texts per lookup query; keeps the bucket IN (...) list under SQLite's parameter limit
+LOOKUP_BATCH = 200
+
+_rng = np.random.default_rng(0x5EED)  # fixed: signatures are persisted
+_A = _rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 2**63, size=ROWS, dtype=np.uint64) | np.uint64(1)
+_BAND_SALT = _rng.integers(0, 2**63, size=BANDS, dtype=np.uint64)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    """
+    a an the of in on at to for by with from and or is are was were be been being what which who whom
+    whose when where why how does do did can could would should will shall may might must this that
+    these those it its as into than then there their they them following best most
+    """.split()
+)
+
+
+def _tokens(text: str) -> list[str]:
+    words = []
+    for w in _WORD.findall((text or "").lower()):
+        if w in _STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]
+        words.append(w)
+    return words
+
+
+def _shingles(text: str) -> set[str]:
+    words = _tokens(text)
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    # Stable across processes (unlike hash()), and much cheaper than a cryptographic digest
+    shingles = [s.encode("utf-8") for s in _shingles(text)]
+    return np.fromiter(
+        ((zlib.crc32(s) << 32) | zlib.adler32(s) for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+def _permuted_min(hashes: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    # Multiply-shift hashing: one independent-ish permutation per row, mod 2**64
+    with np.errstate(over="ignore"):
+        permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) >> np.uint64(32)
+    return np.minimum.reduceat(permuted, offsets, axis=1).T.astype(np.uint32)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    hashes = _shingle_hashes(text)
+    if not len(hashes):
+        return np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+    return _permuted_min(hashes, np.array([0]))[0]
+
+
+def minhash_signatures(texts: list[str]) -> list[np.ndarray]:
+    """
+    Vectorised minhash_signature over many texts: one permutation pass for the whole batch.
+    """
+    per_text = [_shingle_hashes(t) for t in texts]
+    non_empty = [i for i, h in enumerate(per_text) if len(h)]
+
+    out = [np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32) for _ in texts]
+    if not non_empty:
+        return out
+
+    lengths = np.array([len(per_text[i]) for i in non_empty])
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    sigs = _permuted_min(np.concatenate([per_text[i] for i in non_empty]), offsets)
+    for row, i in enumerate(non_empty):
+        out[i] = sigs[row]
+    return out
+
+
+def band_buckets(signature: np.ndarray) -> list[int]:
+    """
+    One signed 64-bit bucket key per band; the per-band salt keeps keys from colliding across bands.
+    """
+    rows = signature.reshape(BANDS, ROWS).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        keys = (rows * _BAND_MIX).sum(axis=1) + _BAND_SALT
+    return keys.view(np.int64).tolist()
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+class NearDuplicateFilter:
+    """
+    In-memory LSH index for one batch of questions (e.g. a single generation request).
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self._buckets: dict[int, list[int]] = {}
+        self._signatures: list[np.ndarray] = []
+
+    def add_if_new(self, text: str, signature: np.ndarray | None = None) -> bool:
+        """
+        Returns False (and indexes nothing) if `text` is a near duplicate of something already added.
+        Pass `signature` when it has already been computed.
+        """
+        sig = minhash_signature(text) if signature is None else signature
+        buckets = band_buckets(sig)
+
+        candidates = {i for b in buckets for i in self._buckets.get(b, ())}
+        if any(similarity(sig, self._signatures[i]) >= self.threshold for i in candidates):
+            return False
+
+        idx = len(self._signatures)
+        self._signatures.append(sig)
+        for b in buckets:
+            self._buckets.setdefault(b, []).append(idx)
+        return True
+
+
+# ---- Persisted per-document index ----
+def find_duplicates(
+    db: Session,
+    document_id: int,
+    texts: list[str],
+    threshold: float = NEAR_DUP_THRESHOLD,
+    *,
+    signatures: list[np.ndarray] | None = None,
+) -> list[int | None]:
+    """
+    For each text, the id of an existing card in the document it nearly duplicates, or None.
+    Costs one bucket query and one signature query per LOOKUP_BATCH texts.
+    """
+    if signatures is None:
+        signatures = minhash_signatures(texts)
+
+    out: list[int | None] = []
+    for start in range(0, len(signatures), LOOKUP_BATCH):
+        out.extend(_find_duplicates_batch(db, document_id, signatures[start:start + LOOKUP_BATCH], threshold))
+    return out
+
+
+def _find_duplicates_batch(db: Session, document_id: int, sigs: list[np.ndarray], threshold: float) -> list[int | None]:
+    buckets = [band_buckets(s) for s in sigs]
+
+    all_buckets = {b for bs in buckets for b in bs}
+    by_bucket: dict[int, list[int]] = {}
+    for bucket, card_id in db.execute(
+        select(CardLshBucket.bucket, CardLshBucket.card_id).where(
+            CardLshBucket.document_id == document_id,
+            CardLshBucket.bucket.in_(all_buckets),
+        )
+    ):
+        by_bucket.setdefault(bucket, []).append(card_id)
+
+    candidate_ids = {c for ids in by_bucket.values() for c in ids}
+    stored: dict[int, np.ndarray] = {}
+    if candidate_ids:
+        for card_id, raw in db.execute(
+            select(CardSignature.card_id, CardSignature.signature).where(CardSignature.card_id.in_(candidate_ids))
+        ):
+            stored[card_id] = np.frombuffer(raw, dtype=np.uint32)
+
+    out: list[int | None] = []
+    for sig, bs in zip(sigs, buckets):
+        match = None
+        for card_id in {c for b in bs for c in by_bucket.get(b, ())}:
+            if card_id in stored and similarity(sig, stored[card_id]) >= threshold:
+                match = card_id
+                break
+        out.append(match)
+    return out
+
+
+def index_cards(db: Session, document_id: int, cards: list[tuple[int, str | np.ndarray]]) -> None:
+    """
+    Adds (card_id, question or its signature) pairs to the document's index. The caller commits.
+    """
+    sig_rows = []
+    bucket_rows = []
+    for card_id, question in cards:
+        sig = minhash_signature(question) if isinstance(question, str) else question
+        sig_rows.append({"card_id": card_id, "document_id": document_id, "signature": sig.tobytes()})
+        bucket_rows.extend(
+            {"document_id": document_id, "bucket": b, "card_id": card_id} for b in band_buckets(sig)
+        )
+
+    if sig_rows:
+        db.execute(CardSignature.__table__.insert(), sig_rows)
+        db.execute(CardLshBucket.__table__.insert(), bucket_rows)
+
+
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """
+    Indexes cards saved before signatures existed. Returns how many were added.
+    """
+    total = 0
+    while True:
+        rows = db.execute(
+            select(Card.id, Card.document_id, Card.question)
+            .outerjoin(CardSignature, CardSignature.card_id == Card.id)
+            .where(CardSignature.card_id.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+
+        by_doc: dict[int, list[tuple[int, str]]] = {}
+        for card_id, document_id, question in rows:
+            by_doc.setdefault(document_id, []).append((card_id, question))
+        for document_id, cards in by_doc.items():
+            index_cards(db, document_id, cards)
+        db.commit()
+        total += len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the near-duplicate question index.")
+    parser.add_argument("--backfill", action="store_true", help="index cards that have no signature yet")
+    args = parser.parse_args()
+
+    if args.backfill:
+        from backend.db import SessionLocal, engine
+        from backend.models import Base
+
+        Base.metadata.create_all(bind=engine)
+        with SessionLocal() as session:
+            print(f"indexed {backfill(session)} cards")
@@ -1,14 +1,136 @@
+import asyncio
+import functools
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from pypdf import PdfReader
 
+from backend.services.metrics import timed
+from backend.services.tokens import count_tokens, split_sentences
+
+
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_MB", "50")) * 1024 * 1024
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "500"))
+PDF_EXTRACT_TIMEOUT_S = float(os.getenv("PDF_EXTRACT_TIMEOUT_S", "60"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+
+# "full" extracts every page; "sampled" only page windows spread across the document
+PDF_EXTRACTION_MODE = os.getenv("PDF_EXTRACTION_MODE", "full")
+PDF_SAMPLE_MAX_WINDOW_PAGES = int(os.getenv("PDF_SAMPLE_MAX_WINDOW_PAGES", "8"))
+# Windows read per chunk wanted, so the chunk selector still has a choice in sampled mode
+PDF_SAMPLE_OVERSAMPLE = 2
+PDF_SAMPLE_MIN_WINDOWS = 4
+
+# "tokens" packs chunks up to CHUNK_TOKENS tokens; "chars" is the old fixed 1,800-character split
+CHUNKER = os.getenv("CHUNKER", "tokens")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "1200"))
+
+# Below this many pages per worker, splitting costs more than it saves
+PDF_MIN_PAGES_PER_TASK = 16
+
+
+class PdfTooLargeError(ValueError):
+    pass
+
+
+class PdfExtractionTimeout(TimeoutError):
+    pass
+
 
 def extract_pdf_text(file) -> str:
     reader = PdfReader(file)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() or ""
-    return text
+    return "".join(page.extract_text() or "" for page in reader.pages)
+
+
+def count_pdf_pages(data: bytes) -> int:
+    return len(PdfReader(io.BytesIO(data)).pages)
+
+
+def _extract_page_range(data: bytes, start: int, stop: int) -> str:
+    # Runs in a worker process; every worker parses its own reader
+    reader = PdfReader(io.BytesIO(data))
+    return "".join(reader.pages[i].extract_text() or "" for i in range(start, stop))
+
+
+def _page_ranges(page_count: int, workers: int) -> list[tuple[int, int]]:
+    parts = max(1, min(workers, page_count // PDF_MIN_PAGES_PER_TASK))
+    size, extra = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+_pool: ProcessPoolExecutor | None = None
+
 
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: don't fork a process that is running an event loop and threads
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
 
+
+def shutdown_pdf_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _check_size(data: bytes) -> None:
+    if len(data) > PDF_MAX_BYTES:
+        raise PdfTooLargeError(f"PDF is larger than {PDF_MAX_BYTES // (1024 * 1024)} MB")
+
+
+@timed("pdf_extract")
+async def extract_pdf_text_parallel(
+    data: bytes,
+    *,
+    max_pages: int | None = None,
+    timeout: float | None = None,
+) -> str:
+    """
+    Extracts text off the event loop, splitting the page range across the process pool
+    and joining the parts in page order.
+
+    Raises PdfTooLargeError above the size/page limits and PdfExtractionTimeout when the
+    document takes longer than `timeout`; on timeout its not-yet-started ranges are dropped,
+    so a single huge PDF holds a core for at most one range.
+    """
+    max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+    timeout = PDF_EXTRACT_TIMEOUT_S if timeout is None else timeout
+
+    _check_size(data)
+
+    page_count = await asyncio.to_thread(count_pdf_pages, data)
+    if page_count > max_pages:
+        raise PdfTooLargeError(f"PDF has {page_count} pages (limit is {max_pages})")
+
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    futures = [
+        loop.run_in_executor(pool, _extract_page_range, data, start, stop)
+        for start, stop in _page_ranges(page_count, PDF_WORKERS)
+    ]
+
+    try:
+        parts = await asyncio.wait_for(asyncio.gather(*futures), timeout=timeout)
+    except asyncio.TimeoutError:
+        for f in futures:
+            f.cancel()
+        raise PdfExtractionTimeout(f"PDF text extraction took longer than {timeout:g}s")
+
+    return "".join(parts)
+
+
+@timed("chunk")
 def chunk_text(text: str, max_chars: int = 1800) -> list[str]:
     """
     Splits text into roughly max_chars chunks on paragraph boundaries when possible.
@@ -34,9 +156,60 @@ def chunk_text(text: str, max_chars: int = 1800) -> list[str]:
     return chunks
 
 
+def _split_to_budget(unit: str, max_tokens: int) -> list[tuple[str, int]]:
+    """
+    (piece, tokens) pairs for a paragraph too long for one chunk: whole sentences where
+    possible, word runs for a sentence that is itself over budget.
+    """
+    pieces: list[tuple[str, int]] = []
+    for sentence in split_sentences(unit):
+        n = count_tokens(sentence)
+        if n <= max_tokens:
+            pieces.append((sentence, n))
+            continue
+        words = sentence.split()
+        step = max(1, len(words) * max_tokens // n)
+        for i in range(0, len(words), step):
+            part = " ".join(words[i:i + step])
+            pieces.append((part, count_tokens(part)))
+    return pieces
+
+
+@timed("chunk")
+def chunk_text_tokens(text: str, max_tokens: int = CHUNK_TOKENS) -> list[str]:
+    """
+    Packs paragraphs (lines, as pypdf emits them) into chunks of at most max_tokens tokens,
+    splitting an over-long paragraph at sentence boundaries.
+    """
+    if not text:
+        return []
+
+    chunks: list[str] = []
+    buf: list[str] = []
+    buf_tokens = 0
+
+    for para in (p.strip() for p in text.split("\n")):
+        if not para:
+            continue
+        n = count_tokens(para)
+        pieces = [(para, n)] if n <= max_tokens else _split_to_budget(para, max_tokens)
+        for piece, n in pieces:
+            # +1 for the newline joining it to the buffer
+            if buf and buf_tokens + n + 1 > max_tokens:
+                chunks.append("\n".join(buf))
+                buf, buf_tokens = [], 0
+            buf.append(piece)
+            buf_tokens += n + (1 if len(buf) > 1 else 0)
+
+    if buf:
+        chunks.append("\n".join(buf))
+    return chunks
+
+
 def pick_spread_chunks(chunks: list[str], max_chunks: int = 4) -> list[str]:
     """
-    Picks chunks spread across the document (start/middle/end) to cover more content.
+    Picks chunks spread across the document (start/middle/end) to cover more content: the
+    middle of each of `max_chunks` equal stretches, so a single pick is the middle chunk.
     """
     if not chunks:
         return []
@@ -44,6 +217,111 @@ def pick_spread_chunks(chunks: list[str], max_chunks: int = 4) -> list[str]:
     if len(chunks) <= max_chunks:
         return chunks
 
-    idxs = [round(i * (len(chunks) - 1) / (max_chunks - 1)) for i in range(max_chunks)]
-    idxs = sorted(set(idxs))
-    return [chunks[i] for i in idxs]
+    return [chunks[i] for i in _spread_indices(len(chunks), max_chunks)]
+
+
+def _spread_indices(total: int, k: int) -> list[int]:
+    # Middles rather than ends: the first and last pages are mostly cover, contents and references
+    k = max(1, min(k, total))
+    return sorted({int((i + 0.5) * total / k) for i in range(k)})
+
+
+def sampled_window_count(max_chunks: int) -> int:
+    """
+    Page windows extract_sampled_chunks should read when `max_chunks` chunks are wanted.
+    """
+    return max(PDF_SAMPLE_OVERSAMPLE * max_chunks, PDF_SAMPLE_MIN_WINDOWS)
+
+
+def extract_sampled_chunks(
+    data: bytes,
+    *,
+    max_chunks: int = 4,
+    max_chars: int = 1800,
+    max_tokens: int | None = None,
+    max_window_pages: int = PDF_SAMPLE_MAX_WINDOW_PAGES,
+) -> list[str]:
+    """
+    Lazy counterpart of chunk_text + pick_spread_chunks: picks `max_chunks` page windows
+    spread across the document (start/middle/end) and only extracts those pages. A window grows one page
+    at a time, forwards and then backwards without crossing its neighbours, until it holds
+    about one chunk of text. With max_tokens, chunks are sized in tokens instead of characters.
+    """
+    reader = PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+    if not page_count:
+        return []
+
+    page_text: dict[int, str] = {}
+
+    def text_of(i: int) -> str:
+        if i not in page_text:
+            page_text[i] = reader.pages[i].extract_text() or ""
+        return page_text[i]
+
+    if max_tokens:
+        size, chunk = count_tokens, functools.partial(chunk_text_tokens, max_tokens=max_tokens)
+        min_size = max_tokens // 2
+    else:
+        size, chunk = len, functools.partial(chunk_text, max_chars=max_chars)
+        min_size = max_chars // 2
+
+    anchors = _spread_indices(page_count, min(max_chunks, page_count))
+    chunks: list[str] = []
+    taken_until = 0  # first page not yet used by an earlier window
+
+    for n, anchor in enumerate(anchors):
+        next_anchor = anchors[n + 1] if n + 1 < len(anchors) else page_count
+        first = last = max(anchor, taken_until)
+        if first >= page_count:
+            break
+
+        window = text_of(first)
+        while size(window.strip()) < min_size and last - first + 1 < max_window_pages:
+            if last + 1 < next_anchor:
+                last += 1
+                window = window + text_of(last)
+            elif first - 1 >= taken_until:
+                first -= 1
+                window = text_of(first) + window
+            else:
+                break
+        taken_until = last + 1
+
+        window_chunks = chunk(window)
+        if not window_chunks:
+            continue
+        # The end-of-document window prefers its tail, like pick_spread_chunks' last pick,
+        # but skips a short leftover fragment
+        if last == page_count - 1 and n > 0:
+            window_chunks = window_chunks[::-1]
+        chunks.append(next((c for c in window_chunks if size(c) >= min_size), max(window_chunks, key=size)))
+
+    return chunks
+
+
+@timed("pdf_extract")
+async def extract_sampled_chunks_parallel(
+    data: bytes,
+    *,
+    max_chunks: int = 4,
+    max_chars: int = 1800,
+    max_tokens: int | None = None,
+    timeout: float | None = None,
+) -> list[str]:
+    """
+    Runs extract_sampled_chunks in the process pool under the same limits as
+    extract_pdf_text_parallel. No page limit applies since only a few pages are read.
+    """
+    timeout = PDF_EXTRACT_TIMEOUT_S if timeout is None else timeout
+    _check_size(data)
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        _get_pool(),
+        functools.partial(extract_sampled_chunks, data, max_chunks=max_chunks, max_chars=max_chars, max_tokens=max_tokens),
+    )
+    try:
+        return await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise PdfExtractionTimeout(f"PDF text extraction took longer than {timeout:g}s")
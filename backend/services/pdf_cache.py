@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from backend.services.pdf import (
+    CHUNK_TOKENS,
+    CHUNKER,
+    PDF_EXTRACTION_MODE,
+    chunk_text,
+    chunk_text_tokens,
+    extract_pdf_text_parallel,
+    extract_sampled_chunks_parallel,
+    sampled_window_count,
+)
+
+
+PDF_CACHE_DIR = Path(os.getenv("PDF_CACHE_DIR", ".cache/pdf"))
+PDF_CACHE_MEMORY_BYTES = int(os.getenv("PDF_CACHE_MEMORY_MB", "64")) * 1024 * 1024
+PDF_CACHE_DISK_BYTES = int(os.getenv("PDF_CACHE_DISK_MB", "512")) * 1024 * 1024
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class PdfCache:
+    """
+    Two-level LRU of extracted text + chunks, keyed by a hash of the uploaded bytes.
+    Both levels are bounded by size in bytes; the disk level survives restarts.
+    """
+
+    def __init__(self, directory: Path, memory_limit: int, disk_limit: int):
+        self.directory = directory
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+
+        self._memory: OrderedDict[str, tuple[str, list[str], int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: int | None = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ---- memory level ----
+    def _remember(self, key: str, text: str, chunks: list[str]) -> None:
+        size = len(text.encode("utf-8")) + sum(len(c.encode("utf-8")) for c in chunks)
+        if size > self.memory_limit:
+            return
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[2]
+        self._memory[key] = (text, chunks, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_limit:
+            _, (_, _, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted
+
+    # ---- disk level ----
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _scan_disk(self) -> int:
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(p.stat().st_size for p in self.directory.glob("*.json")) if self.directory.exists() else 0
+        return self._disk_bytes
+
+    def _read_disk(self, key: str) -> tuple[str, list[str]] | None:
+        path = self._path(key)
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # mtime doubles as LRU timestamp
+        except (OSError, ValueError):
+            return None
+        return payload["text"], payload["chunks"]
+
+    def _write_disk(self, key: str, text: str, chunks: list[str]) -> None:
+        raw = json.dumps({"text": text, "chunks": chunks}).encode("utf-8")
+        if len(raw) > self.disk_limit:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._scan_disk()
+
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(raw)
+        previous = path.stat().st_size if path.exists() else 0
+        os.replace(tmp, path)
+        self._disk_bytes += len(raw) - previous
+
+        if self._disk_bytes > self.disk_limit:
+            files = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+            for old in files:
+                if self._disk_bytes <= self.disk_limit:
+                    break
+                if old == path:
+                    continue
+                size = old.stat().st_size
+                old.unlink(missing_ok=True)
+                self._disk_bytes -= size
+
+    # ---- public ----
+    def _get_memory(self, key: str) -> tuple[str, list[str]] | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def _get_disk(self, key: str) -> tuple[str, list[str]] | None:
+        with self._lock:
+            found = self._read_disk(key)
+            if found is not None:
+                self._remember(key, *found)
+                self.hits += 1
+                self.disk_hits += 1
+                return found
+
+            self.misses += 1
+            return None
+
+    def get(self, key: str) -> tuple[str, list[str]] | None:
+        found = self._get_memory(key)
+        return found if found is not None else self._get_disk(key)
+
+    def put(self, key: str, text: str, chunks: list[str]) -> None:
+        with self._lock:
+            self._remember(key, text, chunks)
+            self._write_disk(key, text, chunks)
+
+    async def aget(self, key: str) -> tuple[str, list[str]] | None:
+        """
+        get() for coroutines: memory hits are answered inline, the disk read runs in a
+        worker thread so it doesn't stall the event loop.
+        """
+        found = self._get_memory(key)
+        return found if found is not None else await asyncio.to_thread(self._get_disk, key)
+
+    async def aput(self, key: str, text: str, chunks: list[str]) -> None:
+        await asyncio.to_thread(self.put, key, text, chunks)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._scan_disk(),
+            }
+
+
+pdf_cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MEMORY_BYTES, PDF_CACHE_DISK_BYTES)
+
+
+async def get_or_extract(
+    data: bytes,
+    *,
+    max_chars: int | None = None,
+    max_tokens: int | None = None,
+    mode: str | None = None,
+    max_chunks: int = 4,
+) -> tuple[str, list[str]]:
+    """
+    Returns (text, chunks) for the PDF bytes, only running pypdf on a cache miss. Chunks are
+    sized by max_tokens or max_chars; with neither, by the CHUNKER setting.
+
+    In "sampled" mode only spread page windows are read, about twice `max_chunks` of them
+    (see sampled_window_count) for select_chunks to choose from, and `text` is just their
+    concatenation.
+    """
+    mode = mode or PDF_EXTRACTION_MODE
+    if max_chars is None and max_tokens is None:
+        if CHUNKER == "tokens":
+            max_tokens = CHUNK_TOKENS
+        else:
+            max_chars = 1800
+    # Hashing tens of MB takes a while; hashlib releases the GIL, so do it off the loop
+    digest = await asyncio.to_thread(content_hash, data)
+    key = f"{digest}-t{max_tokens}" if max_tokens else f"{digest}-{max_chars}"
+    windows = sampled_window_count(max_chunks)
+    if mode == "sampled":
+        key += f"-sampled{windows}"
+
+    cached = await pdf_cache.aget(key)
+    if cached is not None:
+        return cached
+
+    if mode == "sampled":
+        chunks = await extract_sampled_chunks_parallel(
+            data, max_chunks=windows, max_chars=max_chars or 1800, max_tokens=max_tokens
+        )
+        text = "\n".join(chunks)
+    else:
+        text = await extract_pdf_text_parallel(data)
+        chunks = chunk_text_tokens(text, max_tokens) if max_tokens else chunk_text(text, max_chars=max_chars)
+    await pdf_cache.aput(key, text, chunks)
+    return text, chunks
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy.exc import OperationalError
+
+from backend import crud
+from backend.db import SessionLocal
+from backend.services.metrics import inc
+
+logger = logging.getLogger(__name__)
+
+
+# Off by default: buffered answers are lost if the process dies before a flush
+PROGRESS_WRITE_BEHIND = os.getenv("PROGRESS_WRITE_BEHIND", "0") == "1"
+PROGRESS_FLUSH_EVENTS = int(os.getenv("PROGRESS_FLUSH_EVENTS", "500"))
+PROGRESS_FLUSH_INTERVAL_S = float(os.getenv("PROGRESS_FLUSH_INTERVAL_S", "1.0"))
+# Past this many pending events add() refuses more and callers write directly
+PROGRESS_BUFFER_MAX_EVENTS = int(os.getenv("PROGRESS_BUFFER_MAX_EVENTS", "50000"))
+
+
+def _apply(events: list[dict]) -> int:
+    with SessionLocal() as db:
+        return crud.record_progress_batch(db, events)
+
+
+def _apply_each(events: list[dict]) -> tuple[int, list[dict]]:
+    """
+    Applies events one transaction each. Returns (applied, events to retry): an event that
+    fails because the database is unavailable is kept, any other failure drops it.
+    """
+    applied = 0
+    retry = []
+    for event in events:
+        try:
+            applied += _apply([event])
+        except OperationalError:
+            retry.append(event)
+        except Exception:
+            logger.exception("dropping progress event that can't be applied: %r", event)
+            inc("progress_events_dropped_total")
+    return applied, retry
+
+
+class ProgressBuffer:
+    """
+    In-process write-behind buffer for progress events. Flushes as one batch transaction
+    when `max_events` are pending, every `interval_s`, and on stop(). A batch that fails
+    twice in a row is applied event by event, so one bad event can't hold up the rest.
+    """
+
+    def __init__(self, *, max_events: int, interval_s: float, max_pending: int):
+        self.max_events = max_events
+        self.interval_s = interval_s
+        self.max_pending = max_pending
+
+        self._pending: list[dict] = []
+        self._task: asyncio.Task | None = None
+        self._full: asyncio.Event | None = None
+        self._flush_lock: asyncio.Lock | None = None
+        self._failed_flushes = 0
+
+        self.flushed_events = 0
+        self.flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # A second attempt goes event by event, so a bad event doesn't cost the rest;
+        # shutdown goes on regardless
+        for attempt in range(2):
+            try:
+                await self.flush()
+                return
+            except Exception:
+                if attempt:
+                    logger.exception("final progress flush failed; %d events lost", len(self._pending))
+
+    def add(self, events: list[dict]) -> bool:
+        """
+        Queues `events`, or returns False if the buffer is full.
+        """
+        if len(self._pending) + len(events) > self.max_pending:
+            return False
+        self._pending.extend(events)
+        if len(self._pending) >= self.max_events:
+            self._full.set()
+        return True
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            events, self._pending = self._pending, []
+            if not events:
+                return 0
+            if not self._failed_flushes:
+                try:
+                    applied = await asyncio.to_thread(_apply, events)
+                except Exception:
+                    # Keep the events for the next attempt rather than dropping answers
+                    self._failed_flushes += 1
+                    self._pending = events + self._pending
+                    raise
+            else:
+                # The last batch failed: the database is down or one of the events is bad
+                applied, retry = await asyncio.to_thread(_apply_each, events)
+                if retry:
+                    self.flushed_events += applied
+                    self._pending = retry + self._pending
+                    raise RuntimeError(f"{len(retry)} progress events not written, database unavailable")
+            self._failed_flushes = 0
+            self.flushes += 1
+            self.flushed_events += applied
+            return applied
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Database busy or down: retry on the next tick
+                continue
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_events": self.flushed_events,
+            "failed_flushes": self._failed_flushes,
+        }
+
+
+progress_buffer = ProgressBuffer(
+    max_events=PROGRESS_FLUSH_EVENTS,
+    interval_s=PROGRESS_FLUSH_INTERVAL_S,
+    max_pending=PROGRESS_BUFFER_MAX_EVENTS,
+)
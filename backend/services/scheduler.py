@@ -0,0 +1,43 @@
+"""
+SM-2 spaced-repetition schedule for a card, driven by correct/incorrect answers.
+
+A correct answer is graded SM2_QUALITY_CORRECT and a miss SM2_QUALITY_WRONG on SM-2's 0-5
+scale. Intervals go 1 day, 6 days, then previous interval x ease. A miss resets the streak
+and brings the card back after a short relearning step rather than the next day.
+"""
+import os
+from datetime import datetime, timedelta
+
+
+SM2_INITIAL_EASE = 2.5
+SM2_MIN_EASE = 1.3
+SM2_QUALITY_CORRECT = int(os.getenv("SM2_QUALITY_CORRECT", "4"))
+SM2_QUALITY_WRONG = int(os.getenv("SM2_QUALITY_WRONG", "2"))
+SM2_RELEARN_MINUTES = float(os.getenv("SM2_RELEARN_MINUTES", "10"))
+# Intervals grow geometrically; without a cap a long streak overflows datetime
+SM2_MAX_INTERVAL_DAYS = float(os.getenv("SM2_MAX_INTERVAL_DAYS", "3650"))
+
+
+def review(
+    ease: float,
+    interval_days: float,
+    repetitions: int,
+    correct: bool,
+    answered_at: datetime,
+) -> tuple[float, float, int, datetime]:
+    """
+    Returns the new (ease, interval_days, repetitions, next_due_at) after one answer.
+    """
+    q = SM2_QUALITY_CORRECT if correct else SM2_QUALITY_WRONG
+    ease = max(SM2_MIN_EASE, ease + 0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+
+    if q < 3:
+        return ease, 0.0, 0, answered_at + timedelta(minutes=SM2_RELEARN_MINUTES)
+
+    if repetitions == 0:
+        interval_days = 1.0
+    elif repetitions == 1:
+        interval_days = 6.0
+    else:
+        interval_days = min(interval_days * ease, SM2_MAX_INTERVAL_DAYS)
+    return ease, interval_days, repetitions + 1, answered_at + timedelta(days=interval_days)
@@ -0,0 +1,198 @@
+"""
+Full-text search over every card in the library, backed by an SQLite FTS5 index.
+
+cards_fts is an external-content FTS5 table over cards.question, answer, explanation and
+options_json: it stores only the inverted index and reads the text from cards. Triggers
+on cards keep it in step with every write, whichever code path makes it (card inserts,
+deck deletes, explanations filled in later). ensure_index() creates the table and
+triggers on startup and fills the index from existing cards the first time.
+
+Results are ranked by BM25 with question matches weighted highest. A query is split into
+words that must all match, in any column (stopwords are dropped); the last word also
+matches as a prefix, so results keep up while the user is typing.
+
+    python -m backend.services.search --rebuild     # re-index every card
+"""
+import argparse
+import json
+import re
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+FTS_TABLE = "cards_fts"
+# question, answer, explanation, options_json
+BM25_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+# Words per query; more just slows the match down without changing the ranking much
+MAX_QUERY_TERMS = 16
+
+_COLUMNS = "question, answer, explanation, options_json"
+_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_COLUMNS},
+        content='cards', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cards_fts_insert AFTER INSERT ON cards BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, {_COLUMNS})
+        VALUES (new.id, new.question, new.answer, new.explanation, new.options_json);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cards_fts_delete AFTER DELETE ON cards BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {_COLUMNS})
+        VALUES ('delete', old.id, old.question, old.answer, old.explanation, old.options_json);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS cards_fts_update AFTER UPDATE OF {_COLUMNS} ON cards BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {_COLUMNS})
+        VALUES ('delete', old.id, old.question, old.answer, old.explanation, old.options_json);
+        INSERT INTO {FTS_TABLE} (rowid, {_COLUMNS})
+        VALUES (new.id, new.question, new.answer, new.explanation, new.options_json);
+    END
+    """,
+]
+
+_WORD = re.compile(r"\w+")
+# In nearly every card, so they cost the most to match and do nothing for the ranking
+_STOPWORDS = frozenset(
+    """
+    a an the of in on at to for by with from and or is are was were be been what which who how
+    does do did this that these those it its as not
+    """.split()
+)
+
+
+class SearchUnavailableError(RuntimeError):
+    pass
+
+
+def is_supported(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def ensure_index(engine) -> bool:
+    """
+    Creates the FTS table and its triggers if they're missing, indexing the cards already
+    saved. Returns True if the index was built. A no-op on databases other than SQLite.
+    """
+    if not is_supported(engine):
+        return False
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first()
+        for statement in _DDL:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
+    return not exists
+
+
+def rebuild(db: Session, *, optimize: bool = True) -> int:
+    """
+    Re-indexes every card from scratch, then merges the index into as few segments as
+    possible. Returns the number of cards indexed.
+    """
+    db.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
+    if optimize:
+        db.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"))
+    db.commit()
+    return db.execute(text("SELECT COUNT(*) FROM cards")).scalar_one()
+
+
+def match_expression(query: str) -> str | None:
+    """
+    An FTS5 MATCH expression for free text: each word quoted (so FTS5 syntax in the input
+    is matched literally), all required, the last one as a prefix. Stopwords are left out
+    unless that would leave nothing. None if there are no words.
+    """
+    words = _WORD.findall(query.lower())
+    words = ([w for w in words if w not in _STOPWORDS] or words)[:MAX_QUERY_TERMS]
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    # A one-letter prefix matches most of the vocabulary; not worth it
+    if query.rstrip() == query and len(words[-1]) > 1:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_cards(
+    db: Session,
+    query: str,
+    *,
+    limit: int,
+    offset: int = 0,
+    document_id: int | None = None,
+    card_type: str | None = None,
+) -> list[dict]:
+    """
+    CardOut-shaped dicts plus a `score` (higher is better), best match first.
+    """
+    if not is_supported(db.get_bind()):
+        raise SearchUnavailableError("Search needs an SQLite database")
+    expression = match_expression(query)
+    if expression is None:
+        return []
+
+    filters = ""
+    params = {"match": expression, "limit": limit, "offset": offset}
+    if document_id is not None:
+        filters += " AND c.document_id = :document_id"
+        params["document_id"] = document_id
+    if card_type is not None:
+        filters += " AND c.type = :card_type"
+        params["card_type"] = card_type
+
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    rows = db.execute(
+        text(
+            f"""
+            SELECT c.id, c.document_id, c.type, c.question, c.options_json, c.correct_answer, c.answer,
+                   c.explanation, bm25({FTS_TABLE}, {weights}) AS score
+            FROM {FTS_TABLE} JOIN cards AS c ON c.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :match{filters}
+            ORDER BY score, c.id
+            LIMIT :limit OFFSET :offset
+            """
+        ),
+        params,
+    ).all()
+    return [
+        {
+            "id": r.id,
+            "document_id": r.document_id,
+            "type": r.type,
+            "question": r.question,
+            "options": json.loads(r.options_json) if r.options_json else None,
+            "correct_answer": r.correct_answer,
+            "answer": r.answer,
+            "explanation": r.explanation,
+            # bm25() is lower for better matches
+            "score": -r.score,
+        }
+        for r in rows
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the card search index.")
+    parser.add_argument("--rebuild", action="store_true", help="re-index every card (for existing databases)")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        from backend.db import SessionLocal, engine
+        from backend.models import Base
+
+        Base.metadata.create_all(bind=engine)
+        if not is_supported(engine):
+            parser.exit(1, "search needs an SQLite database\n")
+        ensure_index(engine)
+        with SessionLocal() as session:
+            print(f"indexed {rebuild(session)} cards")
@@ -0,0 +1,181 @@
+import os
+import re
+
+import numpy as np
+
+from backend.services.pdf import CHUNKER, pick_spread_chunks
+
+
+# "informative" scores chunks and picks a diverse high-value set; "spread" is position only
+CHUNK_SELECTOR = os.getenv("CHUNK_SELECTOR", "informative")
+
+# Weight of relevance vs. novelty in maximal marginal relevance (1.0 = ignore overlap)
+MMR_LAMBDA = float(os.getenv("CHUNK_MMR_LAMBDA", "0.7"))
+
+MAX_VOCAB = 4096
+
+# Most questions one call is asked for; token-budget chunks are big enough that fewer calls
+# cover the same text
+QUESTIONS_PER_CALL = int(os.getenv("QUESTIONS_PER_CALL", "5"))
+MAX_CHUNKS = 4
+
+# Questions requested across all chunks per question wanted, to absorb filtering and dedupe
+QUOTA_OVERSAMPLE = float(os.getenv("QUOTA_OVERSAMPLE", "1.25"))
+
+_WORD = re.compile(r"[a-z][a-z\-]{2,}")
+_STOPWORDS = frozenset(
+    """
+    the and for are but not you all any can had her was one our out has him his how its may new now
+    see two who did get let put say she too use that with have this will your from they been were
+    what when which their there then than them these those would could should about into more some
+    such only also other over each most very just where while here after before being between both
+    through during under again further once because same does doing until above below off own
+    """.split()
+)
+
+# Boilerplate signals, each counted per chunk
+_TOC_LINE = re.compile(r"^.{3,80}?(?:\.{3,}|\s{2,}|\t)\s*\d{1,4}\s*$", re.MULTILINE)
+_REFERENCE = re.compile(
+    r"\bet al\.|\bdoi[:\s]|https?://|\bISBN\b|\[\d{1,3}\]|\(\d{4}[a-z]?\)|\bpp\.\s*\d|\bvol\.\s*\d",
+    re.IGNORECASE,
+)
+_BOILERPLATE = re.compile(
+    r"table of contents|\bcontents\b|\breferences\b|bibliography|learning objectives?|copyright|"
+    r"all rights reserved|acknowledg|further reading|about the author",
+    re.IGNORECASE,
+)
+
+
+def _chunk_features(chunks: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (term counts [chunks x vocab], boilerplate features [chunks x 5]).
+    """
+    tokenized = [[w for w in _WORD.findall(c.lower()) if w not in _STOPWORDS] for c in chunks]
+
+    df: dict[str, int] = {}
+    for words in tokenized:
+        for w in set(words):
+            df[w] = df.get(w, 0) + 1
+    # Cap the vocabulary at the most widely shared terms to bound the matrix size
+    vocab = sorted(df, key=lambda w: -df[w])[:MAX_VOCAB]
+    index = {w: i for i, w in enumerate(vocab)}
+
+    counts = np.zeros((len(chunks), max(1, len(vocab))), dtype=np.float32)
+    for row, words in enumerate(tokenized):
+        cols = [index[w] for w in words if w in index]
+        if cols:
+            np.add.at(counts[row], cols, 1.0)
+
+    feats = np.array(
+        [
+            [
+                len(c),
+                len(words),
+                len(_TOC_LINE.findall(c)),
+                len(_REFERENCE.findall(c)),
+                len(_BOILERPLATE.findall(c)),
+            ]
+            for c, words in zip(chunks, tokenized)
+        ],
+        dtype=np.float32,
+    ).reshape(len(chunks), 5)
+    return counts, feats
+
+
+def score_chunks(chunks: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scores every chunk in one vectorised pass. Returns (scores, L2-normalised TF-IDF rows).
+    Higher scores mean denser subject matter; TOC, reference and front-matter chunks are penalised.
+    """
+    counts, feats = _chunk_features(chunks)
+    n_docs = counts.shape[0]
+
+    df = (counts > 0).sum(axis=0)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    tf = np.log1p(counts)
+    tfidf = tf * idf
+    norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+    vectors = tfidf / np.maximum(norms, 1e-9)
+
+    chars, words, toc_lines, refs, boiler = feats.T
+    lines = np.array([c.count("\n") + 1 for c in chunks], dtype=np.float32)
+
+    # Information: idf mass of distinct terms, lexical variety, and prose-like length
+    distinct = (counts > 0).astype(np.float32) @ idf
+    variety = distinct / np.maximum(words, 1.0)
+    info = np.log1p(distinct) * (0.5 + variety) * np.minimum(1.0, chars / 600.0)
+
+    penalty = (
+        2.0 * np.minimum(1.0, toc_lines / lines)
+        + 1.5 * np.minimum(1.0, refs / np.maximum(lines, 1.0))
+        + 0.5 * np.minimum(2.0, boiler)
+    )
+    return info * np.exp(-penalty), vectors
+
+
+def pick_informative_chunks(chunks: list[str], max_chunks: int = 4, mmr_lambda: float = MMR_LAMBDA) -> list[str]:
+    """
+    Picks a high-information, low-overlap set of chunks by maximal marginal relevance over
+    TF-IDF vectors. The result keeps document order.
+    """
+    if not chunks:
+        return []
+
+    if len(chunks) <= max_chunks:
+        return chunks
+
+    scores, vectors = score_chunks(chunks)
+    relevance = scores / max(float(scores.max()), 1e-9)
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_sim = similarity[selected[0]].copy()
+    available = np.ones(len(chunks), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < max_chunks:
+        mmr = mmr_lambda * relevance - (1.0 - mmr_lambda) * max_sim
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, similarity[best])
+
+    return [chunks[i] for i in sorted(selected)]
+
+
+def select_chunks(chunks: list[str], max_chunks: int = 4, selector: str | None = None) -> list[str]:
+    if (selector or CHUNK_SELECTOR) == "spread":
+        return pick_spread_chunks(chunks, max_chunks=max_chunks)
+    return pick_informative_chunks(chunks, max_chunks=max_chunks)
+
+
+def max_chunks_for(count: int) -> int:
+    """
+    How many chunks (= LLM calls) to generate `count` questions from.
+    """
+    if CHUNKER != "tokens":
+        return MAX_CHUNKS
+    return max(1, min(MAX_CHUNKS, -(-count // QUESTIONS_PER_CALL)))
+
+
+def question_quotas(chunks: list[str], count: int) -> list[int]:
+    """
+    Splits about count x QUOTA_OVERSAMPLE questions across chunks in proportion to their
+    information score (largest remainder), with at least one per chunk.
+    """
+    if not chunks:
+        return []
+    total = max(len(chunks), int(np.ceil(count * QUOTA_OVERSAMPLE)))
+    if len(chunks) == 1:
+        return [total]
+
+    scores, _ = score_chunks(chunks)
+    # Floor the weights so a chunk scored near zero still gets its one question
+    weights = np.maximum(scores, 0.1 * max(float(scores.max()), 1e-9))
+    share = weights / weights.sum() * (total - len(chunks))
+    quotas = 1 + np.floor(share).astype(int)
+    leftover = total - int(quotas.sum())
+    for i in np.argsort(-(share - np.floor(share)))[:leftover]:
+        quotas[i] += 1
+    return quotas.tolist()
@@ -0,0 +1,49 @@
+"""
+In-process request coalescing: concurrent calls with the same key share one computation.
+
+    result = await generate_flights.do(key, lambda: compute(...))
+
+The first caller for a key starts the computation; anyone arriving with the same key
+while it runs awaits the same task and gets the same result object (or exception), so
+callers that go on to modify the result must copy it first. Nothing is kept once the
+task finishes: this is not a cache, only a way of not doing the same work twice at once.
+"""
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+from backend.services.metrics import inc
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+        self.started = 0
+        self.joined = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.started += 1
+            inc("single_flight_requests_total", flight=self.name, role="leader")
+        else:
+            self.joined += 1
+            inc("single_flight_requests_total", flight=self.name, role="coalesced")
+        # Shielded so a client that disconnects doesn't cancel the work for the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        total = self.started + self.joined
+        return {
+            "started": self.started,
+            "coalesced": self.joined,
+            "coalesced_rate": (self.joined / total) if total else 0.0,
+            "in_flight": len(self._inflight),
+        }
+
+
+generate_flights = SingleFlight("generate")
@@ -0,0 +1,64 @@
+"""
+Local token counting for chunk budgets and cost estimates.
+
+"estimate" (default) is a character-class heuristic tuned to BPE tokenizers of the
+cl100k/o200k family on English prose: short words are one token, long words split every
+~6 letters, digits go in groups of three and each punctuation mark is its own token.
+TOKEN_ESTIMATE_SCALE corrects it against the usage numbers the API reports.
+
+"tiktoken" counts exactly, but needs the tiktoken package and its BPE file already in
+TIKTOKEN_CACHE_DIR; it is never fetched from the network here.
+"""
+import os
+import re
+
+
+TOKEN_COUNTER = os.getenv("TOKEN_COUNTER", "estimate")
+TIKTOKEN_ENCODING = os.getenv("TIKTOKEN_ENCODING", "o200k_base")
+TOKEN_ESTIMATE_SCALE = float(os.getenv("TOKEN_ESTIMATE_SCALE", "1.0"))
+
+_PIECE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+# End of a sentence: terminal punctuation (plus closing quotes/brackets) before a capitalised start
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s+[A-Z0-9\"'(\[])")
+
+_encoding = None
+
+
+def _tiktoken_encoding():
+    global _encoding
+    if _encoding is None:
+        cache_dir = os.getenv("TIKTOKEN_CACHE_DIR")
+        if not cache_dir or not os.path.isdir(cache_dir):
+            raise RuntimeError("TOKEN_COUNTER=tiktoken needs TIKTOKEN_CACHE_DIR pointing at a pre-downloaded encoding")
+        import tiktoken
+
+        _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    n = 0
+    for piece in _PIECE.findall(text or ""):
+        if piece[0].isalpha():
+            n += 1 + (len(piece) - 1) // 6
+        elif piece[0].isdigit():
+            n += (len(piece) + 2) // 3
+        else:
+            n += 1
+    return round(n * TOKEN_ESTIMATE_SCALE)
+
+
+def count_tokens(text: str) -> int:
+    if TOKEN_COUNTER == "tiktoken":
+        return len(_tiktoken_encoding().encode(text or "", disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def split_sentences(text: str) -> list[str]:
+    parts = []
+    start = 0
+    for m in _SENTENCE_END.finditer(text):
+        parts.append(text[start:m.end()])
+        start = m.end()
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
@@ -0,0 +1,121 @@
+"""
+Old (per-row add + refresh) vs. new (batched INSERT ... RETURNING) card inserts.
+
+    python -m benchmarks.card_insert [--sizes 20 1000 50000]
+
+Each run uses a fresh SQLite file in a temp directory. The new path is measured with and
+without the near-duplicate check, since the old path never had one.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud
+from backend.models import Base, Card, Document
+
+
+def _cards(n: int) -> list[dict]:
+    rnd = random.Random(n)
+    vocab = [f"term{i}" for i in range(20000)]
+    return [
+        {
+            "type": "mcq",
+            "question": "Which statement about " + " ".join(rnd.sample(vocab, 8)) + " is correct?",
+            "options": [f"option {i}-{k}" for k in range(4)],
+            "correct_answer": "B",
+            "explanation": f"Because of reason {i}.",
+        }
+        for i in range(n)
+    ]
+
+
+def _old_add_cards(db, document_id: int, cards: list[dict]) -> list[dict]:
+    # The pre-batching implementation, kept here for comparison
+    created = []
+    for c in cards:
+        options = c.get("options")
+        card = Card(
+            document_id=document_id,
+            type=c["type"],
+            question=c["question"],
+            options_json=json.dumps(options) if isinstance(options, list) else None,
+            correct_answer=c.get("correct_answer"),
+            answer=c.get("answer"),
+            explanation=c.get("explanation"),
+            fingerprint=crud._fingerprint_question(c["question"]),
+        )
+        db.add(card)
+        created.append(card)
+    db.commit()
+    for card in created:
+        db.refresh(card)
+    return [
+        {
+            "id": c.id,
+            "document_id": c.document_id,
+            "type": c.type,
+            "question": c.question,
+            "options": json.loads(c.options_json) if c.options_json else None,
+            "correct_answer": c.correct_answer,
+            "answer": c.answer,
+            "explanation": c.explanation,
+        }
+        for c in created
+    ]
+
+
+def _run(name: str, size: int, fn) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+
+        statements = 0
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _count(*_args):
+            nonlocal statements
+            statements += 1
+
+        Session = sessionmaker(bind=engine, autoflush=False)
+        with Session() as db:
+            doc = Document(title=name)
+            db.add(doc)
+            db.commit()
+            cards = _cards(size)
+
+            statements = 0
+            start = time.perf_counter()
+            out = fn(db, doc.id, cards)
+            elapsed = time.perf_counter() - start
+            assert len(out) == size, f"{name}: only {len(out)} of {size} cards saved"
+
+        engine.dispose()
+        return elapsed, statements
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 1000, 50000])
+    args = parser.parse_args()
+
+    paths = {
+        "old (add + refresh)": _old_add_cards,
+        "new": lambda db, doc_id, cards: crud.add_cards_to_document(db, doc_id, cards, skip_near_duplicates=False),
+        "new + near-dup check": crud.add_cards_to_document,
+    }
+
+    print(f"{'cards':>7}  {'path':<22} {'time (s)':>9} {'cards/s':>10} {'statements':>11}")
+    for size in args.sizes:
+        for name, fn in paths.items():
+            elapsed, statements = _run(name, size, fn)
+            print(f"{size:>7}  {name:<22} {elapsed:>9.3f} {size / elapsed:>10.0f} {statements:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compares chunk selectors by how many of the questions asked for come back usable.
+
+    python -m benchmarks.chunk_selection lectures/*.pdf [--type mcq] [--count 10] [--offline]
+
+For each PDF and selector, the selected chunks go through the normal generation path with
+the usual per-chunk quotas (count x QUOTA_OVERSAMPLE in all) but without the final trim to
+`count`, so the result is every question that passed validation, is_meta_question and
+dedupe. The benchmark reports valid/asked (those questions divided by the quotas' total),
+whether a request would have come up short of `count`, and LLM calls per valid question
+(calls counted by llm_calls_total, so cache hits cost none). --offline skips the LLM and
+only prints the selector scores and boilerplate hits for the picked chunks.
+
+Generation uses the configured LLM provider (LLM_PROVIDER=fake runs it without network)
+and the usual response cache; set LLM_CACHE_PATH to a scratch file for a cold run.
+"""
+import argparse
+import asyncio
+import io
+
+from backend.services.generation import generate_questions_from_chunks_async
+from backend.services.metrics import counter_total
+from backend.services.pdf import chunk_text, extract_pdf_text
+from backend.services.selection import _BOILERPLATE, _REFERENCE, _TOC_LINE, question_quotas, score_chunks, select_chunks
+
+
+SELECTORS = ("spread", "informative")
+
+
+def _boilerplate_hits(chunk: str) -> int:
+    return len(_TOC_LINE.findall(chunk)) + len(_REFERENCE.findall(chunk)) + len(_BOILERPLATE.findall(chunk))
+
+
+def _generate_calls() -> int:
+    # Attempts that reached the provider; calls turned away by the circuit breaker don't count
+    return int(counter_total("llm_calls_total", kind="generate") - counter_total("llm_calls_total", kind="generate", outcome="rejected"))
+
+
+async def _run(paths: list[str], question_type: str, count: int, offline: bool) -> None:
+    totals = {name: [0, 0, 0, 0] for name in SELECTORS}  # valid, asked, calls, short requests
+
+    print(
+        f"{'file':<32} {'selector':<12} {'mean score':>10} {'boiler':>7} {'asked':>6} {'valid':>6} {'calls':>6}"
+        f" {'valid/asked':>12}"
+    )
+    for path in paths:
+        with open(path, "rb") as f:
+            chunks = chunk_text(extract_pdf_text(io.BytesIO(f.read())), max_chars=1800)
+        if not chunks:
+            print(f"{path[-32:]:<32} (no text)")
+            continue
+
+        scores, _ = score_chunks(chunks)
+        by_chunk = dict(zip(chunks, scores.tolist()))
+
+        for name in SELECTORS:
+            picked = select_chunks(chunks, max_chunks=4, selector=name)
+            mean_score = sum(by_chunk[c] for c in picked) / len(picked)
+            boiler = sum(_boilerplate_hits(c) for c in picked)
+
+            asked = valid = calls = ratio = "-"
+            if not offline:
+                quotas = question_quotas(picked, count)
+                before = _generate_calls()
+                # count=sum(quotas) so nothing is trimmed off the valid questions
+                questions = await generate_questions_from_chunks_async(
+                    question_type=question_type,
+                    count=sum(quotas),
+                    chunks=picked,
+                    quotas=quotas,
+                )
+                asked, valid, calls = sum(quotas), len(questions), _generate_calls() - before
+                totals[name][0] += valid
+                totals[name][1] += asked
+                totals[name][2] += calls
+                totals[name][3] += valid < count
+                ratio = f"{valid / asked:.2f}"
+
+            print(
+                f"{path[-32:]:<32} {name:<12} {mean_score:>10.3f} {boiler:>7} {asked:>6} {valid:>6} {calls:>6}"
+                f" {ratio:>12}"
+            )
+
+    if offline:
+        return
+
+    print()
+    for name, (valid, asked, calls, short) in totals.items():
+        if asked:
+            per_valid = f"{calls / valid:.2f}" if valid else "inf"
+            print(
+                f"{name:<12} valid/asked={valid / asked:.3f}  requests short of {count}={short}"
+                f"  calls/valid question={per_valid}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--type", dest="question_type", choices=("mcq", "saq"), default="mcq")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--offline", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(_run(args.pdfs, args.question_type, args.count, args.offline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Threadpool Session (DB_ASYNC=0) vs. AsyncSession (DB_ASYNC=1) under concurrent load.
+
+    python -m benchmarks.db_load [--concurrency 1 8 32 128] [--requests 2000] [--database-url URL]
+
+Each mode runs in its own subprocess (the session type is picked at import time) against a
+fresh SQLite file unless --database-url is given. The workload is a mix of deck reads,
+single answers and answer batches, sent through the ASGI app in-process so the numbers
+measure the app and the database rather than the HTTP stack.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+DECK_SIZE = 200
+# (weight, kind): mostly reads, like a study session
+MIX = [(6, "read"), (3, "answer"), (1, "batch")]
+
+
+async def _worker(concurrency: int, total: int) -> dict:
+    import httpx
+
+    from backend.db import Base, engine
+    from backend.main import app
+
+    Base.metadata.create_all(bind=engine)
+    # App errors come back as 500s and are counted rather than aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        doc = (await client.post("/documents", json={"title": "bench"})).json()
+        cards = [{"type": "saq", "question": f"Question number {i} about topic {i * 7}?", "answer": "a"} for i in range(DECK_SIZE)]
+        saved = (await client.post(f"/documents/{doc['id']}/cards", json={"cards": cards})).json()
+        card_ids = [c["id"] for c in saved]
+
+        rnd = random.Random(concurrency)
+        kinds = rnd.choices([k for _, k in MIX], weights=[w for w, _ in MIX], k=total)
+        latencies: list[float] = []
+        errors = 0
+        queue = iter(kinds)
+
+        async def one(kind: str) -> None:
+            nonlocal errors
+            start = time.perf_counter()
+            if kind == "read":
+                r = await client.get(f"/documents/{doc['id']}/cards")
+            elif kind == "answer":
+                r = await client.post("/progress", json={"card_id": rnd.choice(card_ids), "correct": rnd.random() < 0.7})
+            else:
+                events = [{"card_id": rnd.choice(card_ids), "correct": rnd.random() < 0.7} for _ in range(20)]
+                r = await client.post("/progress/batch", json={"events": events})
+            latencies.append(time.perf_counter() - start)
+            if r.status_code != 200:
+                errors += 1
+
+        async def loop() -> None:
+            for kind in queue:
+                await one(kind)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "errors": errors,
+    }
+
+
+def _run_mode(mode: str, concurrency: int, total: int, database_url: str | None) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DB_ASYNC="1" if mode == "async" else "0",
+            DATABASE_URL=database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "unused"),
+            LLM_CACHE_PATH=os.path.join(tmp, "llm_cache.db"),
+        )
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.db_load", "--worker", str(concurrency), "--requests", str(total)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--database-url", default=None, help="benchmark an existing database instead of a temp SQLite file")
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(asyncio.run(_worker(args.worker, args.requests))))
+        return
+
+    print(f"{'clients':>7}  {'mode':<6} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'errors':>7}")
+    for concurrency in args.concurrency:
+        for mode in ("sync", "async"):
+            r = _run_mode(mode, concurrency, args.requests, args.database_url)
+            print(f"{concurrency:>7}  {mode:<6} {r['rps']:>8.0f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
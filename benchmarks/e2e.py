@@ -0,0 +1,273 @@
+"""
+End-to-end latency and throughput with the fake LLM, usable as a regression gate.
+
+    python -m benchmarks.e2e [--concurrency 1 8 32] [--requests 100] [--pdf notes.pdf]
+                             [--save run.json] [--baseline run.json] [--tolerance 0.2]
+
+Runs the app in-process over the ASGI transport with LLM_PROVIDER=fake, a fresh SQLite
+database and cold caches, and drives three scenarios at each concurrency level:
+
+    generate  POST /generate-questions (MCQ, 10 questions) with the PDF
+    explain   POST /explain-question for random cards of a freshly saved deck
+    study     due queue reads, single answers and full deck reads, mixed 3:5:2
+
+The fake's latency and faults come from the FAKE_LLM_* variables (this script defaults
+the latency to 100 ms + 10 ms per question) and are seeded, so two runs of the same tree
+see the same LLM behaviour. Generation responses are not cached between requests unless
+--llm-cache is given. The run ends with how many generation outputs parsed cleanly, were
+salvaged or failed, how many follow-up calls asked for missing questions, and how many
+generate requests joined an identical one in flight (GENERATION_COALESCE=0 turns that off).
+
+With --baseline, exits 1 if any scenario's p95 grew, or its throughput fell, by more than
+--tolerance relative to the saved run (and by more than --min-delta-ms per request, so
+millisecond-level jitter on the fast endpoints doesn't trip it), or if it had more errors.
+For gating, --repeat 3 reports the best of three runs per scenario and is much steadier.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+SCENARIOS = ("generate", "explain", "study")
+# (weight, kind) for the study scenario
+STUDY_MIX = [(3, "due"), (5, "answer"), (2, "deck")]
+
+
+def _sample_pdf(pages: int = 6) -> bytes:
+    """
+    A small text PDF of lecture-like sentences, so the benchmark runs without a file.
+    """
+    rnd = random.Random(7)
+    terms = [
+        "enzyme", "substrate", "membrane", "gradient", "diffusion", "osmosis", "ribosome", "protein",
+        "glucose", "oxygen", "respiration", "chlorophyll", "photosynthesis", "mitochondria", "nucleus",
+        "transcription", "translation", "catalyst", "equilibrium", "receptor", "hormone", "pathway",
+    ]
+    verbs = ["regulates", "increases", "requires", "produces", "transports", "inhibits", "converts", "binds"]
+
+    objects = []
+    page_ids = []
+    for p in range(pages):
+        lines = []
+        for i in range(40):
+            a, b, c = rnd.sample(terms, 3)
+            lines.append(f"The {a} {rnd.choice(verbs)} {b} during {c} in stage {p * 40 + i}.")
+        body = "BT /F1 10 Tf 40 770 Td 14 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        # Objects 1-3 are the catalog, page tree and font; each page adds its content + page object
+        content_id = 4 + len(objects)
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /Contents {content_id} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        page_ids.append(content_id + 1)
+
+    head = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for n, obj in enumerate(head + objects, start=1):
+        offsets.append(len(out))
+        out += f"{n} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+async def _run_scenario(client, scenario: str, *, concurrency: int, total: int, pdf: bytes, deck: list[int], document_id: int) -> dict:
+    rnd = random.Random(f"{scenario}:{concurrency}")
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(range(total))
+
+    async def one() -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        if scenario == "generate":
+            r = await client.post(
+                "/generate-questions",
+                files={"file": ("bench.pdf", pdf, "application/pdf")},
+                data={"question_type": "mcq", "count": "10"},
+            )
+        elif scenario == "explain":
+            r = await client.post("/explain-question", json={"card_id": rnd.choice(deck)})
+        else:
+            kind = rnd.choices([k for _, k in STUDY_MIX], weights=[w for w, _ in STUDY_MIX])[0]
+            if kind == "due":
+                r = await client.get("/progress/due", params={"document_id": document_id, "limit": 20})
+            elif kind == "answer":
+                r = await client.post("/progress", json={"card_id": rnd.choice(deck), "correct": rnd.random() < 0.7})
+            else:
+                r = await client.get(f"/documents/{document_id}/cards")
+        latencies.append(time.perf_counter() - start)
+        # The generate/explain endpoints report failures as 200 {"error": ...}
+        if r.status_code != 200 or (scenario != "study" and "error" in r.json()):
+            errors += 1
+
+    async def loop() -> None:
+        for _ in queue:
+            await one()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def _run(args, pdf: bytes) -> dict:
+    import httpx
+
+    from backend.main import app
+    from backend.services.llm import get_async_client
+    from backend.services.llm_calls import llm_caller
+    from backend.services.metrics import counter_total
+    from backend.services.single_flight import generate_flights
+
+    results: dict[str, dict] = {}
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            seed = (await client.post(
+                "/generate-questions",
+                files={"file": ("bench.pdf", pdf, "application/pdf")},
+                data={"question_type": "mcq", "count": "20"},
+            )).json()
+            questions = seed.get("questions") or []
+            if not questions:
+                sys.exit(f"could not generate a seed deck: {seed}")
+
+            for concurrency in args.concurrency:
+                for scenario in args.scenarios:
+                    runs = []
+                    for attempt in range(args.repeat):
+                        # A fresh, unexplained deck per run, worded differently so explanations start cold
+                        tag = f"{scenario}-{concurrency}-{attempt}"
+                        doc = (await client.post("/documents", json={"title": f"bench {tag}"})).json()
+                        cards = [{**q, "question": f"{q['question']} ({tag})", "explanation": None} for q in questions]
+                        saved = (await client.post(f"/documents/{doc['id']}/cards", json={"cards": cards})).json()
+                        runs.append(await _run_scenario(
+                            client,
+                            scenario,
+                            concurrency=concurrency,
+                            total=args.requests,
+                            pdf=pdf,
+                            deck=[c["id"] for c in saved],
+                            document_id=doc["id"],
+                        ))
+                    # Best of the repeats, as timeit does: noise only ever makes a run slower
+                    results[f"{scenario}@{concurrency}"] = min(runs, key=lambda r: r["p95_ms"])
+
+    llm = get_async_client()
+    if hasattr(llm, "stats"):
+        print(f"fake LLM: {llm.stats()}")
+    outputs = {r: int(counter_total("llm_outputs_total", result=r)) for r in ("clean", "salvaged", "failed")}
+    bad = outputs["salvaged"] + outputs["failed"]
+    print(
+        f"LLM outputs: {outputs['clean']} clean, {outputs['salvaged']} salvaged, {outputs['failed']} failed"
+        f" (salvage rate {outputs['salvaged'] / bad if bad else 1:.0%});"
+        f" {int(counter_total('llm_retries_total', reason='missing'))} retries for missing questions"
+    )
+    print(f"LLM calls: {llm_caller.stats()}")
+    print(f"generation requests coalesced: {generate_flights.stats()}")
+    return results
+
+
+def _regressions(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    found = []
+    for key, base in baseline.items():
+        cur = results.get(key)
+        if cur is None:
+            continue
+        if cur["p95_ms"] > base["p95_ms"] * (1 + tolerance) and cur["p95_ms"] - base["p95_ms"] > min_delta_ms:
+            found.append(f"{key}: p95 {base['p95_ms']:.1f} -> {cur['p95_ms']:.1f} ms")
+        # Per-request time, so the same floor applies to fast scenarios' throughput
+        slower_ms = (1 / cur["rps"] - 1 / base["rps"]) * 1000 * int(key.split("@")[1])
+        if cur["rps"] < base["rps"] * (1 - tolerance) and slower_ms > min_delta_ms:
+            found.append(f"{key}: throughput {base['rps']:.1f} -> {cur['rps']:.1f} req/s")
+        if cur["errors"] > base["errors"]:
+            found.append(f"{key}: errors {base['errors']} -> {cur['errors']}")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario and concurrency level")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--pdf", default=None)
+    parser.add_argument("--llm-cache", action="store_true", help="let repeated generate requests hit the LLM response cache")
+    parser.add_argument("--save", default=None, help="write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="JSON from an earlier --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario; the best is reported")
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf = f.read()
+    else:
+        pdf = _sample_pdf()
+
+    tmp = tempfile.mkdtemp(prefix="e2e-bench-")
+    # Set before the app is imported: these are read at import time
+    os.environ.update(
+        LLM_PROVIDER="fake",
+        DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        LLM_CACHE_PATH=os.path.join(tmp, "llm_cache.db"),
+        PDF_CACHE_DIR=os.path.join(tmp, "pdf_cache"),
+        LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"),
+    )
+    if not args.llm_cache:
+        os.environ["LLM_CACHE_TTL_S"] = "0"
+    os.environ.setdefault("FAKE_LLM_LATENCY_MS", "100")
+    os.environ.setdefault("FAKE_LLM_MS_PER_QUESTION", "10")
+
+    results = asyncio.run(_run(args, pdf))
+
+    print(f"{'scenario':<10} {'clients':>7} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'errors':>7}")
+    for key, r in results.items():
+        scenario, concurrency = key.split("@")
+        print(
+            f"{scenario:<10} {concurrency:>7} {r['rps']:>8.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f}"
+            f" {r['p99_ms']:>9.1f} {r['errors']:>7}"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _regressions(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\nregressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
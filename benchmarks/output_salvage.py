@@ -0,0 +1,82 @@
+"""
+Questions recovered from damaged LLM output: strict json.loads vs. the salvaging parser.
+
+    python -m benchmarks.output_salvage [--pdf notes.pdf] [--outputs 200] [--question-type mcq]
+
+Builds well-formed responses with the fake LLM's renderer for the PDF's chunks (or the
+e2e benchmark's sample PDF), damages copies of them the ways models do, and reports per
+damage kind the share of outputs that yield any question and the share of questions
+recovered, counting only questions that pass is_valid_question. No LLM calls are made.
+"""
+import argparse
+import io
+import json
+import random
+
+from backend.services.fake_llm import render
+from backend.services.generation import build_request_input
+from backend.services.llm_output import is_valid_question, parse_llm_json
+from backend.services.pdf import CHUNK_TOKENS, CHUNKER, chunk_text, chunk_text_tokens, extract_pdf_text
+
+
+def _damage(kind: str, text: str, rnd: random.Random) -> str:
+    if kind == "fenced":
+        return f"```json\n{text}\n```"
+    if kind == "prose":
+        return "Here are the questions:\n\n" + text + "\n\nHope this helps!"
+    if kind == "truncated":
+        return text[: int(len(text) * rnd.uniform(0.3, 0.95))]
+    return text
+
+
+def _strict(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+
+def _salvaged(text: str):
+    return parse_llm_json(text)[0]
+
+
+def _count_valid(value, question_type: str) -> int:
+    return sum(is_valid_question(q, question_type) for q in value) if isinstance(value, list) else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=None)
+    parser.add_argument("--outputs", type=int, default=200, help="responses per damage kind")
+    parser.add_argument("--question-type", default="mcq", choices=["mcq", "saq"])
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            data = f.read()
+    else:
+        from benchmarks.e2e import _sample_pdf
+
+        data = _sample_pdf()
+    text = extract_pdf_text(io.BytesIO(data))
+    chunks = chunk_text_tokens(text, CHUNK_TOKENS) if CHUNKER == "tokens" else chunk_text(text)
+
+    rnd = random.Random(0)
+    responses = []
+    for i in range(args.outputs):
+        chunk = chunks[i % len(chunks)]
+        prompt = build_request_input(question_type=args.question_type, items=[(1, 5, chunk)], chunk_total=1)
+        responses.append(render(prompt, random.Random(i))[0])
+
+    print(f"{'damage':<10} {'parser':<9} {'outputs used':>12} {'questions':>10}")
+    for kind in ("none", "fenced", "prose", "truncated"):
+        damaged = [_damage(kind, r, rnd) for r in responses]
+        expected = sum(_count_valid(json.loads(r), args.question_type) for r in responses)
+        for name, parse in (("strict", _strict), ("salvage", _salvaged)):
+            counts = [_count_valid(parse(d), args.question_type) for d in damaged]
+            used = sum(1 for c in counts if c) / len(counts)
+            print(f"{kind:<10} {name:<9} {used:>12.0%} {sum(counts) / expected:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
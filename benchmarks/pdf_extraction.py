@@ -0,0 +1,69 @@
+"""
+Compares full vs sampled PDF extraction on one file.
+
+    python -m benchmarks.pdf_extraction path/to/lecture.pdf [--repeat 3]
+
+Reports wall time, peak Python heap (tracemalloc) and how many characters each mode
+hands to the chunk selector. Both modes run in-process so the numbers are comparable.
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+from backend.services.pdf import (
+    chunk_text,
+    count_pdf_pages,
+    extract_pdf_text,
+    extract_sampled_chunks,
+    pick_spread_chunks,
+)
+
+
+def _full(data: bytes) -> list[str]:
+    text = extract_pdf_text(io.BytesIO(data))
+    return pick_spread_chunks(chunk_text(text, max_chars=1800), max_chunks=4)
+
+
+def _sampled(data: bytes) -> list[str]:
+    return extract_sampled_chunks(data, max_chunks=4, max_chars=1800)
+
+
+def _measure(fn, data: bytes, repeat: int) -> tuple[float, int, list[str]]:
+    best = float("inf")
+    peak = 0
+    chunks: list[str] = []
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        chunks = fn(data)
+        best = min(best, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return best, peak, chunks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        data = f.read()
+
+    print(f"{args.pdf}: {count_pdf_pages(data)} pages, {len(data) / 1024:.0f} KiB")
+    print(f"{'mode':<8} {'time (s)':>10} {'peak heap (MiB)':>16} {'chunks':>7} {'chars':>8}")
+
+    results = {}
+    for name, fn in (("full", _full), ("sampled", _sampled)):
+        elapsed, peak, chunks = _measure(fn, data, args.repeat)
+        results[name] = elapsed
+        print(f"{name:<8} {elapsed:>10.3f} {peak / 2**20:>16.1f} {len(chunks):>7} {sum(map(len, chunks)):>8}")
+
+    if results["sampled"]:
+        print(f"speedup: {results['full'] / results['sampled']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
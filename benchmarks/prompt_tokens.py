@@ -0,0 +1,59 @@
+"""
+Prompt tokens per generated question at different CHUNKS_PER_REQUEST settings.
+
+    python -m benchmarks.prompt_tokens [--pdf notes.pdf] [--counts 5 10 20] [--question-type mcq]
+
+Runs the real chunking, selection and quota steps on the PDF (or on generated filler text)
+and sums the prompts each setting would send, using the same local token counter as the
+per-request estimate. No LLM calls are made. "saved/q" is relative to one chunk per request.
+"""
+import argparse
+import random
+
+from backend.services.generation import estimate_generation
+from backend.services.pdf import CHUNK_TOKENS, CHUNKER, chunk_text, chunk_text_tokens, extract_pdf_text
+from backend.services.selection import max_chunks_for, question_quotas, select_chunks
+
+
+def _filler_text(paragraphs: int = 200) -> str:
+    rnd = random.Random(0)
+    vocab = [f"term{i}" for i in range(3000)]
+    return "\n".join(
+        ". ".join(" ".join(rnd.sample(vocab, 12)).capitalize() for _ in range(5)) + "." for _ in range(paragraphs)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=None)
+    parser.add_argument("--counts", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--question-type", default="mcq", choices=["mcq", "saq"])
+    parser.add_argument("--chunks-per-request", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            text = extract_pdf_text(f)
+    else:
+        text = _filler_text()
+    chunks = chunk_text_tokens(text, CHUNK_TOKENS) if CHUNKER == "tokens" else chunk_text(text)
+
+    print(f"{'count':>5}  {'chunks/req':>10} {'calls':>5} {'prompt tok':>10} {'prefix tok':>10} {'tok/q':>7} {'saved/q':>8}")
+    for count in args.counts:
+        selected = select_chunks(chunks, max_chunks=max_chunks_for(count))
+        quotas = question_quotas(selected, count)
+        baseline = None
+        for cpr in args.chunks_per_request:
+            est = estimate_generation(
+                question_type=args.question_type, chunks=selected, quotas=quotas, chunks_per_request=cpr
+            )
+            per_q = est["input_tokens"] / count
+            baseline = per_q if baseline is None else baseline
+            print(
+                f"{count:>5}  {cpr:>10} {est['calls']:>5} {est['input_tokens']:>10} {est['prefix_tokens']:>10}"
+                f" {per_q:>7.0f} {baseline - per_q:>8.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
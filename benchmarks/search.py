@@ -0,0 +1,127 @@
+"""
+Card search latency over a large library, plus what the FTS index costs on writes.
+
+    python -m benchmarks.search [--cards 100000] [--decks 500] [--runs 50]
+
+Fills a fresh SQLite file with synthetic cards (words drawn from a Zipf-like vocabulary,
+so some terms match a large part of the library and others almost nothing), builds the
+index, then times search_cards for typical queries: common and rare words, several words,
+a half-typed prefix, a single-deck filter and a deep page. Also reports the time to
+rebuild the index and to insert 1000 cards with and without the sync triggers.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.models import Base, Card, Document
+from backend.services.search import ensure_index, match_expression, rebuild, search_cards
+
+
+def _vocab(n: int, rnd: random.Random) -> list[str]:
+    letters = "abcdefghiklmnoprstuvy"
+    return ["".join(rnd.choice(letters) for _ in range(rnd.randint(4, 10))) for _ in range(n)]
+
+
+def _rows(n: int, decks: int, vocab: list[str], cum_weights: list[float], rnd: random.Random, start: int = 0) -> list[dict]:
+    rows = []
+    for i in range(start, start + n):
+        words = rnd.choices(vocab, cum_weights=cum_weights, k=24)
+        rows.append(
+            {
+                "document_id": i % decks + 1,
+                "type": "mcq" if i % 3 else "saq",
+                "question": "What does " + " ".join(words[:10]) + " imply?",
+                "options_json": json.dumps([" ".join(words[10 + 2 * k:12 + 2 * k]) for k in range(4)]) if i % 3 else None,
+                "correct_answer": "B" if i % 3 else None,
+                "answer": None if i % 3 else " ".join(words[10:]),
+                "explanation": " ".join(words[14:]),
+                "fingerprint": f"{i:064d}",
+            }
+        )
+    return rows
+
+
+def _insert(db, rows: list[dict]) -> None:
+    db.execute(Card.__table__.insert(), rows)
+    db.commit()
+
+
+def _time(fn, runs: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=100_000)
+    parser.add_argument("--decks", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    vocab = _vocab(20_000, rnd)
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocab))))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'search.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        with Session() as db:
+            db.execute(Document.__table__.insert(), [{"title": f"Deck {d}"} for d in range(1, args.decks + 1)])
+            start = time.perf_counter()
+            for offset in range(0, args.cards, 10_000):
+                _insert(db, _rows(min(10_000, args.cards - offset), args.decks, vocab, weights, rnd, offset))
+            print(f"{args.cards} cards in {args.decks} decks, inserted in {time.perf_counter() - start:.1f}s (no index)")
+
+            batches = itertools.count(args.cards, 1000)
+            plain = _time(lambda: _insert(db, _rows(1000, args.decks, vocab, weights, rnd, next(batches))), 5)[0]
+
+        start = time.perf_counter()
+        ensure_index(engine)
+        print(f"index built from existing cards in {time.perf_counter() - start:.1f}s")
+
+        with Session() as db:
+            start = time.perf_counter()
+            rebuild(db)
+            print(f"rebuild + optimize: {time.perf_counter() - start:.1f}s")
+
+            indexed = _time(lambda: _insert(db, _rows(1000, args.decks, vocab, weights, rnd, next(batches))), 5)[0]
+            print(f"insert 1000 cards: {plain:.0f} ms without the index, {indexed:.0f} ms with triggers (median of 5)")
+
+            common, mid, rare = vocab[0], vocab[50], vocab[5000]
+            cases = [
+                ("common word", dict(query=common)),
+                ("mid word", dict(query=mid)),
+                ("rare word", dict(query=rare)),
+                ("three words", dict(query=f"{vocab[3]} {vocab[20]} {vocab[40]}")),
+                ("prefix", dict(query=vocab[60][:3])),
+                ("common, one deck", dict(query=common, document_id=7)),
+                ("common, saq", dict(query=common, card_type="saq")),
+                ("common, page 20", dict(query=common, offset=380)),
+            ]
+            print(f"\n{'query':<18} {'matches':>8} {'p50 ms':>8} {'p95 ms':>8}")
+            for name, case in cases:
+                matches = db.execute(
+                    text("SELECT COUNT(*) FROM cards_fts WHERE cards_fts MATCH :q"),
+                    {"q": match_expression(case["query"])},
+                ).scalar_one()
+                p50, p95 = _time(lambda: search_cards(db, limit=21, **case), args.runs)
+                print(f"{name:<18} {matches:>8} {p50:>8.1f} {p95:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,51 @@ export async function generateQuestions({ file, questionType, count }) {
   return res.json();
 }
 
+// Streams questions as NDJSON; calls onQuestion for each one as it arrives
+export async function generateQuestionsStream({ file, questionType, count, onQuestion }) {
+  const formData = new FormData();
+  formData.append("file", file);
+  formData.append("question_type", questionType);
+  formData.append("count", String(count));
+
+  const res = await fetch(`${API_BASE}/generate-questions/stream`, {
+    method: "POST",
+    body: formData,
+  });
+
+  if (!res.ok || !res.body) {
+    const text = await res.text();
+    throw new Error(text || "Request failed");
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  const questions = [];
+  let buffer = "";
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+    const lines = buffer.split("\n");
+    buffer = done ? "" : lines.pop();
+
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const msg = JSON.parse(line);
+      if (msg.error) throw new Error(msg.error);
+      if (msg.question) {
+        questions.push(msg.question);
+        onQuestion?.(msg.question, questions.length);
+      }
+    }
+
+    if (done) break;
+  }
+
+  return { question_type: questionType, count: questions.length, questions };
+}
+
 // ✅ NEW: create a saved deck/document
 export async function createDocument({ title }) {
   const res = await fetch(`${API_BASE}/documents`, {
@@ -92,3 +137,20 @@ export async function postProgress({ cardId, correct }) {
 
   return res.json();
 }
+
+// Record several answers in one request; keepalive lets it finish during page unload
+export async function postProgressBatch({ events }) {
+  const res = await fetch(`${API_BASE}/progress/batch`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ events }),
+    keepalive: true,
+  });
+
+  if (!res.ok) {
+    const text = await res.text();
+    throw new Error(text || "Post progress failed");
+  }
+
+  return res.json();
+}
@@ -1,7 +1,10 @@
-import { useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import Flashcard from "./Flashcard";
 import styles from "./FlashcardDeck.module.css";
-import { postProgress } from "../api";
+import { postProgressBatch } from "../api";
+
+// Answers are sent in batches of this size, plus whatever is left when the deck ends
+const PROGRESS_BATCH_SIZE = 10;
 
 export default function FlashcardDeck({ cards, questionType = "mcq" }) {
   const [index, setIndex] = useState(0);
@@ -12,35 +15,43 @@ export default function FlashcardDeck({ cards, questionType = "mcq" }) {
 
   const current = useMemo(() => cards[index], [cards, index]);
 
-  async function mark(correct) {
+  const pending = useRef([]);
+
+  function flushProgress() {
+    if (!pending.current.length) return;
+    const events = pending.current;
+    pending.current = [];
+    postProgressBatch({ events }).catch(() => {
+      // ignore for now
+    });
+  }
+
+  // Send anything still queued when leaving the study page
+  useEffect(() => flushProgress, []);
+
+  function mark(correct) {
     const card = cards[index];
 
-    // Last card: record progress (if possible) then show "Done"
-    if (index === cards.length - 1) {
-      if (card?.id) {
-        try {
-          await postProgress({ cardId: card.id, correct });
-        } catch {
-          // ignore for now
-        }
-      }
-      setFinished(true);
-      return;
+    // Unsaved cards (no id) have no progress to record
+    if (card?.id) {
+      pending.current.push({
+        card_id: card.id,
+        correct,
+        answered_at: new Date().toISOString(),
+      });
     }
 
-    // If not saved (no id), just move on
-    if (!card?.id) {
-      next();
+    // Last card: record progress then show "Done"
+    if (index === cards.length - 1) {
+      flushProgress();
+      setFinished(true);
       return;
     }
 
-    try {
-      await postProgress({ cardId: card.id, correct });
-    } catch {
-      // ignore for now
-    } finally {
-      next();
+    if (pending.current.length >= PROGRESS_BATCH_SIZE) {
+      flushProgress();
     }
+    next();
   }
 
   // ✅ MUST be inside the component, before the main return
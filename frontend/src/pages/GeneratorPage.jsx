@@ -1,6 +1,6 @@
 import { useMemo, useRef, useState } from "react";
 import styles from "./GeneratorPage.module.css";
-import { generateQuestions, createDocument, addCardsToDocument } from "../api";
+import { generateQuestionsStream, createDocument, addCardsToDocument } from "../api";
 import { useNavigate } from "react-router-dom";
 
 export default function GeneratorPage() {
@@ -16,6 +16,7 @@ export default function GeneratorPage() {
   const [saveToLibrary, setSaveToLibrary] = useState(true);
 
   const [loading, setLoading] = useState(false);
+  const [received, setReceived] = useState(0);
   const [error, setError] = useState("");
 
   const fileLabel = useMemo(() => {
@@ -33,11 +34,13 @@ export default function GeneratorPage() {
 
     try {
       setLoading(true);
+      setReceived(0);
 
-      const data = await generateQuestions({
+      const data = await generateQuestionsStream({
         file,
         questionType,
         count,
+        onQuestion: (_q, n) => setReceived(n),
       });
 
       const cards = (data.questions || []).map((q) => ({
@@ -194,7 +197,9 @@ export default function GeneratorPage() {
             onClick={onGenerate}
             disabled={loading}
           >
-            {loading ? "Generating…" : "Generate Questions"}
+            {loading
+              ? `Generating… ${received}/${count}`
+              : "Generate Questions"}
           </button>
 
           {error && <div className={styles.error}>{error}</div>}
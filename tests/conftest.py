@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models import Base
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine, autoflush=False)() as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def client(db):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from backend.db import get_session
+    from backend.routes.documents import router as documents_router
+    from backend.routes.progress import router as progress_router
+
+    app = FastAPI()
+    app.include_router(documents_router)
+    app.include_router(progress_router)
+    app.dependency_overrides[get_session] = lambda: db
+    with TestClient(app) as c:
+        yield c
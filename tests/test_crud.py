@@ -0,0 +1,39 @@
+from sqlalchemy import select
+
+from backend import crud
+from backend.models import Card, CardSignature, Progress
+
+
+def _saq(question: str, answer: str = "An answer") -> dict:
+    return {"type": "saq", "question": question, "answer": answer}
+
+
+QUESTIONS = [
+    "What does the mitochondrion produce during aerobic respiration?",
+    "Which enzyme unwinds the DNA double helix at the replication fork?",
+    "How does osmosis move water across a semi-permeable membrane?",
+    "Why do plant cells have a rigid cellulose cell wall?",
+    "Where in the chloroplast do the light-dependent reactions take place?",
+]
+
+
+def test_card_ids_round_trip(db):
+    doc = crud.create_document(db, "Biology")
+    created = crud.add_cards_to_document(db, doc.id, [_saq(q, answer=f"answer {i}") for i, q in enumerate(QUESTIONS)])
+
+    stored = dict(db.execute(select(Card.id, Card.question)).all())
+    assert {c["id"]: c["question"] for c in created} == stored
+    answers = dict(db.execute(select(Card.id, Card.answer)).all())
+    assert all(answers[c["id"]] == c["answer"] for c in created)
+    # The near-duplicate index and progress rows hang off the right cards
+    assert set(db.scalars(select(CardSignature.card_id))) == set(stored)
+    assert set(db.scalars(select(Progress.card_id))) == set(stored)
+
+
+def test_card_ids_round_trip_with_repeated_questions(db):
+    doc = crud.create_document(db, "Biology")
+    cards = [_saq(QUESTIONS[0], answer="first"), _saq(QUESTIONS[1]), _saq(QUESTIONS[0], answer="second")]
+    created = crud.add_cards_to_document(db, doc.id, cards, skip_near_duplicates=False)
+
+    answers = dict(db.execute(select(Card.id, Card.answer)).all())
+    assert [answers[c["id"]] for c in created] == ["first", "An answer", "second"]
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from backend import crud
+from backend.routes.documents import _decode_cursor, _encode_cursor
+
+
+def test_cursor_round_trips():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert _decode_cursor(_encode_cursor(created_at, 42)) == (created_at, 42)
+
+
+def test_bad_cursor_is_400(client, db):
+    doc = crud.create_document(db, "Deck")
+    assert client.get(f"/documents/{doc.id}/cards/page", params={"cursor": "nonsense"}).status_code == 400
+
+
+def test_pages_have_no_gaps_or_repeats_when_created_at_ties(client, db):
+    doc = crud.create_document(db, "Deck")
+    # One batch, so every card gets the same created_at
+    cards = [{"type": "saq", "question": f"Question {i}: explain topic {i * 7919 % 1000}", "answer": "A"} for i in range(23)]
+    created = crud.add_cards_to_document(db, doc.id, cards, skip_near_duplicates=False)
+    assert len({c["id"] for c in created}) == 23
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 5, **({"cursor": cursor} if cursor else {})}
+        page = client.get(f"/documents/{doc.id}/cards/page", params=params).json()
+        seen += [c["id"] for c in page["cards"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert pages == 5
+    assert seen == sorted(c["id"] for c in created)
@@ -0,0 +1,29 @@
+import random
+
+from backend.services.generation import normalize_mcq, reshuffled_copies
+
+
+def _mcq():
+    return {
+        "type": "mcq",
+        "question": "Which cells make antibodies?",
+        "options": ["A. B-cells", "B) C-reactive protein", "C: D-glucose", "D - T-cells"],
+        "correct_answer": "A",
+    }
+
+
+def test_normalize_mcq_strips_labels_once():
+    q = normalize_mcq(_mcq())
+    assert sorted(q["options"]) == ["B-cells", "C-reactive protein", "D-glucose", "T-cells"]
+    assert q["options"][ord(q["correct_answer"]) - ord("A")] == "B-cells"
+
+
+def test_reshuffled_copies_keep_options_intact():
+    random.seed(0)
+    original = normalize_mcq(_mcq())
+    for _ in range(20):
+        (copy,) = reshuffled_copies([original], "mcq")
+        assert sorted(copy["options"]) == ["B-cells", "C-reactive protein", "D-glucose", "T-cells"]
+        assert copy["options"][ord(copy["correct_answer"]) - ord("A")] == "B-cells"
+    # The shared result itself is left alone
+    assert sorted(original["options"]) == ["B-cells", "C-reactive protein", "D-glucose", "T-cells"]
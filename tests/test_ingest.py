@@ -0,0 +1,26 @@
+import io
+import zipfile
+
+from backend.services.ingest import expand_uploads
+
+PDF = b"%PDF-1.4\n%fake\n"
+
+
+def _zip(entries: dict[str, bytes]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_direct_uploads_must_be_pdfs():
+    pdfs, failures = expand_uploads([("notes.pdf", PDF), ("notes.txt", b"hello"), ("fake.pdf", b"<html>")])
+    assert [name for name, _ in pdfs] == ["notes.pdf"]
+    assert [(f["file"], f["step"]) for f in failures] == [("notes.txt", "read"), ("fake.pdf", "read")]
+
+
+def test_zip_entries_without_pdf_suffix_are_ignored():
+    pdfs, failures = expand_uploads([("batch.zip", _zip({"a.pdf": PDF, "readme.txt": b"hi", "__MACOSX/a.pdf": PDF}))])
+    assert [name for name, _ in pdfs] == ["batch.zip/a.pdf"]
+    assert failures == []
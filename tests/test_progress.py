@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from backend import crud
+from backend.models import Progress
+from backend.services import progress_buffer as buffer_module
+from backend.services.progress_buffer import ProgressBuffer
+from backend.services.scheduler import SM2_INITIAL_EASE
+
+
+@pytest.fixture
+def card_id(db):
+    doc = crud.create_document(db, "Biology")
+    [card] = crud.add_cards_to_document(db, doc.id, [{"type": "saq", "question": "What is osmosis?", "answer": "Water moving"}])
+    return card["id"]
+
+
+def _progress(db, card_id: int) -> Progress:
+    db.expire_all()
+    return db.scalar(select(Progress).where(Progress.card_id == card_id))
+
+
+def test_batch_replays_answers_in_order(db, card_id):
+    t0 = datetime.utcnow() - timedelta(days=30)
+    events = [
+        {"card_id": card_id, "correct": True, "answered_at": t0 + timedelta(days=7)},
+        {"card_id": card_id, "correct": True, "answered_at": t0},
+        {"card_id": card_id, "correct": True, "answered_at": t0 + timedelta(days=1)},
+    ]
+    assert crud.record_progress_batch(db, events) == 3
+
+    p = _progress(db, card_id)
+    assert (p.times_seen, p.times_correct, p.repetitions) == (3, 3, 3)
+    # 1 day, 6 days, then 6 x ease
+    assert p.interval_days == pytest.approx(6 * SM2_INITIAL_EASE)
+    assert p.last_seen_at == t0 + timedelta(days=7)
+    assert p.next_due_at == t0 + timedelta(days=7 + 6 * SM2_INITIAL_EASE)
+
+
+def test_a_miss_resets_the_interval(db, card_id):
+    t0 = datetime.utcnow() - timedelta(days=10)
+    crud.record_progress_batch(db, [
+        {"card_id": card_id, "correct": True, "answered_at": t0},
+        {"card_id": card_id, "correct": True, "answered_at": t0 + timedelta(days=1)},
+        {"card_id": card_id, "correct": False, "answered_at": t0 + timedelta(days=2)},
+    ])
+    p = _progress(db, card_id)
+    assert (p.repetitions, p.interval_days, p.times_correct) == (0, 0.0, 2)
+    assert p.next_due_at - p.last_seen_at < timedelta(hours=1)
+
+
+def test_future_answered_at_is_clamped_to_now(db, card_id):
+    before = datetime.utcnow()
+    events = [
+        {"card_id": card_id, "correct": True, "answered_at": datetime(9999, 12, 31)},
+        {"card_id": card_id, "correct": True, "answered_at": datetime.utcnow() + timedelta(hours=12)},
+    ]
+    assert crud.record_progress_batch(db, events) == 2
+    p = _progress(db, card_id)
+    assert before <= p.last_seen_at <= datetime.utcnow()
+
+
+def test_unknown_cards_are_skipped(db, card_id):
+    assert crud.record_progress_batch(db, [{"card_id": card_id + 1000, "correct": True}]) == 0
+
+
+def test_answer_for_unknown_card_is_404(client, card_id):
+    assert client.post("/progress", json={"card_id": card_id + 1000, "correct": True}).status_code == 404
+    r = client.post("/progress", json={"card_id": card_id, "correct": True})
+    assert r.status_code == 200 and r.json()["times_seen"] == 1
+
+
+def test_batch_rejects_answers_far_in_the_future(client, card_id):
+    r = client.post("/progress/batch", json={"events": [{"card_id": card_id, "correct": True, "answered_at": "9999-12-31T00:00:00"}]})
+    assert r.status_code == 422
+
+
+def test_buffer_drops_a_poison_event_and_keeps_the_rest(db, card_id, monkeypatch):
+    monkeypatch.setattr(buffer_module, "SessionLocal", lambda: db)
+    good = {"card_id": card_id, "correct": True, "answered_at": datetime.utcnow()}
+    poison = {"card_id": card_id, "correct": True, "answered_at": "not a datetime"}
+
+    async def run():
+        buffer = ProgressBuffer(max_events=100, interval_s=3600, max_pending=100)
+        await buffer.start()
+        assert buffer.add([good, poison])
+        with pytest.raises(Exception):
+            await buffer.flush()
+        # Second attempt goes event by event
+        assert await buffer.flush() == 1
+        assert buffer.add([good])
+        assert await buffer.flush() == 1
+        await buffer.stop()
+        return buffer.stats()
+
+    stats = asyncio.run(run())
+    assert stats["pending"] == 0 and stats["failed_flushes"] == 0
+    assert _progress(db, card_id).times_seen == 2
+
+
+def test_buffer_refuses_events_past_its_cap():
+    buffer = ProgressBuffer(max_events=100, interval_s=3600, max_pending=2)
+    buffer._full = asyncio.Event()
+    assert buffer.add([{"card_id": 1, "correct": True}] * 2)
+    assert not buffer.add([{"card_id": 1, "correct": True}])
@@ -0,0 +1,27 @@
+from backend.services.pdf import _spread_indices, pick_spread_chunks, sampled_window_count
+from backend.services.selection import max_chunks_for, select_chunks
+
+
+def _anchors(count: int, pages: int = 100) -> list[int]:
+    return _spread_indices(pages, sampled_window_count(max_chunks_for(count)))
+
+
+def test_sampled_anchors_skip_cover_and_references():
+    for count in (5, 10):
+        anchors = _anchors(count)
+        assert len(anchors) >= 4
+        assert 0 not in anchors and 99 not in anchors
+        # Start, middle and end of the document are all represented
+        assert anchors[0] < 33 and any(33 <= a < 66 for a in anchors) and anchors[-1] >= 66
+
+
+def test_single_spread_pick_is_the_middle():
+    assert _spread_indices(100, 1) == [50]
+    chunks = [f"chunk {i}" for i in range(9)]
+    assert pick_spread_chunks(chunks, max_chunks=1) == ["chunk 4"]
+    assert select_chunks(chunks, max_chunks=1, selector="spread") == ["chunk 4"]
+
+
+def test_spread_indices_never_exceed_the_document():
+    assert _spread_indices(3, 4) == [0, 1, 2]
+    assert _spread_indices(1, 1) == [0]